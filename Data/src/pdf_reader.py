@@ -1,7 +1,11 @@
+import argparse
 import asyncio
-from agentscope.rag import PDFReader, Document
+from concurrent.futures import ProcessPoolExecutor
+from agentscope.rag import PDFReader, TextReader, Document
 import json
 import os
+import tempfile
+import time
 
 #相对路径
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,8 +26,52 @@ def find_pdf_files_recursive(folder_path):
     
     return pdf_files
 
-async def example_pdf_reader(pdf_path: str, output_dir: str, print_docs: bool = True):
-    reader = PDFReader(chunk_size=800, split_by="paragraph")
+
+def output_txt_path_for(pdf_path: str, output_dir: str) -> str:
+    # txt 文件名 = pdf 同名
+    file_stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, f"{file_stem}.txt")
+
+
+def output_txt_paths(pdf_files: list[str], raw_pdf_dir: str, output_dir: str) -> dict[str, str]:
+    #递归查找时不同子目录中可能有同名 pdf，它们的 txt 名改用相对路径（目录间用 "__" 连接），避免互相覆盖
+    by_stem = {}
+    for pdf in pdf_files:
+        stem = os.path.splitext(os.path.basename(pdf))[0]
+        by_stem.setdefault(stem.lower(), []).append(pdf)
+
+    paths = {}
+    for pdfs in by_stem.values():
+        if len(pdfs) == 1:
+            paths[pdfs[0]] = output_txt_path_for(pdfs[0], output_dir)
+            continue
+        for pdf in pdfs:
+            rel_stem = os.path.splitext(os.path.relpath(pdf, raw_pdf_dir))[0]
+            paths[pdf] = os.path.join(output_dir, rel_stem.replace(os.sep, "__") + ".txt")
+    return paths
+
+
+def is_up_to_date(pdf_path: str, txt_path: str) -> bool:
+    #输出的 txt 存在且不早于 pdf 时跳过
+    return os.path.exists(txt_path) and os.path.getmtime(txt_path) >= os.path.getmtime(pdf_path)
+
+
+def write_documents_txt(documents: list[Document], output_txt_path: str) -> None:
+    #先写唯一的临时文件再改名，中途失败不会留下比 pdf 更新的残缺输出，并行的写入也不会共用临时文件
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(output_txt_path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for i, doc in enumerate(documents):
+                f.write(f"--- Document Chunk {i} ---\n")
+                f.write(doc.metadata["content"]["text"] + "\n\n")
+        os.replace(tmp_path, output_txt_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+async def example_pdf_reader(pdf_path: str, output_dir: str, print_docs: bool = True, reader: PDFReader = None):
+    reader = reader or PDFReader(chunk_size=800, split_by="paragraph")
 
     # 读取 PDF
     documents = await reader(pdf_path)
@@ -42,38 +90,120 @@ async def example_pdf_reader(pdf_path: str, output_dir: str, print_docs: bool =
     """            
 
     # 输出 txt 文件
-    # txt 文件名 = pdf 同名
-    base_name = os.path.basename(pdf_path)
-    file_stem = os.path.splitext(base_name)[0]
-    output_txt_path = os.path.join(output_dir, f"{file_stem}.txt")
-
-    with open(output_txt_path, "w", encoding="utf-8") as f:
-        for i, doc in enumerate(documents):
-            f.write(f"--- Document Chunk {i} ---\n")
-            f.write(doc.metadata["content"]["text"] + "\n\n")
+    output_txt_path = output_txt_path_for(pdf_path, output_dir)
+    write_documents_txt(documents, output_txt_path)
 
     print(f"saved as ：{output_txt_path}\n")
 
     return documents
 
 
-async def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+#每个工作进程复用同一个 TextReader
+_worker_reader = None
+
 
-    pdf_files = find_pdf_files_recursive(RAW_PDF_DIR)
+def _extract_in_worker(pdf_path: str, output_txt_path: str) -> tuple[int, int]:
+    #在工作进程中解析一个 pdf 并写出 txt，返回 (页数, chunk 数)
+    #与 PDFReader 相同，各页文本用空行连接后分块；pdf 只打开一次，页数在同一次解析中得到
+    global _worker_reader
+    from pypdf import PdfReader
+
+    if _worker_reader is None:
+        _worker_reader = TextReader(chunk_size=800, split_by="paragraph")
+    pages = [page.extract_text() for page in PdfReader(pdf_path).pages]
+    documents = asyncio.run(_worker_reader("\n\n".join(pages)))
+    write_documents_txt(documents, output_txt_path)
+    return len(pages), len(documents)
+
+
+async def main(raw_pdf_dir: str = RAW_PDF_DIR, output_dir: str = OUTPUT_DIR, workers: int = None, force: bool = False):
+    os.makedirs(output_dir, exist_ok=True)
+
+    pdf_files = find_pdf_files_recursive(raw_pdf_dir)
 
     if not pdf_files:
         print("no pdf")
         return
 
-    print(f"{len(pdf_files)} pdfs found\n")
+    print(f"{len(pdf_files)} pdfs found")
+
+    txt_paths = output_txt_paths(pdf_files, raw_pdf_dir, output_dir)
+    renamed = [pdf for pdf in pdf_files if txt_paths[pdf] != output_txt_path_for(pdf, output_dir)]
+    if renamed:
+        print(f"{len(renamed)} pdfs share a file name with another pdf, saved under their relative path:")
+        for pdf in renamed:
+            print(f"  {pdf} -> {os.path.basename(txt_paths[pdf])}")
+
+    # 跳过输出比输入新的文件，重复运行时只处理新增或修改过的 pdf
+    todo = [pdf for pdf in pdf_files if force or not is_up_to_date(pdf, txt_paths[pdf])]
+    skipped = len(pdf_files) - len(todo)
+    if skipped:
+        print(f"{skipped} pdfs up to date, skipped")
+    print(f"{len(todo)} pdfs to process\n")
+    if not todo:
+        return
 
-    # 逐个解析 PDF
-    for pdf in pdf_files:
-        print(f"processing：{pdf}")
-        await example_pdf_reader(pdf, OUTPUT_DIR, print_docs=True)
+    # pypdf 解析是 CPU 密集的同步代码，用进程池并行解析多个 pdf，并发数即进程数
+    start = time.perf_counter()
+    pages = chunks = 0
+    failures = []
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = {
+            loop.run_in_executor(executor, _extract_in_worker, pdf, txt_paths[pdf]): pdf
+            for pdf in todo
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pdf = tasks[task]
+                try:
+                    n_pages, n_chunks = task.result()
+                except Exception as e:
+                    failures.append((pdf, e))
+                    print(f"failed：{pdf}  error:{e}")
+                    continue
+                pages += n_pages
+                chunks += n_chunks
+                print(f"saved as ：{txt_paths[pdf]} ({n_pages} pages, {n_chunks} chunks)")
+
+    elapsed = time.perf_counter() - start
+    n_done = len(todo) - len(failures)
+    print(
+        f"\nprocessed {n_done} pdfs ({pages} pages, {chunks} chunks) in {elapsed:.1f}s："
+        f"{n_done / elapsed:.2f} files/s, {pages / elapsed:.1f} pages/s, "
+        f"{skipped} skipped, {len(failures)} failed"
+    )
+    for pdf, e in failures:
+        print(f"  failed：{pdf}  error:{e}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    parser = argparse.ArgumentParser(description="Extract PDFs into pre-chunked txt files")
+    parser.add_argument(
+        "--input-dir",
+        type=str,
+        default=RAW_PDF_DIR,
+        help="Directory searched recursively for PDFs (default: data/raw_pdf)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default=OUTPUT_DIR,
+        help="Directory the txt files are written to (default: data/final_output_txt)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of PDFs extracted in parallel, one process each (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-extract every PDF, even when its txt output is newer"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.input_dir, args.output_dir, args.workers, args.force))
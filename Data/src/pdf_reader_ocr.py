@@ -1,5 +1,9 @@
+import argparse
 import asyncio
+import hashlib
 import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import fitz  # PyMuPDF
 import pytesseract
 from PIL import Image
@@ -9,6 +13,17 @@ import io
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 OCR_TXT_DIR = os.path.join(BASE_DIR, "data", "ocr_output_txt")
 OUTPUT_DIR = os.path.join(BASE_DIR, "data", "final_output_txt")
+OCR_CACHE_DIR = os.path.join(BASE_DIR, "data", "ocr_cache")
+
+# 渲染分辨率，180 DPI 即原来的 2.5 倍缩放
+DEFAULT_DPI = 180
+OCR_LANG = "chi_sim+eng"
+
+# 文本层至少包含这么多个非空白字符，且其中正常字符的比例不低于阈值时，才直接使用文本层
+MIN_TEXT_LAYER_CHARS = 20
+MIN_NORMAL_CHAR_RATIO = 0.8
+# 中日韩文字、拉丁字母、数字、常见中英文标点和全角字符
+_NORMAL_CHAR_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffefA-Za-z0-9.,;:!?()\[\]/%+\-–—=<>'\"“”‘’×°~_#&*@|]")
 
 # 设置 Tesseract-OCR 的安装路径（请根据你的实际安装位置修改）
 #pytesseract.pytesseract.tesseract_cmd = r"C:\Users\Emma\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
@@ -25,33 +40,193 @@ def find_pdf_files_recursive(folder_path):
     return pdf_files
 
 
-def ocr_extract_pdf(pdf_path):
-    """对 PDF 的每一页进行 OCR 并返回完整文本"""
+def file_sha256(file_path, block_size=1 << 20):
+    """按块计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def usable_text_layer(page):
+    """
+    返回页面可直接使用的文本层，文本层为空或是乱码时返回 None
+
+    扫描页通常没有文本层，或者只有水印等零星文字；字体编码损坏的页面会提取出大量
+    私有区字符、替换字符或控制字符，这些页面都需要 OCR。
+    """
+    text = page.get_text("text")
+    chars = "".join(text.split())
+    if len(chars) < MIN_TEXT_LAYER_CHARS:
+        return None
+    if len(_NORMAL_CHAR_RE.findall(chars)) < MIN_NORMAL_CHAR_RATIO * len(chars):
+        return None
+    return text
+
+
+class OcrPageCache:
+    """
+    按 (PDF sha256, 页码, DPI, 语言) 缓存单页 OCR 结果，每页一个文件
+
+    每页 OCR 完成后立即写入，重新运行或上次中途失败时只需处理缺失的页面。
+    写入时先写临时文件再改名，中断也不会留下不完整的结果。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, pdf_sha, page_idx, dpi, lang):
+        return os.path.join(self.cache_dir, pdf_sha, f"{dpi}_{lang}", f"{page_idx}.txt")
+
+    def get(self, pdf_sha, page_idx, dpi, lang):
+        """返回缓存的 OCR 结果，没有缓存时返回 None"""
+        try:
+            with open(self._path(pdf_sha, page_idx, dpi, lang), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, pdf_sha, page_idx, dpi, lang, text):
+        """保存一页的 OCR 结果"""
+        path = self._path(pdf_sha, page_idx, dpi, lang)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def _init_ocr_worker():
+    """OCR 进程初始化：页面已经按进程并行，限制每个 tesseract 只用一个线程，避免互相争抢 CPU"""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def render_page(page, dpi=DEFAULT_DPI):
+    """把一页渲染为灰度 PPM 图像字节，灰度图的体积只有 RGB 的三分之一，进程间传输更快"""
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+    return pix.tobytes("ppm")
+
+
+def ocr_image(img_bytes, lang=OCR_LANG):
+    """对一页图像进行 OCR（在工作进程中执行）"""
+    image = Image.open(io.BytesIO(img_bytes))
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def ocr_extract_pdf(
+    pdf_path,
+    executor=None,
+    workers=None,
+    dpi=DEFAULT_DPI,
+    cache=None,
+    lang=OCR_LANG,
+    force_ocr=False,
+):
+    """
+    逐页提取 PDF 文本并返回完整文本
+
+    有可用文本层的页面直接使用 PyMuPDF 提取的文本，其余页面依次查找 OCR 缓存，
+    仍然缺失的页面才渲染并 OCR；force_ocr 为 True 时所有页面都走 OCR。
+
+    当前线程依次渲染页面（生产者），进程池中的工作进程并行执行 OCR（消费者），
+    渲染与 OCR 同时进行。最多有 2 * workers 页已渲染但尚未完成 OCR，
+    内存占用与页数无关。各页结果按页码顺序拼接，与逐页处理的输出一致。
+    某一页 OCR 失败时其余页面照常完成并写入缓存，最后再抛出异常。
+
+    executor 为 None 时为这个文件单独创建进程池。
+    """
     print(f"ocr processing：{pdf_path}")
+    pdf_sha = file_sha256(pdf_path) if cache is not None else None
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker)
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+
     doc = fitz.open(pdf_path)
-    full_text = ""
+    page_texts = [None] * len(doc)
+    pending = {}
+    errors = {}
+    n_text_layer = n_cached = 0
+
+    def collect(done):
+        # 取出已完成页面的 OCR 结果，成功的页面立即写入缓存
+        for future in done:
+            page_idx = pending.pop(future)
+            try:
+                page_texts[page_idx] = future.result()
+            except Exception as e:
+                errors[page_idx] = e
+                continue
+            if cache is not None:
+                cache.put(pdf_sha, page_idx, dpi, lang, page_texts[page_idx])
 
-    for page_idx in range(len(doc)):
-        page = doc.load_page(page_idx)
+    try:
+        for page_idx in range(len(doc)):
+            page = doc.load_page(page_idx)
+            text = None if force_ocr else usable_text_layer(page)
+            if text is not None:
+                page_texts[page_idx] = text
+                n_text_layer += 1
+                continue
+            if cache is not None:
+                text = cache.get(pdf_sha, page_idx, dpi, lang)
+                if text is not None:
+                    page_texts[page_idx] = text
+                    n_cached += 1
+                    continue
 
-        # 提升分辨率，提高 OCR 准确率
-        pix = page.get_pixmap(matrix=fitz.Matrix(2.5, 2.5))
-        img_bytes = pix.tobytes("ppm")
-        image = Image.open(io.BytesIO(img_bytes))
+            # 在途页面已满时等待任意一页完成，再渲染下一页
+            while len(pending) >= max_pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
 
-        # OCR（支持中文）
-        text = pytesseract.image_to_string(image, lang="chi_sim+eng")
+            img_bytes = render_page(page, dpi)
+            pending[executor.submit(ocr_image, img_bytes, lang)] = page_idx
 
-        full_text += f"\n--- Page {page_idx + 1} ---\n{text}"
+        collect(wait(pending).done)
+    finally:
+        for future in pending:
+            future.cancel()
+        doc.close()
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
 
-    doc.close()
-    return full_text
+    n_ocr = len(page_texts) - n_text_layer - n_cached
+    print(f"pages：{n_text_layer} text layer, {n_cached} cached, {n_ocr} ocr")
+    if errors:
+        failed = sorted(errors)
+        raise RuntimeError(
+            f"OCR failed on pages {[i + 1 for i in failed]}: {errors[failed[0]]}"
+        ) from errors[failed[0]]
 
+    return "".join(
+        f"\n--- Page {page_idx + 1} ---\n{text}"
+        for page_idx, text in enumerate(page_texts)
+    )
 
-async def ocr_pdf_to_txt(pdf_path, output_dir):
+
+async def ocr_pdf_to_txt(
+    pdf_path,
+    output_dir,
+    executor=None,
+    workers=None,
+    dpi=DEFAULT_DPI,
+    cache=None,
+    force_ocr=False,
+):
     """OCR 单个 PDF 并保存为 txt 文件"""
-    # OCR 可能耗时，将其放入线程池
-    text = await asyncio.to_thread(ocr_extract_pdf, pdf_path)
+    # 渲染和等待 OCR 结果会阻塞，将其放入线程池
+    text = await asyncio.to_thread(
+        ocr_extract_pdf,
+        pdf_path,
+        executor,
+        workers,
+        dpi,
+        cache,
+        OCR_LANG,
+        force_ocr,
+    )
 
     # 输出路径
     base_name = os.path.basename(pdf_path)
@@ -66,8 +241,9 @@ async def ocr_pdf_to_txt(pdf_path, output_dir):
     return output_txt_path
 
 
-async def main():
+async def main(workers=None, dpi=DEFAULT_DPI, cache_dir=OCR_CACHE_DIR, force_ocr=False):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    cache = OcrPageCache(cache_dir) if cache_dir else None
 
     pdf_files = find_pdf_files_recursive(OCR_TXT_DIR)
 
@@ -77,13 +253,45 @@ async def main():
 
     print(f"found {len(pdf_files)} PDFs\n")
 
-    # 逐个 OCR 处理
-    for pdf in pdf_files:
-        try:
-            await ocr_pdf_to_txt(pdf, OUTPUT_DIR)
-        except Exception as e:
-            print(f"failed：{pdf}  error:{e}")
+    # 所有文件共用一个进程池，逐个文件处理，每个文件的页面并行 OCR
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+        for pdf in pdf_files:
+            try:
+                await ocr_pdf_to_txt(pdf, OUTPUT_DIR, executor, workers, dpi, cache, force_ocr)
+            except Exception as e:
+                print(f"failed：{pdf}  error:{e}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="OCR scanned PDFs into txt files")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of OCR processes working on pages in parallel (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--dpi",
+        type=int,
+        default=DEFAULT_DPI,
+        help=f"Resolution pages are rendered at before OCR (default: {DEFAULT_DPI}, i.e. 2.5x)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=OCR_CACHE_DIR,
+        help="Directory caching OCR results per page, or 'none' to disable (default: data/ocr_cache)"
+    )
+    parser.add_argument(
+        "--force-ocr",
+        action="store_true",
+        help="OCR every page, even those with a usable text layer"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(
+        args.workers,
+        args.dpi,
+        None if args.cache_dir.lower() == "none" else args.cache_dir,
+        args.force_ocr,
+    ))
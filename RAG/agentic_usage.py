@@ -9,9 +9,14 @@ adjust the retrieval parameters to get relevant results.
 import asyncio
 import os
 import argparse
+import random
+import shutil
+import tempfile
+import time
+from typing import AsyncIterable, Callable, Iterable
 from tqdm import tqdm
 
-from agentscope.rag import SimpleKnowledge, QdrantStore
+from agentscope.rag import SimpleKnowledge
 from agentscope import setup_logger
 from agentscope.agent import ReActAgent, UserAgent
 from agentscope.embedding import DashScopeTextEmbedding
@@ -21,228 +26,1111 @@ from agentscope.model import OpenAIChatModel
 from agentscope.tool import Toolkit
 
 # 导入分块管理模块
-from chunk_manager import load_documents_from_directory
+from chunk_manager import iter_documents_from_files, list_files_to_load
+# 导入 chunk 存储模块
+from chunk_store import ChunkStore
+# 导入近重复去重模块
+from chunk_dedup import ChunkDeduplicator
+# 导入相邻 chunk 上下文扩展模块
+from context_expansion import ContextExpandedKnowledge
+# 导入增量导入清单模块
+from ingest_manifest import IngestManifest, delete_documents_by_doc_id
+# 导入嵌入缓存模块
+from embedding_cache import CachedEmbedding, SQLiteEmbeddingStore
+# 导入嵌入线程化模块
+from threaded_embedding import ThreadedEmbedding
+# 导入混合检索模块
+from hybrid_retrieval import BM25Index, HybridKnowledge
+# 导入支持额外 payload 的向量存储
+from payload_store import PayloadQdrantStore
+# 导入本地向量存储模块
+from local_vector_store import LocalVectorStore
+# 导入检索缓存模块
+from retrieval_cache import CachedKnowledge, RetrievalCache, VectorQueryKnowledge
+# 导入重排序模块
+from reranking import CrossEncoderReranker, LexicalReranker, RerankedKnowledge
+# 导入 Qdrant 服务管理模块
+from qdrant_supervisor import create_snapshot, restore_snapshot, wait_until_ready
+# 导入蓝绿重建索引模块
+from reindex import (
+    bulk_collection_kwargs,
+    finish_bulk_load,
+    promote,
+    validate_count,
+    versioned_name,
+)
+# 导入文档级过滤字段模块
+from document_fields import FILTER_FIELDS
+# 导入检索记录模块
+from retrieval_recorder import RetrievalRecorder
 # 导入Q&A读写处理模块
-from qa_io_handler import QuestionReader, AnswerWriter, get_questions_summary
+from qa_io_handler import QuestionReader, AnswerWriter, AnswerCheckpoint, get_questions_summary
 
 
-def create_knowledge_base(db_location: str) -> SimpleKnowledge:
+def create_knowledge_base(
+    db_location: str,
+    *,
+    embedding_cache: str = None,
+    embedding_cache_size: int = 100_000,
+    bm25_index: BM25Index = None,
+    retrieval_cache: RetrievalCache = None,
+    context_store: ChunkStore = None,
+    context_window: int = 1,
+    context_chars: int = 4000,
+    reranker: LexicalReranker | CrossEncoderReranker = None,
+    rerank_factor: int = 4,
+    ivf_lists: int = 0,
+    quantization: str = None,
+    collection_name: str = "test_collection",
+) -> SimpleKnowledge:
     """
     Create a knowledge base instance with specified database location.
     
     Args:
-        db_location: Either ":memory:" for in-memory storage or 
-                     "http://localhost:6333" for remote Qdrant server
+        db_location: Either ":memory:" for in-memory storage,
+                     "http://localhost:6333" for remote Qdrant server or
+                     "local:<path>" for an embedded store in <path>
+        embedding_cache: Path to the SQLite embedding cache, or None to call
+                         the embedding API for every text
+        embedding_cache_size: Maximum number of cached embeddings
+        bm25_index: BM25 index for hybrid retrieval, or None for vector
+                    retrieval only
+        retrieval_cache: Cache serving repeated queries, or None to run
+                         every retrieval
+        context_store: Chunk store the neighbours of retrieved chunks are
+                       read from, or None to return the chunks alone
+        context_window: Number of neighbouring chunks added on each side
+        context_chars: Character budget of the expanded results
+        reranker: Reranker of over-fetched candidates, or None to keep the
+                  first-stage order
+        rerank_factor: Number of candidates fetched per returned chunk when
+                       reranking
+        ivf_lists: Number of IVF lists of an embedded store (0 for exact
+                   search)
+        quantization: "int8" or "pq" to search quantized vectors and
+                      rescore the candidates with the float vectors, or
+                      None for float vectors only
+        collection_name: Name of the collection, or of an alias of it
     
     Returns:
-        SimpleKnowledge instance
+        VectorQueryKnowledge instance (HybridKnowledge if bm25_index is given),
+        wrapped in a RerankedKnowledge if reranker is given, in a
+        ContextExpandedKnowledge if context_store is given and in a
+        CachedKnowledge if retrieval_cache is given
     """
-    return SimpleKnowledge(
-        embedding_store=QdrantStore(
-            location=db_location,
-            collection_name="test_collection",
-            dimensions=1024,
-        ),
-        embedding_model=DashScopeTextEmbedding(
+    # DashScope SDK 的请求是同步阻塞的，放到工作线程中执行，
+    # 并行答题的检索和导入时的多个嵌入批次才能真正并发
+    embedding_model = ThreadedEmbedding(
+        DashScopeTextEmbedding(
             api_key=os.environ["DASHSCOPE_API_KEY"],
             model_name="text-embedding-v4",
-        ),
+        )
     )
+    if embedding_cache:
+        embedding_model = CachedEmbedding(
+            embedding_model,
+            SQLiteEmbeddingStore(embedding_cache, max_entries=embedding_cache_size),
+        )
+    
+    if db_location.startswith("local:"):
+        embedding_store = LocalVectorStore(
+            db_location[len("local:"):],
+            dimensions=1024,
+            collection_name=collection_name,
+            ivf_lists=ivf_lists,
+            quantization=quantization,
+        )
+    else:
+        embedding_store = PayloadQdrantStore(
+            location=db_location,
+            collection_name=collection_name,
+            dimensions=1024,
+            quantization=quantization,
+        )
+    if bm25_index is not None:
+        knowledge = HybridKnowledge(
+            embedding_store=embedding_store,
+            embedding_model=embedding_model,
+            bm25_index=bm25_index,
+        )
+    else:
+        knowledge = VectorQueryKnowledge(
+            embedding_store=embedding_store,
+            embedding_model=embedding_model,
+        )
+    if reranker is not None:
+        knowledge = RerankedKnowledge(knowledge, reranker, candidate_factor=rerank_factor)
+    if context_store is not None:
+        knowledge = ContextExpandedKnowledge(
+            knowledge,
+            context_store,
+            window=context_window,
+            max_chars=context_chars,
+        )
+    if retrieval_cache is not None:
+        return CachedKnowledge(knowledge, retrieval_cache)
+    return knowledge
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    """判断嵌入服务返回的错误是否为限流错误。"""
+    message = str(error).lower()
+    return any(
+        keyword in message
+        for keyword in ("429", "throttl", "rate limit", "ratelimit", "too many requests")
+    )
+
+
+async def embed_with_retry(
+    embedding_model,
+    texts: list,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+):
+    """
+    调用嵌入模型，遇到限流错误时按指数退避重试。
+    
+    Args:
+        embedding_model: 嵌入模型实例
+        texts: 要嵌入的文本（字符串或 TextBlock）列表
+        max_retries: 最大重试次数
+        base_delay: 第一次重试前的等待秒数，之后每次翻倍
+    
+    Returns:
+        EmbeddingResponse
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await embedding_model(texts)
+        except Exception as e:
+            if attempt == max_retries or not _is_rate_limit_error(e):
+                raise
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+            tqdm.write(f"Rate limited by embedding API, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def _iter_batches(
+    documents: Iterable | AsyncIterable,
+    batch_size: int,
+) -> AsyncIterable[list]:
+    """把同步或异步的文档流按 batch_size 分组，只在内存中保留当前批次。"""
+    batch = []
+    if isinstance(documents, AsyncIterable):
+        async for doc in documents:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    else:
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
 
 
 async def add_documents_with_progress(
     knowledge: SimpleKnowledge,
-    documents: list,
-    batch_size: int = 50
-) -> None:
+    documents: Iterable | AsyncIterable,
+    batch_size: int = 50,
+    max_concurrency: int = 4,
+    on_batch_added: Callable[[list], None] = None,
+) -> int:
     """
     分批添加文档到知识库，并显示进度条。
     
+    嵌入和写入以流水线方式进行：最多 max_concurrency 个嵌入批次同时在途，
+    已完成嵌入的文档由单独的任务写入向量库，与后续批次的嵌入请求重叠执行。
+    
+    documents 可以是列表，也可以是边加载边产出文档的（异步）迭代器。
+    文档按需从迭代器中取出，写入速度跟不上时会暂停读取，
+    因此内存中最多只保留约 max_concurrency + 1 个批次的文档。
+    
     Args:
         knowledge: SimpleKnowledge 实例
-        documents: 要添加的文档列表
-        batch_size: 每批处理的文档数量（默认50个）
+        documents: 要添加的文档列表或文档流
+        batch_size: 每次写入向量库的文档数量（默认50个）
+        max_concurrency: 同时在途的嵌入批次数量
+        on_batch_added: 每批文档写入向量库后调用的回调函数
+    
+    Returns:
+        添加的文档数量
     """
-    total_docs = len(documents)
-    print(f"\nAdding {total_docs} documents to knowledge base...")
+    total_docs = len(documents) if isinstance(documents, list) else None
+    if total_docs is None:
+        print("\nAdding documents to knowledge base as they are loaded...")
+    else:
+        print(f"\nAdding {total_docs} documents to knowledge base...")
+    
+    embedding_model = knowledge.embedding_model
+    embedding_store = knowledge.embedding_store
+    
+    # 嵌入批次不超过嵌入服务单次请求的上限（DashScope v4 为 10 条），
+    # 否则一个批次会在模型内部被拆成多个串行请求
+    embed_batch_size = min(
+        batch_size,
+        getattr(embedding_model, "batch_size_limit", None) or batch_size,
+    )
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # 有界队列：写入跟不上时嵌入任务会阻塞在 put 上并继续占用信号量，
+    # 从而暂停从文档流中读取新的批次
+    embedded: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+    start_time = time.perf_counter()
+    total_tokens = 0
+    
+    async def embed(batch: list) -> None:
+        try:
+            res = await embed_with_retry(
+                embedding_model,
+                [doc.metadata.content for doc in batch],
+            )
+            for doc, embedding in zip(batch, res.embeddings):
+                doc.embedding = embedding
+            await embedded.put((batch, (res.usage.tokens or 0) if res.usage else 0))
+        finally:
+            semaphore.release()
+    
+    async def upsert(pbar: tqdm) -> None:
+        nonlocal total_tokens
+        pending = []
+        while True:
+            item = await embedded.get()
+            if item is not None:
+                batch, tokens = item
+                pending.extend(batch)
+                total_tokens += tokens
+            
+            if pending and (item is None or len(pending) >= batch_size):
+                await embedding_store.add(pending)
+                if on_batch_added is not None:
+                    on_batch_added(pending)
+                pbar.update(len(pending))
+                elapsed = max(time.perf_counter() - start_time, 1e-6)
+                pbar.set_postfix(
+                    docs_s=f"{pbar.n / elapsed:.1f}",
+                    tokens_s=f"{total_tokens / elapsed:.0f}",
+                )
+                pending = []
+            
+            if item is None:
+                return
     
-    # 分批处理文档
     with tqdm(total=total_docs, desc="Processing documents", unit="doc") as pbar:
-        for i in range(0, total_docs, batch_size):
-            batch = documents[i:i + batch_size]
-            await knowledge.add_documents(batch)
-            pbar.update(len(batch))
+        async with asyncio.TaskGroup() as tg:
+            writer = tg.create_task(upsert(pbar))
+            async for batch in _iter_batches(documents, embed_batch_size):
+                await semaphore.acquire()
+                tg.create_task(embed(batch))
+            
+            # 等待所有嵌入批次完成后通知写入任务结束
+            for _ in range(max_concurrency):
+                await semaphore.acquire()
+            await embedded.put(None)
+            await writer
+        added_docs = pbar.n
+    
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"✓ Successfully added {added_docs} documents to knowledge base "
+        f"({added_docs / max(elapsed, 1e-6):.1f} docs/s, "
+        f"{total_tokens / max(elapsed, 1e-6):.0f} tokens/s)\n"
+    )
+    return added_docs
+
+
+def _find_knowledge(knowledge: SimpleKnowledge, knowledge_class: type) -> SimpleKnowledge | None:
+    """在缓存、上下文扩展、重排序等包装层中找到给定类型的知识库。"""
+    while not isinstance(knowledge, knowledge_class):
+        knowledge = getattr(knowledge, "knowledge", None)
+        if knowledge is None:
+            return None
+    return knowledge
+
+
+async def reindex_knowledge_base(
+    knowledge: SimpleKnowledge,
+    qdrant_client,
+    db_location: str,
+    documents: Iterable | AsyncIterable,
+    batch_size: int = 512,
+    max_concurrency: int = 4,
+    quantization: str = None,
+    bm25_index_file: str = None,
+    keep_previous: bool = False,
+    deduplicator: ChunkDeduplicator = None,
+    on_promoted: Callable[[], None] = None,
+) -> str:
+    """
+    蓝绿重建索引：把文档写入新的带版本号的集合，校验后原子地切换别名。
+    
+    重建期间 knowledge 仍通过别名从旧集合检索，切换后立即检索新集合。
+    新集合在写入期间不建 HNSW 索引，全部写入后才统一建索引。
+    混合检索时同时重建 BM25 索引，与别名一起切换。
+    
+    Args:
+        knowledge: 通过别名检索的知识库
+        qdrant_client: Qdrant 服务的同步客户端
+        db_location: Qdrant 服务地址
+        documents: 要写入的全部文档（列表或文档流）
+        batch_size: 每次写入向量库的文档数量
+        max_concurrency: 同时在途的嵌入批次数量
+        quantization: 新集合的向量量化方式，None 表示不量化
+        bm25_index_file: 混合检索时 BM25 索引的保存路径
+        keep_previous: 切换后保留旧集合而不删除
+        deduplicator: 文档流经过的去重器，写入后用它更新 canonical chunks 的 payload
+        on_promoted: 别名切换后在工作线程中调用的回调函数，例如保存导入清单
+    
+    Returns:
+        新集合的名称
+    
+    Raises:
+        ValueError: 新集合中的点数与写入的文档数不一致时，别名保持不变
+    """
+    alias = knowledge.embedding_store.collection_name
+    collection_name = versioned_name(alias)
+    print(f"Re-indexing {alias} into {collection_name}, serving from the current index meanwhile")
+    
+    target = SimpleKnowledge(
+        embedding_store=PayloadQdrantStore(
+            location=db_location,
+            collection_name=collection_name,
+            dimensions=1024,
+            quantization=quantization,
+            collection_kwargs=bulk_collection_kwargs(),
+        ),
+        embedding_model=knowledge.embedding_model,
+    )
+    hybrid = _find_knowledge(knowledge, HybridKnowledge)
+    bm25_index = BM25Index() if hybrid is not None else None
     
-    print(f"✓ Successfully added {total_docs} documents to knowledge base\n")
+    try:
+        added_docs = await add_documents_with_progress(
+            target,
+            documents,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            on_batch_added=bm25_index.add if bm25_index is not None else None,
+        )
+        if deduplicator is not None:
+            print(deduplicator.summary())
+            await target.embedding_store.update_payloads(deduplicator.canonical_updates())
+        print(f"Building the index of {collection_name}...")
+        await asyncio.to_thread(finish_bulk_load, qdrant_client, collection_name)
+        count = await asyncio.to_thread(validate_count, qdrant_client, collection_name, added_docs)
+    except BaseException:
+        # 别名仍指向旧集合，未完成的新集合直接丢弃
+        await asyncio.to_thread(qdrant_client.delete_collection, collection_name)
+        raise
+    
+    previous = await asyncio.to_thread(
+        promote, qdrant_client, alias, collection_name, keep_previous,
+    )
+    if hybrid is not None:
+        hybrid.bm25_index = bm25_index
+        if bm25_index_file:
+            await asyncio.to_thread(bm25_index.save, bm25_index_file)
+    if isinstance(knowledge, CachedKnowledge):
+        knowledge.invalidate()
+    if on_promoted is not None:
+        # 快照和文件操作是阻塞的，放到工作线程中执行，agent 在此期间照常答题
+        await asyncio.to_thread(on_promoted)
+    
+    print(
+        f"✓ Alias {alias} now points at {collection_name} ({count} chunks)"
+        + (f", replacing {previous}" if previous else "")
+    )
+    return collection_name
 
 
 setup_logger(level="ERROR")
 
 
+def create_agent(
+    knowledge: SimpleKnowledge,
+    model: OpenAIChatModel,
+    recorder: RetrievalRecorder = None,
+) -> ReActAgent:
+    """
+    Create a ReAct agent equipped with the knowledge retrieval tool.
+    
+    Each agent has its own toolkit and memory, while the knowledge base and
+    the chat model (and therefore its HTTP client pool) are shared.
+    
+    With hybrid retrieval the `score_threshold` parameter is hidden from the
+    agent: it only filters the vector ranking, lexical matches are always
+    fused in and the fused scores are relative ranks, so retrying with
+    another threshold would not change the results.
+    
+    Args:
+        knowledge: SimpleKnowledge instance
+        model: Chat model shared by all agents
+        recorder: Optional recorder whose retrieve_knowledge is registered,
+                  so that the agent's retrievals are recorded; a fresh one
+                  is used otherwise, its tool also accepts metadata filters;
+                  pass one and reset it for long-lived agents, since the
+                  recorded calls are kept until then
+    
+    Returns:
+        ReActAgent instance
+    """
+    retriever = recorder if recorder is not None else RetrievalRecorder(knowledge)
+    hybrid = _find_knowledge(knowledge, HybridKnowledge) is not None
+    
+    if hybrid:
+        tuning = (
+            "调整 `limit` 参数可以获取更多或更少的结果。"
+            "结果按关键词与语义检索的融合排名排序，Score 是相对排名而不是相似度。"
+        )
+        retry_hint = (
+            "注意：当你无法获取相关结果时，请换用不同的关键词（如标准号、术语的其他说法）或去掉过滤条件。"
+            "如果多次尝试（例如，通过更改查询或过滤条件）后，"
+        )
+    else:
+        tuning = "调整 `limit` 和 `score_threshold` 参数可以获取更多或更少的结果。"
+        retry_hint = (
+            "注意：当你无法获取相关结果时，请调整 `score_threshold` 参数。"
+            "如果多次尝试（例如，通过更改查询或调整 `score_threshold`）后，"
+        )
+    
+    # Create a toolkit and register the RAG tool function
+    toolkit = Toolkit()
+    toolkit.register_tool_function(
+        retriever.retrieve_knowledge,
+        # Preset arguments are left out of the schema shown to the agent
+        preset_kwargs={"score_threshold": None} if hybrid else None,
+        func_description=(
+            "从知识库中检索行业标准、技术规范、研究报告和数据表等信息相关的文档。每次回答都要检索。注意，`query` "
+            "参数对检索质量至关重要，你可以尝试不同的查询以获得最佳结果。"
+            + tuning +
+            "已知要查的文档时，用 `standard`（如 \"GB/T 20438\" 表示该标准的全部部分）、"
+            "`source`（结果中的 Source 文件名）、`doc_type` 或 `language` 参数缩小检索范围。"
+        ),
+    )
+
+    return ReActAgent(
+        name="Friday",
+        sys_prompt=(
+            "你是一个名为‘星期五’的乐于助人的助手。"
+            "你配备了一个 'retrieve_knowledge' 工具，你可以从中获得行业标准、技术规范、研究报告和数据表等信息。"
+            "你回答相关问题时可以用'retrieve_knowledge' 工具，检索信息。"
+            + retry_hint +
+            "'retrieve_knowledge' 工具仍然返回空结果或找不到相关信息，你应该礼貌地告知用户你没有找到相关信息，而不是继续无效的尝试。"
+        ),
+        toolkit=toolkit,
+        model=model,
+        formatter=OpenAIChatFormatter(),
+    )
+
+
 async def answer_questions_batch(
-    agent: ReActAgent,
+    agent_factory: Callable[[RetrievalRecorder], ReActAgent],
     knowledge: SimpleKnowledge,
     questions_dict: dict,
     output_file: str = None,
-) -> tuple:
+    concurrency: int = 1,
+) -> str:
     """
     Batch answer questions from markdown and save to JSON.
     
+    With concurrency 1 a single agent answers all questions in order. With a
+    higher concurrency up to that many questions are answered at the same
+    time, each by a fresh agent with isolated memory. The output file keeps
+    the question order either way.
+    
+    Every answer is appended to a checkpoint file next to the output file
+    ("<output>.checkpoint.jsonl") as soon as it is available. Running again
+    with the same questions and output file skips the questions already in
+    the checkpoint, so an interrupted run can be resumed.
+    
+    The retrievals made for each question are written to the "result" field,
+    and the checkpoint additionally records every retrieval call and the
+    time spent in retrieval and in the LLM for each question.
+    
     Args:
-        agent: ReActAgent instance
+        agent_factory: Callable returning a new ReActAgent instance whose
+                       retrievals are recorded by the given recorder
         knowledge: SimpleKnowledge instance
         questions_dict: Questions dictionary from QuestionReader.parse_markdown
         output_file: Output JSON file path (auto-generated if None)
+        concurrency: Maximum number of questions answered in parallel
         
     Returns:
-        (answers_dict, output_file_path)
+        Path to the output file
     """
-    all_answers = {}
-    retrieve_results = {}
+    if output_file is None:
+        output_file = AnswerWriter.default_output_path()
+    
+    checkpoint = AnswerCheckpoint(f"{os.path.splitext(output_file)[0]}.checkpoint.jsonl")
+    failed_answers = {category: {} for category in questions_dict}
     
-    # Calculate total questions
+    # Skip the questions answered by a previous run
+    pending_questions = [
+        (category, q)
+        for category in sorted(questions_dict.keys())
+        for q in questions_dict[category]
+        if not checkpoint.is_answered(category, q['id'], q['text'])
+    ]
     total_questions = sum(len(q_list) for q_list in questions_dict.values())
+    answered_before = total_questions - len(pending_questions)
     
     print(f"\n{'='*70}")
-    print(f"开始自动回答问题 (共 {total_questions} 道题)")
+    print(f"开始自动回答问题 (共 {total_questions} 道题, 并发数 {concurrency})")
+    if answered_before:
+        print(f"从检查点恢复: {checkpoint.path} 中已有 {answered_before} 道题的答案")
     print(f"{'='*70}\n")
     
-    # Use progress bar for overall progress
-    with tqdm(total=total_questions, desc="总体进度", unit="题") as overall_pbar:
-        for category in sorted(questions_dict.keys()):
-            print(f"\n{'='*70}")
-            print(f"类别: {category}")
-            print(f"{'='*70}")
+    if concurrency <= 1:
+        shared_recorder = RetrievalRecorder(knowledge)
+        shared_agent = agent_factory(shared_recorder)
+    else:
+        shared_recorder, shared_agent = None, None
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    
+    # Totals over the questions answered in this run
+    stats = {"answered": 0, "total_s": 0.0, "retrieval_s": 0.0, "retrieval_calls": 0}
+    
+    async def answer_one(category: str, q: dict, pbar: tqdm) -> None:
+        q_id = q['id']
+        q_text = q['text']
+        
+        async with semaphore:
+            if shared_agent is not None:
+                agent, recorder = shared_agent, shared_recorder
+                recorder.reset()
+            else:
+                recorder = RetrievalRecorder(knowledge)
+                agent = agent_factory(recorder)
+                # Streamed output of parallel agents would interleave
+                agent.set_console_output_enabled(False)
             
-            all_answers[category] = {}
-            retrieve_results[category] = {}
-            questions_list = questions_dict[category]
+            # Display current question
+            print(f"\n[{category} #{q_id}] {q_text[:100]}...")
             
-            for q in questions_list:
-                q_id = q['id']
-                q_text = q['text']
+            try:
+                # Submit question to agent
+                start = time.perf_counter()
+                msg = Msg("user", q_text, "user")
+                response_msg = await agent(msg)
+                answer_text = response_msg.get_text_content()
+                total_time = time.perf_counter() - start
                 
-                # Display current question
-                print(f"\n[{category} #{q_id}] {q_text[:100]}...")
+                # Everything outside the retrieval calls is spent in the LLM
+                # and the agent loop
+                timing = {
+                    "total_s": round(total_time, 3),
+                    "retrieval_s": round(recorder.retrieval_time, 3),
+                    "llm_s": round(total_time - recorder.retrieval_time, 3),
+                    "retrieval_calls": len(recorder.calls),
+                }
                 
-                try:
-                    # Submit question to agent
-                    msg = Msg("user", q_text, "user")
-                    response_msg = await agent(msg)
-                    answer_text = response_msg.get_text_content()
-                    
-                    # Store answer
-                    all_answers[category][q_id] = answer_text
-                    retrieve_results[category][q_id] = []  # Retrieve results placeholder
-                    
-                    print(f"✓ 答案: {answer_text[:150]}...")
-                    
-                except Exception as e:
-                    error_msg = f"Error: {str(e)}"
-                    all_answers[category][q_id] = error_msg
-                    retrieve_results[category][q_id] = []
-                    print(f"✗ 出错: {error_msg}")
+                # Persist the answer right away
+                checkpoint.append({
+                    "category": category,
+                    "id": q_id,
+                    "query": q_text,
+                    "result": recorder.result_items(),
+                    "answer": answer_text,
+                    "timing": timing,
+                    "retrieval_calls": recorder.call_log(),
+                })
                 
-                overall_pbar.update(1)
+                stats["answered"] += 1
+                stats["total_s"] += total_time
+                stats["retrieval_s"] += recorder.retrieval_time
+                stats["retrieval_calls"] += len(recorder.calls)
+                
+                print(f"✓ [{category} #{q_id}] 答案: {answer_text[:150]}...")
+                
+            except Exception as e:
+                # Failed questions are not checkpointed, so they are retried
+                # on the next run
+                error_msg = f"Error: {str(e)}"
+                failed_answers[category][q_id] = error_msg
+                print(f"✗ [{category} #{q_id}] 出错: {error_msg}")
+            
+            pbar.update(1)
+    
+    # Use progress bar for overall progress. Tasks acquire the semaphore in
+    # creation order, so concurrency 1 answers the questions in file order.
+    try:
+        with tqdm(
+            total=total_questions,
+            initial=answered_before,
+            desc="总体进度",
+            unit="题",
+        ) as overall_pbar:
+            async with asyncio.TaskGroup() as tg:
+                for category, q in pending_questions:
+                    tg.create_task(answer_one(category, q, overall_pbar))
+    finally:
+        checkpoint.close()
     
-    # Save answers to JSON
-    output_path = AnswerWriter.write_answers(
+    # Save answers to JSON in question order
+    output_path = AnswerWriter.write_answers_from_checkpoint(
         questions_dict,
-        all_answers,
+        checkpoint,
         output_file,
-        retrieve_results
+        failed_answers
     )
     
     print(f"\n{'='*70}")
     print(f"✓ 所有答案已保存到: {output_path}")
+    if isinstance(knowledge, CachedKnowledge):
+        print(knowledge.cache.summary())
+    if stats["answered"]:
+        n = stats["answered"]
+        print(
+            f"平均每题耗时 {stats['total_s'] / n:.2f}s "
+            f"(检索 {stats['retrieval_s'] / n:.2f}s, "
+            f"LLM {(stats['total_s'] - stats['retrieval_s']) / n:.2f}s, "
+            f"检索调用 {stats['retrieval_calls'] / n:.1f} 次)"
+        )
     print(f"{'='*70}\n")
     
-    return all_answers, output_path
+    return output_path
 
 
 async def main(
     docs_directory: str,
     db_location: str,
     load_method: str,
+    *,
     batch_size: int = 50,
     chunk_size: int = 1024,
     overlap: int = 200,
     markdown_file: str = None,
     output_file: str = None,
+    manifest_file: str = None,
+    embedding_cache: str = None,
+    embedding_cache_size: int = 100_000,
+    embed_concurrency: int = 4,
+    concurrency: int = 1,
+    retrieval: str = "vector",
+    bm25_index_file: str = "bm25_index.npz",
+    retrieval_cache_size: int = 1024,
+    retrieval_cache_ttl: float = 3600.0,
+    semantic_cache_threshold: float = None,
+    load_workers: int = 1,
+    tokenizer: str = None,
+    dedup_threshold: float = None,
+    context_window: int = 0,
+    context_chars: int = 4000,
+    context_store_dir: str = "context_store",
+    rerank: str = "none",
+    rerank_model: str = "BAAI/bge-reranker-base",
+    rerank_factor: int = 4,
+    ivf_lists: int = 0,
+    quantization: str = None,
+    collection_name: str = "test_collection",
+    snapshots_dir: str = None,
+    ready_timeout: float = 60.0,
+    reindex: bool = False,
+    reindex_batch_size: int = 512,
+    keep_previous: bool = False,
 ) -> None:
     """
     The main entry of the agent usage example for RAG in AgentScope.
     
     Args:
-        docs_directory: Path to the directory containing .txt files, or "none" to skip loading
-        db_location: Either ":memory:" for in-memory storage or 
-                     "http://localhost:6333" for remote Qdrant server
-        load_method: Either "chunked", "direct", or "overlap"
+        docs_directory: Path to the directory containing .txt or .pdf files, or "none" to skip loading
+        db_location: Either ":memory:" for in-memory storage,
+                     "http://localhost:6333" for remote Qdrant server or
+                     "local:<path>" for an embedded store in <path>
+        load_method: Either "chunked", "direct", "overlap", or "token"
         batch_size: Number of documents to process in each batch
-        chunk_size: Size of each chunk in characters
-        overlap: Overlap size for "overlap" load method
+        chunk_size: Size of each chunk in characters (in tokens for "token")
+        overlap: Overlap size for "overlap" and "token" load methods
         markdown_file: Path to markdown file with questions (for batch answering)
         output_file: Path to save answers JSON (auto-generated if None)
+        manifest_file: Path of the ingestion manifest used for incremental
+                       loading into a persistent database (defaults to
+                       ".ingest_manifest.json" in docs_directory)
+        embedding_cache: Path to the SQLite embedding cache (None to disable)
+        embedding_cache_size: Maximum number of cached embeddings
+        embed_concurrency: Number of embedding batches in flight during loading
+        concurrency: Number of questions answered in parallel in batch mode
+        retrieval: Either "vector" or "hybrid" (vector + BM25)
+        bm25_index_file: Path of the BM25 index kept next to a persistent
+                         database in hybrid mode
+        retrieval_cache_size: Maximum number of cached retrieval results
+                              (0 to disable the cache)
+        retrieval_cache_ttl: Seconds a cached retrieval result stays valid
+        semantic_cache_threshold: Minimum cosine similarity for reusing the
+                                  results of a near-duplicate query (None for
+                                  exact hits only)
+        load_workers: Number of processes loading and chunking files in
+                      parallel with the embedding stage
+        tokenizer: Tokenizer counting tokens for the "token" load method, a
+                   tokenizer.json path or "tiktoken:<encoding>" (None for a
+                   character-class estimate)
+        dedup_threshold: Minimum estimated Jaccard similarity for dropping a
+                         chunk as a near-duplicate of a chunk of another
+                         document before embedding (None to keep all chunks)
+        context_window: Number of neighbouring chunks returned on each side
+                        of every retrieved chunk (0 to disable)
+        context_chars: Character budget of the text returned by one
+                       retrieval when neighbours are added
+        context_store_dir: Chunk store the neighbours are read from, kept
+                           next to a persistent database
+        rerank: Either "none", "lexical" (query-term coverage) or
+                "cross-encoder" (local model on CPU)
+        rerank_model: Name or path of the cross-encoder model
+        rerank_factor: Number of candidates fetched per returned chunk when
+                       reranking
+        ivf_lists: Number of IVF lists of an embedded store, rebuilt after
+                   loading when many chunks were added (0 for exact search)
+        quantization: "int8" or "pq" to search quantized vectors and
+                      rescore the candidates with the float vectors (None
+                      for float vectors only)
+        collection_name: Name of the collection, or of an alias of it
+        snapshots_dir: Snapshots directory of the Qdrant server, the
+                       collection is restored from it when missing and
+                       snapshotted after new documents are loaded (None to
+                       disable snapshots)
+        ready_timeout: Seconds to wait for the Qdrant server to be ready
+        reindex: Rebuild the whole Qdrant collection in the background into
+                 a new versioned collection and swap the collection_name
+                 alias to it, answering from the old one meanwhile
+        reindex_batch_size: Number of documents in each write of a re-index
+        keep_previous: Keep the collection replaced by a re-index
     """
+    # A Qdrant server may still be starting or loading its collections,
+    # nothing is read or written before it is ready. A missing collection is
+    # restored from its snapshot instead of being embedded again.
+    qdrant_client = None
+    if db_location.startswith("http"):
+        from qdrant_client import QdrantClient
+
+        wait_until_ready(db_location, timeout=ready_timeout)
+        qdrant_client = QdrantClient(url=db_location)
+        if snapshots_dir is not None:
+            restored = restore_snapshot(qdrant_client, collection_name, snapshots_dir)
+            if restored is not None:
+                print(f"Restored collection {collection_name} from snapshot: {restored}")
+
+    # The BM25 index is persisted alongside a persistent database only, an
+    # in-memory database is rebuilt from scratch on every run
+    bm25_index = None
+    if retrieval == "hybrid":
+        if db_location != ":memory:" and os.path.exists(bm25_index_file):
+            bm25_index = BM25Index.load(bm25_index_file)
+        else:
+            bm25_index = BM25Index()
+
+    retrieval_cache = None
+    if retrieval_cache_size > 0:
+        retrieval_cache = RetrievalCache(
+            max_entries=retrieval_cache_size,
+            ttl=retrieval_cache_ttl,
+            similarity_threshold=semantic_cache_threshold,
+        )
+
+    # A chunk store holds chunks that are already split, they are read from
+    # its index instead of re-chunking files
+    source_store = None
+    if docs_directory.lower() != "none" and ChunkStore.is_store(docs_directory):
+        source_store = ChunkStore(docs_directory)
+
+    # Neighbours of retrieved chunks are read from the source chunk store, a
+    # store kept next to a persistent database, or a temporary store filled
+    # along with an in-memory database
+    context_store = None
+    context_store_tmp = None
+    if context_window > 0:
+        if source_store is not None:
+            context_store = source_store
+        elif db_location == ":memory:":
+            context_store_tmp = tempfile.TemporaryDirectory(prefix="context_store_")
+            context_store = ChunkStore(context_store_tmp.name)
+        else:
+            context_store = ChunkStore(context_store_dir)
+
+    reranker = None
+    if rerank == "lexical":
+        reranker = LexicalReranker()
+    elif rerank == "cross-encoder":
+        reranker = CrossEncoderReranker(rerank_model)
+
     # Create knowledge base with specified location
-    knowledge = create_knowledge_base(db_location)
+    knowledge = create_knowledge_base(
+        db_location,
+        embedding_cache=embedding_cache,
+        embedding_cache_size=embedding_cache_size,
+        bm25_index=bm25_index,
+        retrieval_cache=retrieval_cache,
+        context_store=context_store,
+        context_window=context_window,
+        context_chars=context_chars,
+        reranker=reranker,
+        rerank_factor=rerank_factor,
+        ivf_lists=ivf_lists,
+        quantization=quantization,
+        collection_name=collection_name,
+    )
     
     print(f"Using database location: {db_location}")
+    print(f"Using collection: {collection_name}")
+    print(f"Using retrieval: {retrieval}")
+    if quantization is not None:
+        print(f"Using vector quantization: {quantization}")
+    if reranker is not None:
+        print(f"Using reranking: {rerank} ({rerank_factor}x candidates)")
+    if isinstance(knowledge.embedding_store, LocalVectorStore):
+        print(f"Using local vector store: {len(knowledge.embedding_store)} chunks")
+    if embedding_cache:
+        print(f"Using embedding cache: {embedding_cache}")
+    if bm25_index is not None and db_location != ":memory:":
+        print(f"Using BM25 index: {bm25_index_file} ({len(bm25_index)} chunks)")
+    if context_store is not None:
+        print(f"Using context expansion: ±{context_window} chunks, {context_chars} chars")
+        if context_store is not source_store and context_store_tmp is None:
+            print(f"Using context store: {context_store_dir} ({len(context_store)} chunks)")
     
+    # The manifest of a persistent database, keyed by the collection or alias
+    # the agent reads from
+    manifest_path = manifest_file or os.path.join(docs_directory, ".ingest_manifest.json")
+    manifest_collection = f"{db_location}/{knowledge.embedding_store.collection_name}"
+    manifest_params = {
+        "load_method": load_method,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "split_by": "char",
+        "tokenizer": tokenizer,
+        "dedup_threshold": dedup_threshold,
+        # Chunks loaded before the document fields existed are reloaded
+        "payload_fields": list(FILTER_FIELDS),
+    }
+
+    reindex_task = None
+    if reindex:
+        # The whole source is loaded into a new collection in the background,
+        # the agent keeps answering from the current one until the swap
+        manifest = None
+        if source_store is not None:
+            print(f"Re-indexing {len(source_store)} chunks from chunk store: {docs_directory}")
+            documents = source_store.iter_documents()
+        else:
+            print(f"Using load method: {load_method}")
+            print(f"Re-indexing documents from: {docs_directory}")
+            # Every file is loaded again, so the manifest is rebuilt from
+            # scratch and only replaces the old one after the swap
+            manifest = IngestManifest(manifest_path, manifest_collection, manifest_params)
+            manifest.entries = {}
+            documents = iter_documents_from_files(
+                list_files_to_load(docs_directory),
+                load_method=load_method,
+                chunk_size=chunk_size,
+                overlap=overlap,
+                split_by="char",
+                manifest=manifest,
+                workers=load_workers,
+                tokenizer=tokenizer,
+            )
+        # Neighbours must come from the new chunking, so a new context store
+        # is filled next to the current one and replaces it after the swap
+        new_context_store = None
+        new_context_dir = f"{context_store_dir}.reindex"
+        if context_store is not None and context_store is not source_store:
+            shutil.rmtree(new_context_dir, ignore_errors=True)
+            new_context_store = ChunkStore(new_context_dir)
+            documents = new_context_store.append_while_iterating(documents)
+
+        deduplicator = None
+        if dedup_threshold is not None:
+            deduplicator = ChunkDeduplicator(threshold=dedup_threshold)
+            documents = deduplicator.dedup(documents)
+
+        def on_promoted() -> None:
+            if new_context_store is not None:
+                old_context_dir = f"{context_store_dir}.old"
+                shutil.rmtree(old_context_dir, ignore_errors=True)
+                os.replace(context_store_dir, old_context_dir)
+                os.replace(new_context_dir, context_store_dir)
+                shutil.rmtree(old_context_dir)
+                expanded = _find_knowledge(knowledge, ContextExpandedKnowledge)
+                expanded.chunk_store = ChunkStore(context_store_dir)
+                print(f"Rebuilt context store: {context_store_dir} ({len(expanded.chunk_store)} chunks)")
+            if manifest is not None:
+                if deduplicator is not None:
+                    manifest.record_duplicates(deduplicator.duplicate_of)
+                manifest.save()
+            if snapshots_dir is not None:
+                snapshot = create_snapshot(qdrant_client, collection_name, snapshots_dir)
+                print(f"Created snapshot of {collection_name}: {snapshot}")
+
+        reindex_task = asyncio.create_task(reindex_knowledge_base(
+            knowledge,
+            qdrant_client,
+            db_location,
+            documents,
+            batch_size=reindex_batch_size,
+            max_concurrency=embed_concurrency,
+            quantization=quantization,
+            bm25_index_file=bm25_index_file,
+            keep_previous=keep_previous,
+            deduplicator=deduplicator,
+            on_promoted=on_promoted,
+        ))
     # Load documents only if docs_directory is not "none"
-    if docs_directory.lower() != "none":
-        print(f"Using load method: {load_method}")
-        print(f"Loading documents from: {docs_directory}")
+    elif docs_directory.lower() != "none":
+        if source_store is not None:
+            print(f"Loading {len(source_store)} chunks from chunk store: {docs_directory}")
+        else:
+            print(f"Using load method: {load_method}")
+            print(f"Loading documents from: {docs_directory}")
         
-        # Load documents from directory
-        all_documents = await load_documents_from_directory(
-            docs_directory,
-            load_method=load_method,
-            chunk_size=chunk_size,
-            overlap=overlap,
-            split_by="char"
-        )
+        # An in-memory database starts empty, so only a persistent one can be
+        # updated incrementally
+        manifest = None
+        if db_location != ":memory:" and source_store is None:
+            manifest = IngestManifest(manifest_path, manifest_collection, manifest_params)
+            print(f"Using ingestion manifest: {manifest.path}")
+        
+        # List the files to load, skipping the unchanged ones
+        file_paths = []
+        if source_store is None:
+            file_paths = list_files_to_load(docs_directory, manifest)
+
+        if manifest is not None:
+            # Unchanged files whose duplicate chunks were only stored as
+            # chunks of a changed file must be loaded again
+            dependents = manifest.reload_dependents()
+            if dependents:
+                print(f"Reloading {len(dependents)} files depending on changed duplicates")
+                file_paths = sorted(
+                    file_paths
+                    + [os.path.join(docs_directory, filename) for filename in dependents]
+                )
 
-        if all_documents:
-            print(f"Total documents loaded: {len(all_documents)}")
-            # Add documents with progress bar and batching
-            await add_documents_with_progress(knowledge, all_documents, batch_size=batch_size)
+            # Remove chunks of changed or deleted files before adding the new
+            # ones, since re-chunked files may keep the same doc_id
+            stale_doc_ids = manifest.stale_doc_ids()
+            if stale_doc_ids:
+                print(f"Removing stale chunks of {len(stale_doc_ids)} documents")
+                await delete_documents_by_doc_id(knowledge, stale_doc_ids)
+                if bm25_index is not None:
+                    bm25_index.remove_doc_ids(stale_doc_ids)
+                if context_store is not None:
+                    context_store.remove_doc_ids(stale_doc_ids)
+            for filename in manifest.removed_files():
+                print(f"  removed: {filename}")
+            # Stop referencing the deleted chunks right away, so an
+            # interrupted run reloads the changed files next time
+            manifest.save()
+            if bm25_index is not None:
+                bm25_index.save(bm25_index_file)
+
+        added_docs = 0
+        deduplicator = None
+        documents = None
+        if source_store is not None:
+            documents = source_store.iter_documents()
+        elif file_paths:
+            # Documents are streamed from the files into the ingest pipeline,
+            # so embedding starts with the first chunk and memory use does
+            # not grow with the corpus
+            documents = iter_documents_from_files(
+                file_paths,
+                load_method=load_method,
+                chunk_size=chunk_size,
+                overlap=overlap,
+                split_by="char",
+                manifest=manifest,
+                workers=load_workers,
+                tokenizer=tokenizer,
+            )
+            # Every chunk is kept for context expansion, including the
+            # near-duplicates that are not embedded
+            if context_store is not None:
+                documents = context_store.append_while_iterating(documents)
+        if documents is not None:
+            if dedup_threshold is not None:
+                deduplicator = ChunkDeduplicator(threshold=dedup_threshold)
+                documents = deduplicator.dedup(documents)
+            added_docs = await add_documents_with_progress(
+                knowledge,
+                documents,
+                batch_size=batch_size,
+                max_concurrency=embed_concurrency,
+                # The ingest pipeline writes to the vector store directly
+                on_batch_added=bm25_index.add if bm25_index is not None else None,
+            )
+
+        if deduplicator is not None:
+            print(deduplicator.summary())
+            # The canonical chunks may have been written before their
+            # duplicates were seen, so their payloads are updated afterwards
+            await knowledge.embedding_store.update_payloads(
+                deduplicator.canonical_updates(),
+            )
+            if manifest is not None:
+                manifest.record_duplicates(deduplicator.duplicate_of)
+
+        if added_docs:
+            print(f"Total documents loaded: {added_docs}")
+        elif manifest is not None:
+            print("Knowledge base is up to date, no new documents to add")
         else:
             print("No documents were loaded!")
+
+        if manifest is not None:
+            manifest.save()
+            if bm25_index is not None:
+                bm25_index.save(bm25_index_file)
+
+        # A snapshot of the updated collection makes the next cold start a
+        # snapshot restore
+        if added_docs and qdrant_client is not None and snapshots_dir is not None:
+            snapshot = create_snapshot(qdrant_client, collection_name, snapshots_dir)
+            print(f"Created snapshot of {collection_name}: {snapshot}")
+
+        store = knowledge.embedding_store
+        if isinstance(store, LocalVectorStore):
+            rebuilt = store.optimize()
+            if rebuilt:
+                print(f"Rebuilt {', '.join(rebuilt)} of the local vector store ({len(store)} chunks)")
+
+        # The ingest pipeline bypasses add_documents, so results cached
+        # before the collection changed must be dropped explicitly
+        if isinstance(knowledge, CachedKnowledge):
+            knowledge.invalidate()
     else:
         print("Skipping document loading (using existing knowledge base data)")
 
-    # Create a toolkit and register the RAG tool function
-    toolkit = Toolkit()
-    toolkit.register_tool_function(
-        knowledge.retrieve_knowledge,
-        func_description=(
-            "从知识库中检索行业标准、技术规范、研究报告和数据表等信息相关的文档。每次回答都要检索。注意，`query` "
-            "参数对检索质量至关重要，你可以尝试不同的查询以获得最佳结果。"
-            "调整 `limit` 和 `score_threshold` 参数可以获取更多或更少的结果。"
-        ),
-    )
+    # Collections written before the payload indexes existed get them here,
+    # for the others this is a no-op
+    store = knowledge.embedding_store
+    if isinstance(store, PayloadQdrantStore) and await store.get_client().collection_exists(
+        store.collection_name,
+    ):
+        await store.create_payload_indexes()
 
-    # Create an agent and a user
-    agent = ReActAgent(
-        name="Friday",
-        sys_prompt=(
-            "你是一个名为‘星期五’的乐于助人的助手。"
-            "你配备了一个 'retrieve_knowledge' 工具，你可以从中获得行业标准、技术规范、研究报告和数据表等信息。"
-            "你回答相关问题时可以用'retrieve_knowledge' 工具，检索信息。"
-            "注意：当你无法获取相关结果时，请调整 `score_threshold` 参数。"
-            "如果多次尝试（例如，通过更改查询或调整 `score_threshold`）后，'retrieve_knowledge' 工具仍然返回空结果或找不到相关信息，你应该礼貌地告知用户你没有找到相关信息，而不是继续无效的尝试。"
-        ),
-        toolkit=toolkit,
-        model=OpenAIChatModel(
-            api_key=os.environ["AI_STORE_API_KEY"],
-            client_args={
-                "base_url": "https://ai.api.coregpu.cn/v1/"
-            },
-            model_name="Qwen3-235B-A22B",
-        ),
-        formatter=OpenAIChatFormatter(),
+    if bm25_index is not None and not len(bm25_index):
+        print(
+            "Warning: BM25 index is empty, hybrid retrieval falls back to "
+            "vector results only. Reload the documents (e.g. with a new "
+            "--manifest) to build it"
+        )
+    if context_store is not None and not len(context_store):
+        print(
+            "Warning: context store is empty, retrieved chunks are returned "
+            "without their neighbours. Reload the documents (e.g. with a new "
+            "--manifest) to fill it"
+        )
+
+    # One chat model shared by all agents, so they share its HTTP client pool
+    model = OpenAIChatModel(
+        api_key=os.environ["AI_STORE_API_KEY"],
+        client_args={
+            "base_url": "https://ai.api.coregpu.cn/v1/"
+        },
+        model_name="Qwen3-235B-A22B",
     )
+
     user = UserAgent(name="User")
     
     # If markdown file is provided, do batch question answering
@@ -255,20 +1143,26 @@ async def main(
         
         # Batch answer questions
         await answer_questions_batch(
-            agent=agent,
+            agent_factory=lambda recorder: create_agent(knowledge, model, recorder),
             knowledge=knowledge,
             questions_dict=questions_dict,
-            output_file=output_file
+            output_file=output_file,
+            concurrency=concurrency,
         )
     else:
-        # Interactive chat mode
+        # Interactive chat mode, the recorder only provides the filtered
+        # retrieval tool and is cleared after each turn
+        recorder = RetrievalRecorder(knowledge)
+        agent = create_agent(knowledge, model, recorder)
+        
         print("\n" + "="*50)
         print("RAG Agent Chat Interface")
         print("Type 'exit' to quit")
         print("="*50 + "\n")
         
-        # Get the first message from the user
-        user_input = input("User: ")
+        # Get the first message from the user, reading input in a thread so
+        # a background re-index keeps running while waiting
+        user_input = await asyncio.to_thread(input, "User: ")
         
         while user_input.strip() != "exit":
             msg = Msg(
@@ -277,12 +1171,18 @@ async def main(
                 "user",
             )
             msg = await agent(msg)
+            recorder.reset()
             print(f"\nAgent: {msg.get_text_content()}\n")
             
-            user_input = input("User: ")
+            user_input = await asyncio.to_thread(input, "User: ")
         
         print("Goodbye!")
 
+    if reindex_task is not None:
+        if not reindex_task.done():
+            print("Waiting for the re-index to finish...")
+        await reindex_task
+
 
 def main_entry():
     """Entry point with command-line argument parsing."""
@@ -293,21 +1193,20 @@ def main_entry():
         "--docs-dir",
         type=str,
         required=True,
-        help="Directory containing .txt files to load into the knowledge base, or 'none' to skip loading and use existing data"
+        help="Directory containing .txt or .pdf files to load into the knowledge base, a chunk store built by chunk_store.py, or 'none' to skip loading and use existing data; PDFs are chunked directly with page metadata"
     )
     parser.add_argument(
         "--load-method",
         type=str,
-        choices=["chunked", "direct", "overlap"],
+        choices=["chunked", "direct", "overlap", "token"],
         default="chunked",
-        help="Method to load documents: 'chunked' for pre-chunked, 'direct' for raw text, 'overlap' for text with overlap"
+        help="Method to load documents: 'chunked' for pre-chunked, 'direct' for raw text, 'overlap' for text with overlap, 'token' for token-sized chunks split at section/clause/paragraph boundaries"
     )
     parser.add_argument(
         "--db-location",
         type=str,
-        choices=["memory", "localhost"],
         default="memory",
-        help="Database location: 'memory' for in-memory, 'localhost' for http://localhost:6333"
+        help="Database location: 'memory' for in-memory, 'localhost' for http://localhost:6333, 'local:<path>' for an embedded store in <path>"
     )
     parser.add_argument(
         "--batch-size",
@@ -315,17 +1214,41 @@ def main_entry():
         default=100,
         help="Number of documents to process in each batch (default: 50)"
     )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=4,
+        help="Number of embedding requests in flight while loading documents (default: 4)"
+    )
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=1,
+        help="Number of processes loading and chunking files in parallel, results are merged in filename order (default: 1)"
+    )
     parser.add_argument(
         "--chunk-size",
         type=int,
         default=1024,
-        help="Size of each chunk in characters (default: 1024)"
+        help="Size of each chunk in characters, or in tokens in 'token' mode (default: 1024)"
     )
     parser.add_argument(
         "--overlap",
         type=int,
         default=200,
-        help="Overlap size for chunks in 'overlap' mode (default: 200, ignored in other modes)"
+        help="Overlap size for chunks in 'overlap' and 'token' modes (default: 200, ignored in other modes)"
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=None,
+        help="Tokenizer for 'token' mode: path to a local tokenizer.json or 'tiktoken:<encoding>' (default: character-class estimate)"
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="Drop chunks whose estimated Jaccard similarity to a kept chunk of another document is at least this value before embedding, e.g. 0.8 (default: no deduplication)"
     )
     parser.add_argument(
         "--md-file",
@@ -339,22 +1262,200 @@ def main_entry():
         default=None,
         help="Output JSON file path for answers (auto-generated if not specified)"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of questions answered in parallel with --md-file, each by its own agent (default: 1)"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Ingestion manifest for incremental loading into 'localhost' (default: <docs-dir>/.ingest_manifest.json, ignored for 'memory')"
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        type=str,
+        default="embedding_cache.sqlite",
+        help="SQLite file caching embeddings across runs, or 'none' to disable (default: embedding_cache.sqlite)"
+    )
+    parser.add_argument(
+        "--embedding-cache-size",
+        type=int,
+        default=100_000,
+        help="Maximum number of cached embeddings, least recently used ones are evicted (default: 100000)"
+    )
+    parser.add_argument(
+        "--retrieval",
+        type=str,
+        choices=["vector", "hybrid"],
+        default="vector",
+        help="Retrieval method: 'vector' for embedding search only, 'hybrid' to fuse it with BM25 keyword search (default: vector)"
+    )
+    parser.add_argument(
+        "--bm25-index",
+        type=str,
+        default="bm25_index.npz",
+        help="BM25 index file kept with the 'localhost' database in hybrid mode (default: bm25_index.npz, ignored for 'memory')"
+    )
+    parser.add_argument(
+        "--retrieval-cache-size",
+        type=int,
+        default=1024,
+        help="Maximum number of cached retrieval results, 0 to disable the cache (default: 1024)"
+    )
+    parser.add_argument(
+        "--retrieval-cache-ttl",
+        type=float,
+        default=3600.0,
+        help="Seconds a cached retrieval result stays valid (default: 3600)"
+    )
+    parser.add_argument(
+        "--semantic-cache-threshold",
+        type=float,
+        default=None,
+        help="Reuse cached results of near-duplicate queries whose embeddings have at least this cosine similarity, e.g. 0.95 (default: exact hits only)"
+    )
+    parser.add_argument(
+        "--context-window",
+        type=int,
+        default=0,
+        help="Return this many neighbouring chunks on each side of every retrieved chunk, merged into one passage (default: 0, disabled)"
+    )
+    parser.add_argument(
+        "--context-chars",
+        type=int,
+        default=4000,
+        help="Character budget of the passages returned by one retrieval with --context-window (default: 4000)"
+    )
+    parser.add_argument(
+        "--context-store",
+        type=str,
+        default="context_store",
+        help="Chunk store kept with the 'localhost' database for --context-window (default: context_store, ignored for 'memory' and chunk-store --docs-dir)"
+    )
+    parser.add_argument(
+        "--rerank",
+        type=str,
+        choices=["none", "lexical", "cross-encoder"],
+        default="none",
+        help="Rerank over-fetched candidates: 'lexical' by query-term coverage, 'cross-encoder' with a local model on CPU (default: none)"
+    )
+    parser.add_argument(
+        "--rerank-model",
+        type=str,
+        default="BAAI/bge-reranker-base",
+        help="Cross-encoder model name or path for '--rerank cross-encoder' (default: BAAI/bge-reranker-base)"
+    )
+    parser.add_argument(
+        "--rerank-factor",
+        type=int,
+        default=4,
+        help="Number of candidates fetched per returned chunk when reranking, at most 50 in total (default: 4)"
+    )
+    parser.add_argument(
+        "--ivf-lists",
+        type=int,
+        default=0,
+        help="Partition a 'local:<path>' store into this many IVF lists for faster approximate search (default: 0, exact search)"
+    )
+    parser.add_argument(
+        "--quantization",
+        type=str,
+        choices=["none", "int8", "pq"],
+        default="none",
+        help="Search int8 scalar-quantized (4x smaller) or product-quantized (32x smaller) vectors and rescore the best candidates with the float vectors; for 'localhost' it applies when the collection is created (default: none)"
+    )
+    parser.add_argument(
+        "--collection",
+        type=str,
+        default="test_collection",
+        help="Name of the collection, or of an alias of it (default: test_collection)"
+    )
+    parser.add_argument(
+        "--snapshots-dir",
+        type=str,
+        default="qdrant_snapshots",
+        help="Snapshots directory of the 'localhost' server started by qdrant-server.py: a missing collection is restored from it, and snapshotted into it after new documents are loaded; 'none' to disable (default: qdrant_snapshots)"
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=60.0,
+        help="Seconds to wait for the 'localhost' server to be ready (default: 60)"
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Rebuild the 'localhost' collection from --docs-dir into a new versioned collection in the background, then atomically point the --collection alias at it; questions are answered from the current index meanwhile"
+    )
+    parser.add_argument(
+        "--reindex-batch-size",
+        type=int,
+        default=512,
+        help="Number of documents in each write of a --reindex, indexing is deferred until the load completes (default: 512)"
+    )
+    parser.add_argument(
+        "--keep-previous",
+        action="store_true",
+        help="Keep the collection replaced by --reindex instead of deleting it"
+    )
     
     args = parser.parse_args()
     
     # Convert db_location argument to actual location string
-    db_location = ":memory:" if args.db_location == "memory" else "http://localhost:6333"
+    if args.db_location == "memory":
+        db_location = ":memory:"
+    elif args.db_location == "localhost":
+        db_location = "http://localhost:6333"
+    elif args.db_location.startswith("local:") and len(args.db_location) > len("local:"):
+        db_location = args.db_location
+    else:
+        parser.error(
+            f"invalid --db-location: {args.db_location!r} "
+            "(choose 'memory', 'localhost' or 'local:<path>')"
+        )
+    if args.reindex and (not db_location.startswith("http") or args.docs_dir.lower() == "none"):
+        parser.error("--reindex requires --db-location localhost and a --docs-dir")
     
     # Run the async main function
     asyncio.run(main(
-        args.docs_dir,
-        db_location,
-        args.load_method,
-        args.batch_size,
-        args.chunk_size,
-        args.overlap,
-        args.md_file,
-        args.output
+        docs_directory=args.docs_dir,
+        db_location=db_location,
+        load_method=args.load_method,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        overlap=args.overlap,
+        markdown_file=args.md_file,
+        output_file=args.output,
+        manifest_file=args.manifest,
+        embedding_cache=None if args.embedding_cache.lower() == "none" else args.embedding_cache,
+        embedding_cache_size=args.embedding_cache_size,
+        embed_concurrency=args.embed_concurrency,
+        concurrency=args.concurrency,
+        retrieval=args.retrieval,
+        bm25_index_file=args.bm25_index,
+        retrieval_cache_size=args.retrieval_cache_size,
+        retrieval_cache_ttl=args.retrieval_cache_ttl,
+        semantic_cache_threshold=args.semantic_cache_threshold,
+        load_workers=args.load_workers,
+        tokenizer=args.tokenizer,
+        dedup_threshold=args.dedup_threshold,
+        context_window=args.context_window,
+        context_chars=args.context_chars,
+        context_store_dir=args.context_store,
+        rerank=args.rerank,
+        rerank_model=args.rerank_model,
+        rerank_factor=args.rerank_factor,
+        ivf_lists=args.ivf_lists,
+        quantization=None if args.quantization == "none" else args.quantization,
+        collection_name=args.collection,
+        snapshots_dir=None if args.snapshots_dir.lower() == "none" else args.snapshots_dir,
+        ready_timeout=args.ready_timeout,
+        reindex=args.reindex,
+        reindex_batch_size=args.reindex_batch_size,
+        keep_previous=args.keep_previous,
     ))
 
 
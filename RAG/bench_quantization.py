@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+向量量化的召回率与内存对比脚本。
+
+读取 `--db-location local:<目录>` 本地向量存储中的向量（vectors.f32），
+随机取出一部分向量作为查询（不参与被检索的向量集合），以 float32 精确检索的
+前 k 个结果为基准，对比：
+- float32：精确检索
+- int8：标量量化，每维 1 字节
+- pq：乘积量化，每 8 维 1 字节
+
+量化方式分别报告只用量化向量检索的召回率，以及取前 k × oversampling 个候选
+再用 float32 向量重新打分后的召回率。
+
+用法:
+    python bench_quantization.py --store vector_store
+    python bench_quantization.py --store vector_store --queries 500 --limit 10 --oversampling 4
+"""
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from local_vector_store import CONFIG_FILE, VECTORS_FILE
+from vector_quantization import ProductQuantizer, ScalarQuantizer
+
+
+def _load_vectors(store_path: str) -> np.ndarray:
+    """以内存映射方式读取本地向量存储中的向量。"""
+    with open(os.path.join(store_path, CONFIG_FILE), "r", encoding="utf-8") as f:
+        dimensions = json.load(f)["dimensions"]
+    return np.memmap(
+        os.path.join(store_path, VECTORS_FILE), dtype=np.float32, mode="r",
+    ).reshape(-1, dimensions)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回分数最高的 k 个下标（不排序）。"""
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k)[:k]
+
+
+def _recall(found: list[np.ndarray], truth: list[np.ndarray]) -> float:
+    """前 k 个结果中与基准相同的比例，对所有查询取平均。"""
+    return float(np.mean([
+        len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)
+    ]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark recall and memory of vector quantization")
+    parser.add_argument(
+        "--store",
+        type=str,
+        required=True,
+        help="Directory of a 'local:<path>' vector store"
+    )
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=200,
+        help="Number of stored vectors held out as queries (default: 200)"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=10,
+        help="Number of results per query recall is measured on (default: 10)"
+    )
+    parser.add_argument(
+        "--oversampling",
+        type=float,
+        default=4.0,
+        help="Candidates rescored with float32 vectors, as a multiple of --limit (default: 4)"
+    )
+    args = parser.parse_args()
+
+    vectors = _load_vectors(args.store)
+    rng = np.random.default_rng(0)
+    held_out = rng.choice(len(vectors), args.queries, replace=False)
+    queries = np.asarray(vectors[held_out])
+    base = np.asarray(vectors[np.setdiff1d(np.arange(len(vectors)), held_out)])
+    n, dimensions = base.shape
+    print(f"{n} 个 {dimensions} 维向量, {len(queries)} 个查询, 召回率 @{args.limit}\n")
+
+    start = time.perf_counter()
+    truth = [_top_k(base @ q, args.limit) for q in queries]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(
+        f"{'float32':<8} 每向量 {dimensions * 4:5d} B  总计 {base.nbytes / 2**20:8.1f} MB  "
+        f"训练 {0:6.1f} s  检索 {exact_ms:7.2f} ms  召回率 1.000"
+    )
+
+    n_candidates = math.ceil(args.limit * args.oversampling)
+    for name, train in (("int8", ScalarQuantizer.train), ("pq", ProductQuantizer.train)):
+        start = time.perf_counter()
+        quantizer = train(base)
+        codes = quantizer.encode(base)
+        build = time.perf_counter() - start
+
+        approximate, rescored = [], []
+        start = time.perf_counter()
+        for q in queries:
+            scores = quantizer.scores(codes, q)
+            approximate.append(_top_k(scores, args.limit))
+            candidates = _top_k(scores, n_candidates)
+            rescored.append(candidates[_top_k(base[candidates] @ q, args.limit)])
+        search_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        print(
+            f"{name:<8} 每向量 {codes.shape[1]:5d} B  总计 {codes.nbytes / 2**20:8.1f} MB  "
+            f"训练 {build:6.1f} s  检索 {search_ms:7.2f} ms  "
+            f"召回率 {_recall(approximate, truth):.3f}  "
+            f"重新打分后 {_recall(rescored, truth):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+分句性能对比脚本。
+
+对比内置分句器（sentence_splitter）与原来的分句路径：
+- nltk：每个文件调用一次 nltk.download("punkt") / nltk.download("punkt_tab")
+  再执行 nltk.sent_tokenize（需要安装 nltk，并使用 --with-nltk 开启，
+  无网络环境下 download 可能长时间阻塞）
+- split：nltk 不可用时的回退方式 text.split("。")
+
+用法:
+    python bench_sentence_split.py --docs-dir ../Data/AI_database2_txt_extracted
+    python bench_sentence_split.py --docs-dir ./docs --with-nltk --repeat 3
+"""
+import argparse
+import os
+import time
+from typing import Callable
+
+
+def _load_texts(docs_directory: str, max_files: int | None) -> list[tuple[str, str]]:
+    """读取目录中的 .txt 文件，返回 (文件名, 内容) 列表。"""
+    filenames = sorted(f for f in os.listdir(docs_directory) if f.endswith(".txt"))
+    if max_files is not None:
+        filenames = filenames[:max_files]
+
+    texts = []
+    for filename in filenames:
+        with open(os.path.join(docs_directory, filename), "r", encoding="utf-8") as f:
+            texts.append((filename, f.read()))
+    return texts
+
+
+def _bench(
+    name: str,
+    setup: Callable[[], Callable[[str], list[str]]],
+    texts: list[tuple[str, str]],
+    repeat: int,
+) -> None:
+    """执行一种分句方式并打印启动耗时、每个文件的开销和吞吐量。"""
+    start = time.perf_counter()
+    split = setup()
+    startup = time.perf_counter() - start
+
+    total_chars = sum(len(text) for _, text in texts)
+    best = float("inf")
+    n_sentences = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n_sentences = sum(len(split(text)) for _, text in texts)
+        best = min(best, time.perf_counter() - start)
+
+    # 空文本的耗时近似为每个文件的固定开销
+    start = time.perf_counter()
+    for _ in range(20):
+        split("")
+    per_file = (time.perf_counter() - start) / 20
+
+    print(
+        f"{name:<10} 启动 {startup * 1000:9.1f} ms  "
+        f"每文件开销 {per_file * 1000:9.3f} ms  "
+        f"总耗时 {best:7.3f} s  "
+        f"吞吐 {total_chars / max(best, 1e-9) / 1e6:7.2f} M字符/s  "
+        f"句子数 {n_sentences}"
+    )
+
+
+def _setup_builtin() -> Callable[[str], list[str]]:
+    from sentence_splitter import split_sentences
+    return split_sentences
+
+
+def _setup_split() -> Callable[[str], list[str]]:
+    return lambda text: text.split("。")
+
+
+def _setup_nltk() -> Callable[[str], list[str]]:
+    import nltk
+
+    def split(text: str) -> list[str]:
+        # 与原实现相同：每次分句都调用 download
+        nltk.download("punkt", quiet=True)
+        nltk.download("punkt_tab", quiet=True)
+        return nltk.sent_tokenize(text)
+
+    return split
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sentence splitting")
+    parser.add_argument(
+        "--docs-dir",
+        type=str,
+        required=True,
+        help="Directory containing .txt files to split"
+    )
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        default=None,
+        help="Only use the first N files (default: all)"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs, the best one is reported (default: 3)"
+    )
+    parser.add_argument(
+        "--with-nltk",
+        action="store_true",
+        help="Also benchmark the previous nltk path (downloads punkt, needs network)"
+    )
+    args = parser.parse_args()
+
+    texts = _load_texts(args.docs_dir, args.max_files)
+    total_chars = sum(len(text) for _, text in texts)
+    print(f"{len(texts)} 个文件, 共 {total_chars / 1e6:.1f} M字符\n")
+
+    _bench("builtin", _setup_builtin, texts, args.repeat)
+    _bench("split", _setup_split, texts, args.repeat)
+    if args.with_nltk:
+        _bench("nltk", _setup_nltk, texts, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
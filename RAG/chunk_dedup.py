@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+近重复 chunk 去重模块。
+
+语料中同时包含标准原文及其修改单、同一系列标准的多个部分，以及文本 PDF 的 OCR 副本，
+前言、范围、规范性引用文件等样板内容会产生大量几乎相同的 chunks。
+本模块在嵌入之前用 MinHash + LSH 找出近重复的 chunks：每组近重复只保留最先出现的一个
+（canonical chunk），其余的不再嵌入和写入，它们所属的 doc_id 记录在
+canonical chunk 的 metadata["duplicate_doc_ids"] 中。
+
+- 文本经过 NFKC 归一化、去掉空白并转为小写后取字符 n-gram，对中英文都适用
+- MinHash 的哈希函数由固定种子生成，签名在不同进程和不同运行之间保持一致
+- LSH 分桶只用于查找候选，是否重复由签名估计的 Jaccard 相似度决定
+- 只在不同文档之间去重，同一文档内部重复的 chunks 都会保留
+"""
+import re
+import unicodedata
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import numpy as np
+
+from agentscope.rag import Document
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 计算 shingle 哈希时的多项式基数
+_SHINGLE_BASE = np.uint64(1_000_003)
+
+# 计算签名时每次处理的 shingle 数量，限制临时数组的大小
+_SIGNATURE_BLOCK = 4096
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """
+    计算文本中所有字符 n-gram 的 64 位哈希。
+
+    Args:
+        text: 输入文本
+        shingle_size: n-gram 的长度，文本更短时整段文本作为一个 n-gram
+
+    Returns:
+        哈希数组（可能包含重复值，不影响 MinHash）
+    """
+    normalized = _WHITESPACE_RE.sub("", unicodedata.normalize("NFKC", text)).lower()
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    size = max(1, min(shingle_size, len(codes)))
+    n = max(1, len(codes) - size + 1)
+
+    # 多项式滚动哈希，uint64 运算自然溢出取模
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(min(size, len(codes))):
+        hashes = hashes * _SHINGLE_BASE + codes[j:j + n]
+    return hashes
+
+
+class MinHasher:
+    """用 multiply-shift 哈希族计算 MinHash 签名。"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1) -> None:
+        """
+        Args:
+            num_perm: 签名长度（哈希函数个数）
+            seed: 生成哈希函数的随机种子
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # 乘数取奇数，取乘积的高 32 位作为哈希值
+        self._a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """计算一组 shingle 哈希的 MinHash 签名（uint32 数组）。"""
+        signature = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint64)
+        for i in range(0, len(hashes), _SIGNATURE_BLOCK):
+            block = hashes[i:i + _SIGNATURE_BLOCK, None]
+            values = (block * self._a + self._b) >> np.uint64(32)
+            np.minimum(signature, values.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    流式的近重复 chunk 过滤器。
+
+    使用流程：
+    1. 用 `dedup` 包装产出 Document 的迭代器，近重复的 chunks 被丢弃；
+    2. 全部写入后，用 `canonical_updates` 把被丢弃 chunks 的 doc_id
+       写入 canonical chunks 的 payload；
+    3. 用 `duplicate_of` 在导入清单中登记文档之间的依赖，
+       canonical chunk 所在的文档过期时，依赖它的文档需要重新导入。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+    ) -> None:
+        """
+        Args:
+            threshold: 判定为近重复的最小 Jaccard 相似度（由签名估计）
+            num_perm: MinHash 签名长度
+            bands: LSH 的分段数，必须整除 num_perm；
+                分段越多，相似度较低的候选越容易被找到，比较次数也越多
+            shingle_size: 字符 n-gram 的长度
+
+        Raises:
+            ValueError: 当 bands 不能整除 num_perm 时抛出
+        """
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) 必须整除 num_perm ({num_perm})")
+
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._hasher = MinHasher(num_perm)
+        self._rows = num_perm // bands
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+
+        # canonical chunks 的签名和 (doc_id, chunk_id)
+        self._signatures: list[np.ndarray] = []
+        self._canonical: list[tuple[str, int]] = []
+        # canonical chunk 序号 -> 被丢弃的近重复 chunks 所属的 doc_id
+        self._duplicate_doc_ids: dict[int, set[str]] = {}
+
+        self.duplicate_of: dict[str, set[str]] = {}
+        """被丢弃 chunks 所属的 doc_id -> 对应 canonical chunks 所属的 doc_id"""
+
+        self.seen = 0
+        self.dropped = 0
+
+    def is_duplicate(self, doc: Document) -> bool:
+        """
+        判断 chunk 是否与其他文档中已保留的 chunk 近重复。
+
+        近重复时登记两者的关系，否则把该 chunk 作为 canonical chunk 加入索引。
+
+        Args:
+            doc: 待判断的 Document
+
+        Returns:
+            True 表示应丢弃该 chunk
+        """
+        self.seen += 1
+        doc_id = doc.metadata.doc_id
+        signature = self._hasher.signature(
+            shingle_hashes(doc.metadata.content["text"], self.shingle_size),
+        )
+        keys = [
+            signature[i * self._rows:(i + 1) * self._rows].tobytes()
+            for i in range(len(self._buckets))
+        ]
+
+        best, best_sim = None, self.threshold
+        checked = set()
+        for buckets, key in zip(self._buckets, keys):
+            for candidate in buckets.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if self._canonical[candidate][0] == doc_id:
+                    continue
+                sim = float(np.mean(self._signatures[candidate] == signature))
+                if sim >= best_sim:
+                    best, best_sim = candidate, sim
+
+        if best is not None:
+            self.dropped += 1
+            self._duplicate_doc_ids.setdefault(best, set()).add(doc_id)
+            self.duplicate_of.setdefault(doc_id, set()).add(self._canonical[best][0])
+            return True
+
+        index = len(self._canonical)
+        self._signatures.append(signature)
+        self._canonical.append((doc_id, doc.metadata.chunk_id))
+        for buckets, key in zip(self._buckets, keys):
+            buckets.setdefault(key, []).append(index)
+        return False
+
+    async def dedup(
+        self,
+        documents: AsyncIterable[Document] | Iterable[Document],
+    ) -> AsyncIterator[Document]:
+        """
+        过滤 Document 流，只产出不是近重复的 chunks。
+
+        Args:
+            documents: 产出 Document 的可迭代对象或异步可迭代对象
+
+        Yields:
+            保留的 Document
+        """
+        if isinstance(documents, AsyncIterable):
+            async for doc in documents:
+                if not self.is_duplicate(doc):
+                    yield doc
+        else:
+            for doc in documents:
+                if not self.is_duplicate(doc):
+                    yield doc
+
+    def canonical_updates(self) -> Iterator[tuple[str, int, dict]]:
+        """
+        产出需要写入向量库的 payload 更新。
+
+        Yields:
+            (doc_id, chunk_id, {"duplicate_doc_ids": [...]})
+        """
+        for index, doc_ids in self._duplicate_doc_ids.items():
+            doc_id, chunk_id = self._canonical[index]
+            yield doc_id, chunk_id, {"duplicate_doc_ids": sorted(doc_ids)}
+
+    def summary(self) -> str:
+        """返回一行去重统计。"""
+        ratio = self.dropped / self.seen if self.seen else 0.0
+        return (
+            f"近重复去重: {self.seen} 个 chunks 中丢弃 {self.dropped} 个 ({ratio:.1%}), "
+            f"{len(self._duplicate_doc_ids)} 个 chunks 记录了重复来源"
+        )
@@ -3,113 +3,225 @@
 文本分块管理模块。
 提供多种文本分块方式，支持 overlap 功能。
 """
+import asyncio
 import os
 import hashlib
 import re
-from typing import Literal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    TYPE_CHECKING,
+)
 
 from agentscope.rag import Document, DocMetadata
 from agentscope.message import TextBlock
 from agentscope.rag import TextReader
 
+from document_fields import document_fields
+from pdf_loader import iter_pdf_documents
+from sentence_splitter import iter_sentences
+from token_chunker import iter_token_chunks, load_token_counter
 
-def split_text_with_overlap(
-    text: str,
+if TYPE_CHECKING:
+    from ingest_manifest import IngestManifest
+
+
+# 流式读取文件时每次读取的字符数
+_READ_BLOCK_SIZE = 1 << 16
+
+# 预分块文件中 chunk 之间的分隔符
+_CHUNK_SEPARATOR_RE = re.compile(r"--- Document Chunk \d+ ---")
+
+# 直接加载 PDF 时 "chunked" 方式的 chunk 大小，与 Data/src/pdf_reader.py 导出 txt 时一致
+PDF_CHUNK_SIZE = 800
+
+# 可以加载的文件类型
+DOCUMENT_EXTENSIONS = (".txt", ".pdf")
+
+
+def _read_blocks(file_path: str, block_size: int = _READ_BLOCK_SIZE) -> Iterator[str]:
+    """按块读取文本文件，换行符的处理与 f.read() 一致。"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            yield block
+
+
+def _iter_split(blocks: Iterable[str], sep: str) -> Iterator[str]:
+    """
+    流式版本的 str.split(sep)：对分块输入产生与整段文本 split 完全相同的结果。
+    """
+    pending = []
+    for block in blocks:
+        parts = block.split(sep)
+        if len(parts) == 1:
+            pending.append(block)
+            continue
+        pending.append(parts[0])
+        yield "".join(pending)
+        yield from parts[1:-1]
+        pending = [parts[-1]]
+    yield "".join(pending)
+
+
+def _iter_units(
+    blocks: Iterable[str],
+    chunk_size: int,
+    split_by: Literal["char", "sentence", "paragraph"],
+) -> Iterator[str]:
+    """按照指定方式把文本流初步分割成句子、段落或定长片段。"""
+    if split_by == "char":
+        # 按字符直接分割，片段边界与整篇文本按 chunk_size 切片一致
+        buffer = ""
+        for block in blocks:
+            buffer += block
+            n_full = len(buffer) - len(buffer) % chunk_size
+            for i in range(0, n_full, chunk_size):
+                yield buffer[i:i + chunk_size]
+            buffer = buffer[n_full:]
+        if buffer:
+            yield buffer
+
+    elif split_by == "sentence":
+        # 按句子分割，使用内置的多语言分句器，无需下载 nltk 模型
+        yield from iter_sentences(blocks)
+
+    elif split_by == "paragraph":
+        # 按段落分割
+        for line in _iter_split(blocks, "\n"):
+            if line.strip():
+                yield line.strip()
+
+    else:
+        raise ValueError(f"不支持的 split_by: {split_by}")
+
+
+def iter_text_chunks(
+    blocks: Iterable[str],
     chunk_size: int = 1024,
     overlap: int = 200,
     split_by: Literal["char", "sentence", "paragraph"] = "char"
-) -> list[str]:
+) -> Iterator[str]:
     """
-    将文本分割成带有重叠的 chunks。
-    
+    将分块输入的文本流分割成带有重叠的 chunks，边读边产出。
+
+    内存占用只与 chunk_size 和单个句子/段落的长度有关，与文本总长度无关。
+
     Args:
-        text: 输入文本
+        blocks: 依次产出文本片段的可迭代对象，例如按块读取的文件
         chunk_size: 每个 chunk 的大小（字符数）
         overlap: 相邻 chunk 之间的重叠字符数
         split_by: 分割方式 ("char", "sentence", "paragraph")
-    
-    Returns:
-        chunk 列表
-        
+
+    Yields:
+        去除首尾空白后的非空 chunk
+
     Raises:
         ValueError: 当 overlap >= chunk_size 时抛出
     """
     if overlap >= chunk_size:
         raise ValueError(f"overlap ({overlap}) 必须小于 chunk_size ({chunk_size})")
-    
-    # 第一步：按照指定方式初步分割
-    if split_by == "char":
-        # 按字符直接分割
-        sentences = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-    
-    elif split_by == "sentence":
-        # 按句子分割
-        try:
-            import nltk
-            nltk.download("punkt", quiet=True)
-            nltk.download("punkt_tab", quiet=True)
-            sentences = nltk.sent_tokenize(text)
-        except ImportError:
-            # 如果 nltk 不可用，使用简单的句号分割
-            sentences = text.split("。")
-    
-    elif split_by == "paragraph":
-        # 按段落分割
-        sentences = [s.strip() for s in text.split("\n") if s.strip()]
-    
-    else:
-        raise ValueError(f"不支持的 split_by: {split_by}")
-    
-    # 第二步：合并句子形成 chunks，并添加重叠
-    chunks = []
+
+    # 合并句子形成 chunks，并添加重叠
     current_chunk = ""
-    
-    for sentence in sentences:
-        # 如果加上这个句子会超过 chunk_size，则保存当前 chunk
+    for sentence in _iter_units(blocks, chunk_size, split_by):
+        # 如果加上这个句子会超过 chunk_size，则产出当前 chunk
         if len(current_chunk) + len(sentence) > chunk_size and current_chunk:
-            chunks.append(current_chunk)
-            
+            if current_chunk.strip():
+                yield current_chunk.strip()
+
             # 创建重叠部分：从当前 chunk 的末尾取出最后 overlap 个字符
-            overlap_text = current_chunk[-overlap:] if len(current_chunk) >= overlap else current_chunk
+            overlap_text = current_chunk[-overlap:] if overlap > 0 else ""
             current_chunk = overlap_text + sentence
         else:
             current_chunk += sentence
-    
-    # 添加最后一个 chunk
-    if current_chunk:
-        chunks.append(current_chunk)
-    
-    return [chunk.strip() for chunk in chunks if chunk.strip()]
 
+    # 产出最后一个 chunk
+    if current_chunk.strip():
+        yield current_chunk.strip()
 
-def load_pre_chunked_documents(file_path: str) -> list[Document]:
+
+def split_text_with_overlap(
+    text: str,
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char"
+) -> list[str]:
     """
-    从预先分块的 .txt 文件中加载并恢复 Document 对象列表。
-    文件格式应为 '--- Document Chunk X ---'。
+    将文本分割成带有重叠的 chunks。
     
     Args:
-        file_path: 预先分块的 txt 文件路径
+        text: 输入文本
+        chunk_size: 每个 chunk 的大小（字符数）
+        overlap: 相邻 chunk 之间的重叠字符数
+        split_by: 分割方式 ("char", "sentence", "paragraph")
     
     Returns:
-        Document 对象列表
+        chunk 列表
+        
+    Raises:
+        ValueError: 当 overlap >= chunk_size 时抛出
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    return list(iter_text_chunks([text], chunk_size, overlap, split_by))
 
-    # 为整个文档生成一个唯一的 doc_id
-    doc_id = hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-    # 按分隔符分割文本
-    raw_chunks = re.split(r"--- Document Chunk \d+ ---", content)
+def _iter_pre_chunks(blocks: Iterable[str]) -> Iterator[str]:
+    """按 '--- Document Chunk X ---' 分隔符流式切分预分块文本。"""
+    # 分隔符不会跨行，逐行切分与对整篇文本 re.split 的结果一致
+    current = []
+    for line in _iter_split(blocks, "\n"):
+        parts = _CHUNK_SEPARATOR_RE.split(line)
+        current.append(parts[0])
+        for part in parts[1:]:
+            chunk = "".join(current).strip()
+            if chunk:
+                yield chunk
+            current = [part]
+        current.append("\n")
+    chunk = "".join(current).strip()
+    if chunk:
+        yield chunk
 
-    # 清理并创建 Document 对象
-    documents = []
-    # 过滤掉因分割产生的空字符串
-    splits = [chunk.strip() for chunk in raw_chunks if chunk.strip()]
-    total_chunks = len(splits)
-    
-    for idx, chunk_text in enumerate(splits):
-        doc = Document(
+
+def _iter_paragraph_pieces(blocks: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """
+    按行分割文本，过长的行按 chunk_size 切开，与 PDFReader(split_by="paragraph")
+    导出、再按预分块格式读回的结果一致。
+    """
+    for line in _iter_split(blocks, "\n"):
+        for i in range(0, len(line), chunk_size):
+            piece = line[i:i + chunk_size].strip()
+            if piece:
+                yield piece
+
+
+def _iter_file_documents(
+    file_path: str,
+    split: Callable[[Iterable[str]], Iterator[str]],
+) -> Iterator[Document]:
+    """
+    流式读取文件并逐个产出 Document。
+
+    doc_id（全文内容的 sha256）和 total_chunks 需要在产出第一个 chunk 前确定，
+    因此文件会被读取两遍：第一遍只计算哈希和 chunk 数量，第二遍产出 Document。
+    两遍都不会把整个文件读入内存。
+    """
+    digest = hashlib.sha256()
+
+    def hashed_blocks() -> Iterator[str]:
+        for block in _read_blocks(file_path):
+            digest.update(block.encode("utf-8"))
+            yield block
+
+    total_chunks = sum(1 for _ in split(hashed_blocks()))
+    doc_id = digest.hexdigest()
+
+    for idx, chunk_text in enumerate(split(_read_blocks(file_path))):
+        yield Document(
             id=f"{doc_id}-{idx}",
             metadata=DocMetadata(
                 content=TextBlock(type="text", text=chunk_text),
@@ -118,9 +230,134 @@ def load_pre_chunked_documents(file_path: str) -> list[Document]:
                 total_chunks=total_chunks,
             ),
         )
-        documents.append(doc)
 
-    return documents
+
+def iter_pre_chunked_documents(file_path: str) -> Iterator[Document]:
+    """
+    流式版本的 load_pre_chunked_documents，逐个产出 Document。
+
+    Args:
+        file_path: 预先分块的 txt 文件路径
+
+    Yields:
+        Document 对象
+    """
+    return _iter_file_documents(file_path, _iter_pre_chunks)
+
+
+def load_pre_chunked_documents(file_path: str) -> list[Document]:
+    """
+    从预先分块的 .txt 文件中加载并恢复 Document 对象列表。
+    文件格式应为 '--- Document Chunk X ---'。
+    
+    Args:
+        file_path: 预先分块的 txt 文件路径
+    
+    Returns:
+        Document 对象列表
+    """
+    return list(iter_pre_chunked_documents(file_path))
+
+
+def iter_documents_with_overlap(
+    file_path: str,
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char"
+) -> Iterator[Document]:
+    """
+    流式版本的 load_documents_with_overlap，逐个产出 Document。
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 每个 chunk 的大小（字符数）
+        overlap: 重叠大小（字符数）
+        split_by: 分割方式 ("char", "sentence", "paragraph")
+
+    Yields:
+        Document 对象
+    """
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap ({overlap}) 必须小于 chunk_size ({chunk_size})")
+
+    return _iter_file_documents(
+        file_path,
+        lambda blocks: iter_text_chunks(blocks, chunk_size, overlap, split_by),
+    )
+
+
+def iter_token_documents(
+    file_path: str,
+    max_tokens: int = 512,
+    overlap_tokens: int = 64,
+    tokenizer: str | None = None,
+) -> Iterator[Document]:
+    """
+    按 token 数分块并逐个产出 Document，切分位置优先选择章节、条款、段落等结构边界。
+
+    Args:
+        file_path: 文件路径
+        max_tokens: 每个 chunk 的最大 token 数
+        overlap_tokens: 相邻 chunk 之间的最大重叠 token 数
+        tokenizer: 分词器配置，见 token_chunker.load_token_counter
+
+    Yields:
+        Document 对象
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(
+            f"overlap_tokens ({overlap_tokens}) 必须小于 max_tokens ({max_tokens})"
+        )
+
+    count_tokens = load_token_counter(tokenizer)
+    return _iter_file_documents(
+        file_path,
+        lambda blocks: iter_token_chunks(blocks, max_tokens, overlap_tokens, count_tokens),
+    )
+
+
+def iter_documents_from_pdf(
+    file_path: str,
+    load_method: Literal["chunked", "direct", "overlap", "token"] = "chunked",
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char",
+    tokenizer: str | None = None,
+) -> Iterator[Document]:
+    """
+    直接从 PDF 分块产出 Document，metadata 中带有来源文件、页码和偏移量。
+
+    PDF 没有预分块的分隔符，各加载方式对应的分块方式为：
+    - "chunked": 与 pdf_reader.py 导出 txt 后再按预分块格式读回的结果相同
+      （按行分割，chunk 大小为 PDF_CHUNK_SIZE）
+    - "direct": 按 split_by 分割，每个片段不超过 chunk_size，无重叠
+    - "overlap" / "token": 与 txt 文件相同
+
+    Args:
+        file_path: PDF 文件路径
+        load_method: 加载方式
+        chunk_size: 每个 chunk 的大小（字符数；load_method="token" 时为 token 数）
+        overlap: 重叠大小（仅在 load_method="overlap" 或 "token" 时使用）
+        split_by: 分割方式
+        tokenizer: load_method="token" 时使用的分词器
+
+    Yields:
+        Document 对象
+    """
+    if load_method == "chunked":
+        split = lambda blocks: _iter_paragraph_pieces(blocks, PDF_CHUNK_SIZE)
+    elif load_method == "overlap":
+        split = lambda blocks: iter_text_chunks(blocks, chunk_size, overlap, split_by)
+    elif load_method == "token":
+        count_tokens = load_token_counter(tokenizer)
+        split = lambda blocks: iter_token_chunks(blocks, chunk_size, overlap, count_tokens)
+    else:
+        split = lambda blocks: (
+            unit.strip()
+            for unit in _iter_units(blocks, chunk_size, split_by)
+            if unit.strip()
+        )
+    return iter_pdf_documents(file_path, split)
 
 
 async def load_documents_with_overlap(
@@ -141,36 +378,7 @@ async def load_documents_with_overlap(
     Returns:
         Document 对象列表
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    
-    # 生成文档 ID
-    doc_id = hashlib.sha256(content.encode("utf-8")).hexdigest()
-    
-    # 使用带重叠的分割方法
-    splits = split_text_with_overlap(
-        content,
-        chunk_size=chunk_size,
-        overlap=overlap,
-        split_by=split_by
-    )
-    
-    total_chunks = len(splits)
-    documents = []
-    
-    for idx, chunk_text in enumerate(splits):
-        doc = Document(
-            id=f"{doc_id}-{idx}",
-            metadata=DocMetadata(
-                content=TextBlock(type="text", text=chunk_text),
-                doc_id=doc_id,
-                chunk_id=idx,
-                total_chunks=total_chunks,
-            ),
-        )
-        documents.append(doc)
-    
-    return documents
+    return list(iter_documents_with_overlap(file_path, chunk_size, overlap, split_by))
 
 
 async def load_documents_direct(
@@ -199,58 +407,250 @@ async def load_documents_direct(
     return documents
 
 
-async def load_documents_from_directory(
+def _load_file(
+    file_path: str,
+    load_method: Literal["chunked", "direct", "overlap", "token"],
+    chunk_size: int,
+    overlap: int,
+    split_by: Literal["char", "sentence", "paragraph"],
+    tokenizer: str | None,
+) -> list[tuple]:
+    """
+    在工作进程中完整加载一个文件。
+
+    Document 对象的序列化开销较大，这里返回 (id, doc_id, chunk_id, total_chunks, text, extra)
+    元组，由主进程重新构造 Document，extra 是页码等额外的 metadata。
+    """
+    if file_path.lower().endswith(".pdf"):
+        documents = iter_documents_from_pdf(
+            file_path, load_method, chunk_size, overlap, split_by, tokenizer
+        )
+    elif load_method == "chunked":
+        documents = iter_pre_chunked_documents(file_path)
+    elif load_method == "overlap":
+        documents = iter_documents_with_overlap(file_path, chunk_size, overlap, split_by)
+    elif load_method == "token":
+        documents = iter_token_documents(file_path, chunk_size, overlap, tokenizer)
+    else:
+        documents = asyncio.run(load_documents_direct(file_path, chunk_size, split_by))
+    return [
+        (
+            doc.id,
+            doc.metadata.doc_id,
+            doc.metadata.chunk_id,
+            doc.metadata.total_chunks,
+            doc.metadata.content["text"],
+            {
+                key: value
+                for key, value in doc.metadata.items()
+                if key not in ("content", "doc_id", "chunk_id", "total_chunks")
+            },
+        )
+        for doc in documents
+    ]
+
+
+def _rebuild_documents(rows: list[tuple]) -> Iterator[Document]:
+    """根据 _load_file 返回的元组重新构造 Document。"""
+    for id_, doc_id, chunk_id, total_chunks, text, extra in rows:
+        metadata = DocMetadata(
+            content=TextBlock(type="text", text=text),
+            doc_id=doc_id,
+            chunk_id=chunk_id,
+            total_chunks=total_chunks,
+        )
+        metadata.update(**extra)
+        yield Document(id=id_, metadata=metadata)
+
+
+def list_files_to_load(
     docs_directory: str,
-    load_method: Literal["chunked", "direct", "overlap"] = "chunked",
-    chunk_size: int = 1024,
-    overlap: int = 200,
-    split_by: Literal["char", "sentence", "paragraph"] = "char"
-) -> list[Document]:
+    manifest: "IngestManifest | None" = None,
+) -> list[str]:
     """
-    从目录中加载所有 .txt 文件。
-    
+    列出目录中需要加载的 .txt 和 .pdf 文件。
+
     Args:
         docs_directory: 文档目录路径
-        load_method: 加载方式 ("chunked" - 预分块, "direct" - 直接加载, "overlap" - 带重叠加载)
-        chunk_size: 每个 chunk 的大小（字符数）
-        overlap: 重叠大小（仅在 load_method="overlap" 时使用）
-        split_by: 分割方式
-    
+        manifest: 可选的导入清单，提供时跳过自上次导入后未变化的文件
+
     Returns:
-        Document 对象列表
+        按文件名排序的文件路径列表
     """
-    all_documents = []
-    
     if not os.path.exists(docs_directory):
         raise FileNotFoundError(f"目录不存在: {docs_directory}")
     
-    # 遍历目录中的所有 .txt 文件
-    txt_files = [f for f in os.listdir(docs_directory) if f.endswith(".txt")]
+    # 遍历目录中的所有 .txt 和 .pdf 文件
+    doc_files = sorted(
+        f for f in os.listdir(docs_directory) if f.lower().endswith(DOCUMENT_EXTENSIONS)
+    )
     
-    if not txt_files:
-        print(f"警告: 目录中没有找到 .txt 文件: {docs_directory}")
-        return all_documents
+    if not doc_files:
+        print(f"警告: 目录中没有找到 .txt 或 .pdf 文件: {docs_directory}")
+        return []
     
-    print(f"找到 {len(txt_files)} 个 .txt 文件")
+    print(f"找到 {len(doc_files)} 个文件")
     
-    for filename in txt_files:
+    file_paths = []
+    for filename in doc_files:
         file_path = os.path.join(docs_directory, filename)
-        print(f"  加载: {filename}")
+        if manifest is not None and manifest.is_unchanged(file_path):
+            continue
+        file_paths.append(file_path)
+    
+    skipped = len(doc_files) - len(file_paths)
+    if skipped:
+        print(f"跳过 {skipped} 个未变化的文件")
+    
+    return file_paths
+
+
+async def iter_documents_from_files(
+    file_paths: list[str],
+    load_method: Literal["chunked", "direct", "overlap", "token"] = "chunked",
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char",
+    manifest: "IngestManifest | None" = None,
+    workers: int = 1,
+    tokenizer: str | None = None,
+) -> AsyncIterator[Document]:
+    """
+    依次加载文件并逐个产出 Document，下游可以在第一个 chunk 产出后立即开始导入。
+
+    workers 为 1 时在当前进程中逐个加载文件，"chunked"、"overlap" 和 "token" 方式按块读取文件，
+    内存占用与文件大小无关；"direct" 方式使用 TextReader，仍会把单个文件整体读入内存。
+
+    workers 大于 1 时，分块、哈希等 CPU 密集的工作交给进程池并行完成，不阻塞事件循环，
+    下游的嵌入和写入与加载同时进行。进程池最多提前加载 2 * workers 个文件，
+    结果仍按文件名顺序产出，与串行加载完全一致；每个文件在工作进程中整体加载，
+    内存占用与提前加载的文件大小之和成正比。
+
+    Args:
+        file_paths: 文件路径列表
+        load_method: 加载方式 ("chunked" - 预分块, "direct" - 直接加载, "overlap" - 带重叠加载,
+            "token" - 按 token 数分块)
+        chunk_size: 每个 chunk 的大小（字符数；load_method="token" 时为 token 数）
+        overlap: 重叠大小（仅在 load_method="overlap" 或 "token" 时使用）
+        split_by: 分割方式
+        manifest: 可选的导入清单，文件的全部 chunks 产出后登记到清单中；
+            加载失败的文件会从清单中移除，下次导入时重试
+        workers: 加载文件的进程数量
+        tokenizer: load_method="token" 时使用的分词器，None 表示按字符类别估算
+
+    Yields:
+        Document 对象
+    """
+    executor = None
+    futures = deque()
+    submit_next = None
+    if workers > 1 and len(file_paths) > 1:
+        loop = asyncio.get_running_loop()
+        executor = ProcessPoolExecutor(max_workers=workers)
+        remaining = iter(file_paths)
+        
+        def submit_next() -> None:
+            for next_path in remaining:
+                futures.append(loop.run_in_executor(
+                    executor,
+                    _load_file,
+                    next_path,
+                    load_method,
+                    chunk_size,
+                    overlap,
+                    split_by,
+                    tokenizer,
+                ))
+                return
+        
+        for _ in range(2 * workers):
+            submit_next()
+    
+    try:
+        async for doc in _iter_loaded_documents(
+            file_paths,
+            futures,
+            submit_next,
+            load_method,
+            chunk_size,
+            overlap,
+            split_by,
+            tokenizer,
+            manifest,
+        ):
+            yield doc
+    finally:
+        if executor is not None:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _iter_loaded_documents(
+    file_paths: list[str],
+    futures: deque,
+    submit_next: Callable[[], None] | None,
+    load_method: Literal["chunked", "direct", "overlap", "token"],
+    chunk_size: int,
+    overlap: int,
+    split_by: Literal["char", "sentence", "paragraph"],
+    tokenizer: str | None,
+    manifest: "IngestManifest | None",
+) -> AsyncIterator[Document]:
+    """
+    按文件顺序产出 Document，并登记到导入清单中。
+
+    每个 chunk 的 metadata 中附加文件级的检索过滤字段（来源文件名、标准号、语言、文档类型），
+    见 document_fields.document_fields，语言根据文件的第一个 chunk 判断。
+
+    submit_next 不为 None 时，文件已按顺序提交到进程池，
+    futures 中依次是各个文件的加载结果。
+    """
+    for file_path in file_paths:
+        print(f"  加载: {os.path.basename(file_path)}")
         
+        doc_ids = set()
+        chunk_ids = []
         try:
-            if load_method == "chunked":
+            if submit_next is not None:
+                # 取出当前文件的结果，同时补充提交下一个文件
+                future = futures.popleft()
+                submit_next()
+                documents = _rebuild_documents(await future)
+            
+            elif file_path.lower().endswith(".pdf"):
+                # 直接从 PDF 分块，不经过中间 txt 文件
+                documents = iter_documents_from_pdf(
+                    file_path,
+                    load_method=load_method,
+                    chunk_size=chunk_size,
+                    overlap=overlap,
+                    split_by=split_by,
+                    tokenizer=tokenizer
+                )
+            
+            elif load_method == "chunked":
                 # 使用预分块的文档加载器
-                documents = load_pre_chunked_documents(file_path)
+                documents = iter_pre_chunked_documents(file_path)
             
             elif load_method == "overlap":
                 # 使用带重叠的加载器
-                documents = await load_documents_with_overlap(
+                documents = iter_documents_with_overlap(
                     file_path,
                     chunk_size=chunk_size,
                     overlap=overlap,
                     split_by=split_by
                 )
             
+            elif load_method == "token":
+                # 按 token 数分块，优先在结构边界处切分
+                documents = iter_token_documents(
+                    file_path,
+                    max_tokens=chunk_size,
+                    overlap_tokens=overlap,
+                    tokenizer=tokenizer
+                )
+            
             else:  # load_method == "direct"
                 # 使用 TextReader 直接加载
                 documents = await load_documents_direct(
@@ -259,11 +659,95 @@ async def load_documents_from_directory(
                     split_by=split_by
                 )
             
-            all_documents.extend(documents)
-            print(f"    ✓ 成功加载 {len(documents)} 个 chunks")
+            fields = None
+            for doc in documents:
+                if fields is None:
+                    fields = document_fields(file_path, doc.metadata.content["text"])
+                doc.metadata.update(**fields)
+                doc_ids.add(doc.metadata.doc_id)
+                chunk_ids.append(doc.id)
+                yield doc
+            
+            if manifest is not None:
+                manifest.record(file_path, sorted(doc_ids), chunk_ids)
+            print(f"    ✓ 成功加载 {len(chunk_ids)} 个 chunks")
         
         except Exception as e:
+            # 已产出的 chunks 无法撤回，在清单中记下它们，下次导入时删除并重新加载该文件
+            if manifest is not None:
+                manifest.forget(file_path, sorted(doc_ids))
             print(f"    ✗ 加载失败: {str(e)}")
             continue
+
+
+async def iter_documents_from_directory(
+    docs_directory: str,
+    load_method: Literal["chunked", "direct", "overlap", "token"] = "chunked",
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char",
+    manifest: "IngestManifest | None" = None,
+    workers: int = 1,
+    tokenizer: str | None = None,
+) -> AsyncIterator[Document]:
+    """
+    流式版本的 load_documents_from_directory，逐个产出目录中 .txt 和 .pdf 文件的 Document。
+
+    参数含义与 load_documents_from_directory 相同。
+    """
+    file_paths = list_files_to_load(docs_directory, manifest)
+    async for doc in iter_documents_from_files(
+        file_paths,
+        load_method=load_method,
+        chunk_size=chunk_size,
+        overlap=overlap,
+        split_by=split_by,
+        manifest=manifest,
+        workers=workers,
+        tokenizer=tokenizer,
+    ):
+        yield doc
+
+
+async def load_documents_from_directory(
+    docs_directory: str,
+    load_method: Literal["chunked", "direct", "overlap", "token"] = "chunked",
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    split_by: Literal["char", "sentence", "paragraph"] = "char",
+    manifest: "IngestManifest | None" = None,
+    workers: int = 1,
+    tokenizer: str | None = None,
+) -> list[Document]:
+    """
+    从目录中加载所有 .txt 和 .pdf 文件，PDF 按 iter_documents_from_pdf 直接分块。
     
-    return all_documents
\ No newline at end of file
+    Args:
+        docs_directory: 文档目录路径
+        load_method: 加载方式 ("chunked" - 预分块, "direct" - 直接加载, "overlap" - 带重叠加载,
+            "token" - 按 token 数分块)
+        chunk_size: 每个 chunk 的大小（字符数；load_method="token" 时为 token 数）
+        overlap: 重叠大小（仅在 load_method="overlap" 或 "token" 时使用）
+        split_by: 分割方式
+        manifest: 可选的导入清单，提供时跳过自上次导入后未变化的文件，
+            并把成功加载的文件登记到清单中
+        workers: 加载文件的进程数量，大于 1 时使用进程池并行加载，
+            结果按文件名顺序合并
+        tokenizer: load_method="token" 时使用的分词器，None 表示按字符类别估算
+    
+    Returns:
+        Document 对象列表
+    """
+    return [
+        doc
+        async for doc in iter_documents_from_directory(
+            docs_directory,
+            load_method=load_method,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            split_by=split_by,
+            manifest=manifest,
+            workers=workers,
+            tokenizer=tokenizer,
+        )
+    ]
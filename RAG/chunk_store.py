@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+二进制 chunk 存储模块。
+
+替代 "--- Document Chunk N ---" 分隔的 txt 格式：chunk 正文不再靠正则切分恢复，
+正文中出现分隔符也不会出错，按 id 访问单个 chunk 不需要读取整个文件。
+一个存储是一个目录，包含三个只追加的文件：
+- chunks.bin: 依次拼接的 UTF-8 chunk 正文
+- index.bin: 定长记录的偏移量索引（正文位置、文档序号、chunk_id、total_chunks、页码、删除标记）
+- docs.jsonl: 每行一个文档，{"doc_id": ..., "source": ..., "standard": ..., ...}，
+  行号即索引中的文档序号，除 doc_id 外是文档级的检索过滤字段（见 document_fields.py）
+
+index.bin 和 chunks.bin 都通过内存映射读取，按 (doc_id, chunk_id) 随机访问是
+O(log n) 的二分查找，只解码被访问的正文；遍历全部 chunks 的开销与索引大小相关，
+正文按需解码。
+
+写入顺序为正文、文档、索引，索引是提交点：中途中断时，打开存储会丢弃
+指向不完整正文的索引记录。
+
+用法（把目录中的 .txt/.pdf 文件分块后写入存储）：
+    python chunk_store.py --docs-dir ../Data/AI_database2_txt_extracted --output chunk_store
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import os
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import numpy as np
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata
+
+from document_fields import FILTER_FIELDS, matches_filters, normalize_filters
+
+
+DATA_FILE = "chunks.bin"
+INDEX_FILE = "index.bin"
+DOCS_FILE = "docs.jsonl"
+
+# 索引记录，没有页码时 page_start / page_end 为 -1
+RECORD_DTYPE = np.dtype([
+    ("offset", "<i8"),
+    ("length", "<i4"),
+    ("doc", "<i4"),
+    ("chunk_id", "<i4"),
+    ("total_chunks", "<i4"),
+    ("page_start", "<i4"),
+    ("page_end", "<i4"),
+    ("deleted", "u1"),
+])
+
+
+class ChunkStore:
+    """基于内存映射的只追加 chunk 存储。"""
+
+    def __init__(self, path: str) -> None:
+        """
+        打开存储目录，目录不存在时创建一个空存储。
+
+        Args:
+            path: 存储目录
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        for name in (DATA_FILE, INDEX_FILE, DOCS_FILE):
+            open(os.path.join(path, name), "ab").close()
+
+        self._doc_ids: list[str] = []
+        self._doc_fields: list[dict[str, Any]] = []
+        docs_path = os.path.join(path, DOCS_FILE)
+        valid_end = 0
+        with open(docs_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    entry = json.loads(line)
+                    doc_id = entry["doc_id"]
+                except (ValueError, KeyError):
+                    # 中断时写了一半的最后一行
+                    break
+                self._doc_ids.append(doc_id)
+                self._doc_fields.append({
+                    key: value
+                    for key, value in entry.items()
+                    if key != "doc_id" and value is not None
+                })
+                valid_end += len(line)
+        # 截掉写了一半的行，否则之后追加的文档会接在它后面，再次打开时全部丢失
+        if valid_end < os.path.getsize(docs_path):
+            with open(docs_path, "r+b") as f:
+                f.truncate(valid_end)
+        self._slots = {doc_id: slot for slot, doc_id in enumerate(self._doc_ids)}
+
+        self._data = None
+        self._index = None
+        self._order = None
+        self._truncate_incomplete()
+        self._remap()
+
+    @staticmethod
+    def is_store(path: str) -> bool:
+        """判断目录是否是一个 chunk 存储。"""
+        return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+    def __len__(self) -> int:
+        """未删除的 chunk 数量。"""
+        return int(np.count_nonzero(self._index["deleted"] == 0))
+
+    def append(self, documents: Iterable[Document]) -> None:
+        """
+        追加一批 chunks。
+
+        已存在的 (doc_id, chunk_id) 会被新写入的 chunk 覆盖，旧记录被标记删除。
+
+        Args:
+            documents: Document 列表
+        """
+        data_path = os.path.join(self.path, DATA_FILE)
+        offset = os.path.getsize(data_path)
+        records = []
+        new_docs = []
+        with open(data_path, "ab") as f:
+            for doc in documents:
+                meta = doc.metadata
+                body = meta.content["text"].encode("utf-8")
+                f.write(body)
+
+                slot = self._slots.get(meta.doc_id)
+                if slot is None:
+                    slot = len(self._doc_ids)
+                    self._slots[meta.doc_id] = slot
+                    self._doc_ids.append(meta.doc_id)
+                    fields = {
+                        key: meta[key] for key in FILTER_FIELDS if meta.get(key) is not None
+                    }
+                    self._doc_fields.append(fields)
+                    new_docs.append({"doc_id": meta.doc_id, **fields})
+
+                records.append((
+                    offset,
+                    len(body),
+                    slot,
+                    meta.chunk_id,
+                    meta.total_chunks,
+                    meta.get("page_start", -1),
+                    meta.get("page_end", -1),
+                    0,
+                ))
+                offset += len(body)
+
+        if new_docs:
+            with open(os.path.join(self.path, DOCS_FILE), "a", encoding="utf-8") as f:
+                for entry in new_docs:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if records:
+            first_row = len(self._index)
+            with open(os.path.join(self.path, INDEX_FILE), "ab") as f:
+                f.write(np.array(records, dtype=RECORD_DTYPE).tobytes())
+            self._remap()
+            self._supersede(first_row)
+
+    async def append_while_iterating(
+        self,
+        documents: AsyncIterable[Document],
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Document]:
+        """
+        原样产出 Document 流，同时按批写入存储。
+
+        中途中断时，最后一批未满的 chunks 不会写入；同一文件重新导入时会覆盖已写入的 chunks。
+
+        Args:
+            documents: 产出 Document 的异步可迭代对象
+            batch_size: 每批写入的 chunk 数量
+
+        Yields:
+            输入的 Document
+        """
+        batch = []
+        async for doc in documents:
+            yield doc
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.append(batch)
+                batch = []
+        self.append(batch)
+
+    def remove_doc_ids(self, doc_ids: Iterable[str]) -> None:
+        """
+        标记删除属于给定 doc_id 的全部 chunks（只修改索引中的删除标记，不回收空间）。
+
+        Args:
+            doc_ids: 要删除的 doc_id 列表
+        """
+        slots = [self._slots[doc_id] for doc_id in doc_ids if doc_id in self._slots]
+        if not slots or not len(self._index):
+            return
+        index = np.memmap(
+            os.path.join(self.path, INDEX_FILE), dtype=RECORD_DTYPE, mode="r+"
+        )
+        index["deleted"][np.isin(index["doc"], slots)] = 1
+        index.flush()
+        del index
+        self._remap()
+
+    def get(self, doc_id: str, chunk_id: int) -> Document | None:
+        """
+        按 (doc_id, chunk_id) 读取一个 chunk。
+
+        Returns:
+            Document，不存在或已删除时返回 None
+        """
+        rows = self.chunk_rows(doc_id, chunk_id, chunk_id)
+        return self.document(rows[-1]) if len(rows) else None
+
+    def get_range(self, doc_id: str, first: int, last: int) -> list[Document]:
+        """
+        读取同一文档中 chunk_id 在 [first, last] 范围内的 chunks，按 chunk_id 排序。
+        """
+        return [self.document(row) for row in self.chunk_rows(doc_id, first, last)]
+
+    def chunk_rows(self, doc_id: str, first: int, last: int) -> np.ndarray:
+        """返回同一文档中 chunk_id 在 [first, last] 范围内的未删除索引行号，按 chunk_id 排序。"""
+        slot = self._slots.get(doc_id)
+        if slot is None:
+            return np.empty(0, dtype=np.int64)
+        order, docs, chunk_ids = self._sorted()
+        lo, hi = np.searchsorted(docs, [slot, slot + 1])
+        start, stop = np.searchsorted(chunk_ids[lo:hi], [first, last + 1])
+        return order[lo + start:lo + stop]
+
+    def iter_documents(self, block_size: int = 4096) -> Iterator[Document]:
+        """按写入顺序产出全部未删除的 chunks。"""
+        live = np.flatnonzero(self._index["deleted"] == 0)
+        for i in range(0, len(live), block_size):
+            # 按块把索引字段转换为 Python 列表，避免逐行访问结构化数组
+            records = self._index[live[i:i + block_size]]
+            yield from map(self._make_document_from, *(
+                records[name].tolist()
+                for name in ("doc", "chunk_id", "total_chunks", "page_start", "page_end", "offset", "length")
+            ))
+
+    def filter_mask(self, filters: dict[str, Any]) -> np.ndarray:
+        """
+        返回每个索引行所属文档是否满足过滤条件的布尔数组（不考虑删除标记）。
+
+        Args:
+            filters: {字段: 取值或取值列表}，见 document_fields.py
+        """
+        filters = normalize_filters(filters)
+        docs = np.fromiter(
+            (matches_filters(fields, filters) for fields in self._doc_fields),
+            dtype=bool,
+            count=len(self._doc_fields),
+        )
+        return docs[self._index["doc"]]
+
+    def text(self, row: int) -> str:
+        """解码索引第 row 行对应的正文。"""
+        record = self._index[row]
+        return self._decode(int(record["offset"]), int(record["length"]))
+
+    def _decode(self, offset: int, length: int) -> str:
+        return str(memoryview(self._data)[offset:offset + length], "utf-8")
+
+    def deleted_mask(self) -> np.ndarray:
+        """返回每个索引行是否已删除（包括被覆盖）的布尔数组。"""
+        return self._index["deleted"] != 0
+
+    def document(self, row: int) -> Document:
+        """读取索引第 row 行对应的 chunk。"""
+        record = self._index[row]
+        return self._make_document_from(*(
+            int(record[name])
+            for name in ("doc", "chunk_id", "total_chunks", "page_start", "page_end", "offset", "length")
+        ))
+
+    def _make_document_from(
+        self,
+        slot: int,
+        chunk_id: int,
+        total_chunks: int,
+        page_start: int,
+        page_end: int,
+        offset: int,
+        length: int,
+    ) -> Document:
+        doc_id = self._doc_ids[slot]
+        metadata = DocMetadata(
+            content=TextBlock(type="text", text=self._decode(offset, length)),
+            doc_id=doc_id,
+            chunk_id=chunk_id,
+            total_chunks=total_chunks,
+        )
+        metadata.update(**self._doc_fields[slot])
+        if page_start >= 0:
+            metadata["page_start"] = page_start
+            metadata["page_end"] = page_end
+        return Document(id=f"{doc_id}-{chunk_id}", metadata=metadata)
+
+    def _supersede(self, first_row: int) -> None:
+        """把被 first_row 及之后新写入的记录覆盖的旧记录标记为删除。"""
+        live = np.flatnonzero(self._index["deleted"] == 0)
+        keys = (self._index["doc"][live].astype(np.int64) << 32) | self._index["chunk_id"][live]
+        new_keys = keys[live >= first_row]
+        candidates = np.isin(keys, new_keys)
+        if len(new_keys) == len(np.unique(new_keys)) and candidates.sum() == len(new_keys):
+            return
+
+        # 同一个键只保留行号最大（最后写入）的一条
+        rows, keys = live[candidates], keys[candidates]
+        order = np.lexsort((rows, keys))
+        rows, keys = rows[order], keys[order]
+        superseded = rows[np.append(keys[1:] == keys[:-1], False)]
+
+        index = np.memmap(
+            os.path.join(self.path, INDEX_FILE), dtype=RECORD_DTYPE, mode="r+"
+        )
+        index["deleted"][superseded] = 1
+        index.flush()
+        del index
+        self._remap()
+
+    def _sorted(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """未删除的行按 (文档序号, chunk_id, 行号) 排序，供二分查找，首次访问时构建。"""
+        if self._order is None:
+            live = np.flatnonzero(self._index["deleted"] == 0)
+            docs = self._index["doc"][live]
+            chunk_ids = self._index["chunk_id"][live]
+            order = live[np.lexsort((live, chunk_ids, docs))]
+            self._order = (order, self._index["doc"][order], self._index["chunk_id"][order])
+        return self._order
+
+    def _truncate_incomplete(self) -> None:
+        """丢弃指向不完整正文或未知文档的尾部索引记录。"""
+        index_path = os.path.join(self.path, INDEX_FILE)
+        data_size = os.path.getsize(os.path.join(self.path, DATA_FILE))
+        n = os.path.getsize(index_path) // RECORD_DTYPE.itemsize
+        index = np.fromfile(index_path, dtype=RECORD_DTYPE, count=n) if n else None
+        valid = n
+        while valid and (
+            index[valid - 1]["offset"] + index[valid - 1]["length"] > data_size
+            or index[valid - 1]["doc"] >= len(self._doc_ids)
+        ):
+            valid -= 1
+        if valid * RECORD_DTYPE.itemsize != os.path.getsize(index_path):
+            with open(index_path, "r+b") as f:
+                f.truncate(valid * RECORD_DTYPE.itemsize)
+
+    def _remap(self) -> None:
+        """重新映射文件，追加或删除后调用。"""
+        self._order = None
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.getsize(index_path):
+            self._index = np.memmap(index_path, dtype=RECORD_DTYPE, mode="r")
+        else:
+            self._index = np.empty(0, dtype=RECORD_DTYPE)
+
+        data_path = os.path.join(self.path, DATA_FILE)
+        if os.path.getsize(data_path):
+            with open(data_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b""
+
+
+async def build_chunk_store(
+    docs_directory: str,
+    output: str,
+    load_method: str = "chunked",
+    chunk_size: int = 1024,
+    overlap: int = 200,
+    tokenizer: str | None = None,
+    workers: int = 1,
+    batch_size: int = 1000,
+) -> ChunkStore:
+    """
+    把目录中的 .txt/.pdf 文件分块后写入新的 chunk 存储。
+
+    Raises:
+        FileExistsError: 输出目录已经是一个 chunk 存储
+    """
+    from chunk_manager import iter_documents_from_directory
+
+    if ChunkStore.is_store(output):
+        raise FileExistsError(f"chunk 存储已存在: {output}")
+
+    store = ChunkStore(output)
+    batch = []
+    async for doc in iter_documents_from_directory(
+        docs_directory,
+        load_method=load_method,
+        chunk_size=chunk_size,
+        overlap=overlap,
+        workers=workers,
+        tokenizer=tokenizer,
+    ):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            store.append(batch)
+            batch = []
+    store.append(batch)
+    return store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a chunk store from .txt/.pdf files")
+    parser.add_argument(
+        "--docs-dir",
+        type=str,
+        required=True,
+        help="Directory containing .txt or .pdf files to chunk"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Directory of the new chunk store"
+    )
+    parser.add_argument(
+        "--load-method",
+        type=str,
+        choices=["chunked", "direct", "overlap", "token"],
+        default="chunked",
+        help="Chunking method, as in agentic_usage.py (default: chunked)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="Size of each chunk in characters, or in tokens in 'token' mode (default: 1024)"
+    )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=200,
+        help="Overlap size for chunks in 'overlap' and 'token' modes (default: 200)"
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=None,
+        help="Tokenizer for 'token' mode (default: character-class estimate)"
+    )
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=1,
+        help="Number of processes loading and chunking files in parallel (default: 1)"
+    )
+    args = parser.parse_args()
+
+    store = asyncio.run(build_chunk_store(
+        args.docs_dir,
+        args.output,
+        args.load_method,
+        args.chunk_size,
+        args.overlap,
+        args.tokenizer,
+        args.load_workers,
+    ))
+    print(f"已写入 {len(store)} 个 chunks: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
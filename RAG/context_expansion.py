@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Neighbour-chunk context expansion of retrieval results.
+
+A retrieved chunk is often cut in the middle of a clause, so the agent
+spends further ReAct turns and retrievals fetching the text around it.
+`ContextExpandedKnowledge` wraps a knowledge base and, for each hit, reads
+the adjacent chunks of the same document from a local `ChunkStore` instead
+of running another vector search:
+
+- the windows of hits that touch or overlap are merged into one result;
+- text repeated at the start of a chunk because of the chunk overlap is
+  dropped when the chunks are joined;
+- neighbours are added nearest first, in rank order of the hits, until a
+  total character budget is reached. The hits themselves are always kept.
+"""
+from typing import Any
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata, KnowledgeBase
+
+from chunk_store import ChunkStore
+
+
+def overlap_length(previous: str, following: str, min_overlap: int = 10) -> int:
+    """
+    Length of the longest suffix of `previous` that is also a prefix of
+    `following`, computed with the KMP failure function.
+
+    Args:
+        previous: Text of a chunk
+        following: Text of the next chunk of the same document
+        min_overlap: Shorter matches are treated as coincidences and give 0
+
+    Returns:
+        Number of characters at the start of `following` repeating the end
+        of `previous`
+    """
+    m = min(len(previous), len(following))
+    pattern = following[:m]
+
+    failure = [0] * m
+    k = 0
+    for i in range(1, m):
+        while k and pattern[i] != pattern[k]:
+            k = failure[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        failure[i] = k
+
+    k = 0
+    for char in previous[len(previous) - m:]:
+        if k == m:
+            k = failure[k - 1]
+        while k and char != pattern[k]:
+            k = failure[k - 1]
+        if char == pattern[k]:
+            k += 1
+    return k if k >= min_overlap else 0
+
+
+class ContextExpandedKnowledge(KnowledgeBase):
+    """
+    Knowledge base wrapper returning each hit together with its
+    neighbouring chunks.
+
+    It shares the embedding store and model of the wrapped knowledge base.
+    Each returned document covers a run of consecutive chunks of one
+    document: its metadata is that of the best ranked hit in the run, with
+    `chunk_start` / `chunk_end` giving the range of chunk ids it covers.
+    """
+
+    def __init__(
+        self,
+        knowledge: KnowledgeBase,
+        chunk_store: ChunkStore,
+        window: int = 1,
+        max_chars: int = 4000,
+        min_overlap: int = 10,
+    ) -> None:
+        """
+        Args:
+            knowledge: The wrapped knowledge base
+            chunk_store: Local store holding the chunks of the collection
+            window: Number of chunks added on each side of a hit
+            max_chars: Character budget of all returned text; neighbours
+                       that would exceed it are left out
+            min_overlap: Minimum length of text repeated between adjacent
+                         chunks for it to be dropped
+        """
+        super().__init__(knowledge.embedding_store, knowledge.embedding_model)
+        self.knowledge = knowledge
+        self.chunk_store = chunk_store
+        self.window = window
+        self.max_chars = max_chars
+        self.min_overlap = min_overlap
+
+    async def retrieve(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """Retrieve relevant documents and expand them with their neighbours."""
+        hits = await self.knowledge.retrieve(
+            query,
+            limit=limit,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        return self.expand(hits)
+
+    async def add_documents(self, documents: list[Document], **kwargs: Any) -> None:
+        """Add documents to the wrapped knowledge base and the chunk store."""
+        await self.knowledge.add_documents(documents, **kwargs)
+        self.chunk_store.append(documents)
+
+    def expand(self, hits: list[Document]) -> list[Document]:
+        """
+        Expand ranked hits with the neighbouring chunks of their documents.
+
+        Args:
+            hits: Retrieved documents, best first
+
+        Returns:
+            One document per run of consecutive chunks, ordered by the rank
+            of their best hit
+        """
+        # doc_id -> chunk_id -> chunk, for every chunk in the hit windows
+        chunks: dict[str, dict[int, Document]] = {}
+        # doc_id -> chunk ids of the returned text
+        selected: dict[str, set[int]] = {}
+        # (doc_id, chunk_id) -> overlap between the chunk and the next one
+        overlaps: dict[tuple[str, int], int] = {}
+
+        def overlap(doc_id: str, chunk_id: int) -> int:
+            key = (doc_id, chunk_id)
+            if key not in overlaps:
+                overlaps[key] = overlap_length(
+                    chunks[doc_id][chunk_id].metadata.content["text"],
+                    chunks[doc_id][chunk_id + 1].metadata.content["text"],
+                    self.min_overlap,
+                )
+            return overlaps[key]
+
+        def added_chars(doc_id: str, chunk_id: int) -> int:
+            # Length the joined text grows by when the chunk is selected
+            n = len(chunks[doc_id][chunk_id].metadata.content["text"])
+            if chunk_id - 1 in selected[doc_id]:
+                n -= overlap(doc_id, chunk_id - 1)
+            if chunk_id + 1 in selected[doc_id]:
+                n -= overlap(doc_id, chunk_id)
+            return n
+
+        total = 0
+        for hit in hits:
+            doc_id, chunk_id = hit.metadata.doc_id, hit.metadata.chunk_id
+            window = chunks.setdefault(doc_id, {})
+            if self.window > 0:
+                for doc in self.chunk_store.get_range(
+                    doc_id, chunk_id - self.window, chunk_id + self.window,
+                ):
+                    window.setdefault(doc.metadata.chunk_id, doc)
+            window[chunk_id] = hit
+            selected.setdefault(doc_id, set())
+            if chunk_id not in selected[doc_id]:
+                total += added_chars(doc_id, chunk_id)
+                selected[doc_id].add(chunk_id)
+
+        # Grow every window by one chunk per side and round, so the budget
+        # goes to the nearest neighbours of the best hits first
+        for distance in range(1, self.window + 1):
+            for hit in hits:
+                doc_id, chunk_id = hit.metadata.doc_id, hit.metadata.chunk_id
+                for neighbour, inner in (
+                    (chunk_id - distance, chunk_id - distance + 1),
+                    (chunk_id + distance, chunk_id + distance - 1),
+                ):
+                    if (
+                        neighbour in selected[doc_id]
+                        or neighbour not in chunks[doc_id]
+                        or inner not in selected[doc_id]
+                    ):
+                        continue
+                    n = added_chars(doc_id, neighbour)
+                    if total + n <= self.max_chars:
+                        total += n
+                        selected[doc_id].add(neighbour)
+
+        rank = {}
+        for i, hit in enumerate(hits):
+            rank.setdefault((hit.metadata.doc_id, hit.metadata.chunk_id), i)
+
+        results = []
+        for doc_id, chunk_ids in selected.items():
+            run = []
+            for chunk_id in sorted(chunk_ids):
+                if run and chunk_id != run[-1] + 1:
+                    results.append(self._merge(doc_id, run, chunks, overlap, hits, rank))
+                    run = []
+                run.append(chunk_id)
+            results.append(self._merge(doc_id, run, chunks, overlap, hits, rank))
+
+        results.sort(key=lambda _: _[0])
+        return [doc for _, doc in results]
+
+    @staticmethod
+    def _merge(
+        doc_id: str,
+        run: list[int],
+        chunks: dict[str, dict[int, Document]],
+        overlap: Any,
+        hits: list[Document],
+        rank: dict[tuple[str, int], int],
+    ) -> tuple[int, Document]:
+        """Join a run of consecutive chunks into one document."""
+        best = min(rank[(doc_id, _)] for _ in run if (doc_id, _) in rank)
+        hit = hits[best]
+
+        parts = [chunks[doc_id][run[0]].metadata.content["text"]]
+        for chunk_id in run[1:]:
+            text = chunks[doc_id][chunk_id].metadata.content["text"]
+            n = overlap(doc_id, chunk_id - 1)
+            parts.append(text[n:] if n else "\n" + text)
+
+        metadata = DocMetadata(
+            content=TextBlock(type="text", text="".join(parts)),
+            doc_id=doc_id,
+            chunk_id=hit.metadata.chunk_id,
+            total_chunks=hit.metadata.total_chunks,
+        )
+        for key, value in hit.metadata.items():
+            if key not in metadata:
+                metadata[key] = value
+        metadata["chunk_start"] = run[0]
+        metadata["chunk_end"] = run[-1]
+
+        first = chunks[doc_id][run[0]].metadata
+        last = chunks[doc_id][run[-1]].metadata
+        if "page_start" in first and "page_end" in last:
+            metadata["page_start"] = first["page_start"]
+            metadata["page_end"] = last["page_end"]
+
+        return best, Document(id=hit.id, metadata=metadata, score=hit.score)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Document-level payload fields used to narrow down retrievals.
+
+Every chunk of a file carries the same fields, derived from the filename
+and the first chunk of the file when it is loaded:
+
+- `source`: the filename, e.g. "GB∕T 20438.1-2017 电气_电子_....txt"
+- `standard`: the normalized standard number without its year, e.g.
+  "GB/T 20438.1", "T/CAMET 04011.4", "IEEE 1474.1"
+- `standard_family`: the standard number without its part, e.g.
+  "GB/T 20438", which selects all parts of a multi-part standard
+- `language`: "zh", "en" or "de", guessed from the text
+- `doc_type`: one of DOC_TYPES, guessed from the filename
+
+Filters are dicts {field: value or list of values}: a chunk matches when
+each field has one of the listed values. `build_filters` turns the
+arguments of the retrieval tool into such a dict, and the vector stores and
+the BM25 index translate it into their own filtering.
+"""
+import os
+import re
+from typing import Any, Iterable
+
+
+FILTER_FIELDS = ("source", "standard", "standard_family", "language", "doc_type")
+
+DOC_TYPES = (
+    "standard",
+    "amendment",
+    "accident_report",
+    "statistics",
+    "work_programme",
+    "reference",
+)
+
+# Slashes, dashes and spaces used in standard numbers, e.g. "GB∕T 43267—2023",
+# also applied by the BM25 tokenizer so identifiers match across spellings
+PUNCT_TRANSLATION = str.maketrans({
+    "∕": "/",
+    "／": "/",
+    "‐": "-",
+    "‑": "-",
+    "‒": "-",
+    "–": "-",
+    "—": "-",
+    "－": "-",
+    "\u3000": " ",
+})
+
+# (organization, pattern capturing the number) of the recognized standards,
+# "GBT+46097", "T_CAMET 04010.1" and "TCAMET 04011.2" are spellings found in
+# the filenames of the corpus
+_STANDARD_PATTERNS = [
+    ("GB/T", re.compile(r"(?<![A-Za-z])GB\s*/?\s*T\s*\+?\s*(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("GB/Z", re.compile(r"(?<![A-Za-z])GB\s*/?\s*Z\s*\+?\s*(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("GB", re.compile(r"(?<![A-Za-z])GB\s+(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("T/CAMET", re.compile(r"(?<![A-Za-z])T\s*[/_]?\s*CAMET\s*(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("CZJS/T", re.compile(r"(?<![A-Za-z])CZJS\s*/?\s*T\s*(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("IEEE", re.compile(r"(?<![A-Za-z])IEEE\s+(?:Std\s+)?(\d+(?:\.\d+)*)", re.IGNORECASE)),
+    ("IEC", re.compile(r"(?<![A-Za-z])IEC\s+(\d+(?:-\d+)?)", re.IGNORECASE)),
+    ("ISO", re.compile(r"(?<![A-Za-z])ISO\s+(\d+(?:-\d+)?)", re.IGNORECASE)),
+    ("EN", re.compile(r"(?<![A-Za-z])EN\s+(\d+(?:-\d+)?)")),
+]
+
+# (doc_type, filename pattern), the first match wins
+_DOC_TYPE_PATTERNS = [
+    ("amendment", re.compile(r"修改单|amendment", re.IGNORECASE)),
+    ("accident_report", re.compile(
+        r"事故|调查报告|incident|derailment|accident|collision", re.IGNORECASE,
+    )),
+    ("statistics", re.compile(r"统计")),
+    ("work_programme", re.compile(r"work[_ ]programme|\bspd\b", re.IGNORECASE)),
+    ("standard", re.compile(
+        r"规范|标准|技术条件|specification|standard|subset-\d+", re.IGNORECASE,
+    )),
+]
+
+_CJK_RE = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_LATIN_WORD_RE = re.compile(r"[A-Za-zÄÖÜäöüß]+")
+_GERMAN_WORDS = frozenset(["der", "die", "das", "und", "nicht", "mit", "von", "zu", "ist", "werden"])
+_ENGLISH_WORDS = frozenset(["the", "and", "of", "to", "is", "in", "for", "be", "with", "are"])
+
+# Characters of the first chunk used to guess the language
+_LANGUAGE_SAMPLE = 4000
+
+
+def parse_standard(text: str) -> tuple[str, str] | None:
+    """
+    Find a standard number in a filename or a query.
+
+    Args:
+        text: The text, e.g. "GB∕T 20438.1-2017 电气..." or "GB/T 20438"
+
+    Returns:
+        (standard, standard_family), e.g. ("GB/T 20438.1", "GB/T 20438"),
+        or None if the text names no known standard
+    """
+    text = text.translate(PUNCT_TRANSLATION)
+    for organization, pattern in _STANDARD_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            number = match.group(1)
+            family = re.split(r"[.-]", number, maxsplit=1)[0]
+            return f"{organization} {number}", f"{organization} {family}"
+    return None
+
+
+def detect_language(text: str) -> str:
+    """Guess the language of a text: "zh", "en" or "de"."""
+    sample = text[:_LANGUAGE_SAMPLE]
+    n_cjk = len(_CJK_RE.findall(sample))
+    words = [word.lower() for word in _LATIN_WORD_RE.findall(sample)]
+    if n_cjk >= len(words):
+        return "zh"
+    n_german = sum(word in _GERMAN_WORDS for word in words)
+    n_english = sum(word in _ENGLISH_WORDS for word in words)
+    return "de" if n_german > n_english else "en"
+
+
+def classify_document(filename: str, standard: str | None = None) -> str:
+    """Guess the document type of a file from its name, one of DOC_TYPES."""
+    for doc_type, pattern in _DOC_TYPE_PATTERNS:
+        if pattern.search(filename):
+            return doc_type
+    return "standard" if standard is not None else "reference"
+
+
+def document_fields(file_path: str, sample_text: str = "") -> dict[str, str]:
+    """
+    Payload fields shared by all chunks of a file.
+
+    Args:
+        file_path: Path of the file
+        sample_text: Beginning of the text of the file, used to guess its
+                     language (the filename is used when empty)
+
+    Returns:
+        {field: value} for the fields in FILTER_FIELDS that could be derived
+    """
+    filename = os.path.basename(file_path)
+    stem = os.path.splitext(filename)[0]
+    fields = {"source": filename}
+
+    standard = parse_standard(stem)
+    if standard is not None:
+        fields["standard"], fields["standard_family"] = standard
+    fields["language"] = detect_language(sample_text or stem)
+    fields["doc_type"] = classify_document(stem, fields.get("standard"))
+    return fields
+
+
+def build_filters(
+    source: str | None = None,
+    standard: str | None = None,
+    doc_type: str | None = None,
+    language: str | None = None,
+) -> dict[str, list[str]]:
+    """
+    Build retrieval filters from the arguments of the retrieval tool.
+
+    A standard with a part, e.g. "GB/T 20438.1-2017", selects that part, a
+    standard without one, e.g. "GB/T 20438", selects all of its parts.
+
+    Args:
+        source: Filename of the document
+        standard: Standard number
+        doc_type: One of DOC_TYPES
+        language: "zh", "en" or "de"
+
+    Returns:
+        The filters, empty when no argument is given
+
+    Raises:
+        ValueError: If the standard number or the document type is unknown
+    """
+    filters = {}
+    if source:
+        filters["source"] = [source]
+    if standard:
+        parsed = parse_standard(standard)
+        if parsed is None:
+            raise ValueError(f"Unrecognized standard number: {standard}")
+        number, family = parsed
+        if number == family:
+            filters["standard_family"] = [family]
+        else:
+            filters["standard"] = [number]
+    if doc_type:
+        if doc_type not in DOC_TYPES:
+            raise ValueError(f"Unknown doc_type {doc_type!r}, choose one of {', '.join(DOC_TYPES)}")
+        filters["doc_type"] = [doc_type]
+    if language:
+        filters["language"] = [language]
+    return filters
+
+
+def normalize_filters(filters: dict[str, Any] | None) -> dict[str, list[Any]]:
+    """Turn single values of filters into one-element lists, drop empty ones."""
+    normalized = {}
+    for key, values in (filters or {}).items():
+        if values is None:
+            continue
+        if isinstance(values, str) or not isinstance(values, Iterable):
+            values = [values]
+        normalized[key] = list(values)
+    return normalized
+
+
+def matches_filters(fields: dict[str, Any], filters: dict[str, list[Any]]) -> bool:
+    """Whether document fields satisfy normalized filters."""
+    return all(fields.get(key) in values for key, values in filters.items())
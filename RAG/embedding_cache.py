@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent embedding cache.
+
+Wrap an embedding model so that every text is embedded at most once: vectors
+are stored in a local SQLite database keyed by (model_name, dimensions,
+sha256(text)), and only the texts missing from the cache are sent to the
+remote API. The cache is bounded by a maximum number of entries and evicts
+the least recently used vectors first.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, List
+
+import numpy as np
+
+from agentscope.embedding import (
+    EmbeddingModelBase,
+    EmbeddingResponse,
+    EmbeddingUsage,
+)
+from agentscope.message import TextBlock
+
+
+def text_hash(text: str) -> str:
+    """Return the sha256 hex digest of the given text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """Size-bounded LRU store of float32 vectors in a SQLite database."""
+
+    def __init__(self, path: str, max_entries: int = 100_000) -> None:
+        """
+        Args:
+            path: Path to the SQLite database file
+            max_entries: Maximum number of cached vectors, the least recently
+                         used ones are evicted beyond this size
+        """
+        self.path = path
+        self.max_entries = max_entries
+
+        # CachedEmbedding reads and writes from worker threads of
+        # asyncio.to_thread, so all access to the connection goes through
+        # the lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access INTEGER NOT NULL,
+                PRIMARY KEY (model_name, dimensions, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access "
+            "ON embeddings (last_access)"
+        )
+        self._conn.commit()
+
+    def get_many(
+        self,
+        model_name: str,
+        dimensions: int,
+        hashes: List[str],
+    ) -> dict:
+        """
+        Look up vectors by text hash and refresh their access time.
+
+        Returns:
+            Dictionary mapping the found hashes to their vectors
+        """
+        found = {}
+        now = time.time_ns()
+        with self._lock:
+            # Stay below SQLite's limit on the number of bound variables
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings "
+                    "WHERE model_name = ? AND dimensions = ? "
+                    f"AND text_hash IN ({placeholders})",
+                    (model_name, dimensions, *chunk),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? "
+                    "WHERE model_name = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model_name, dimensions, h) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(
+        self,
+        model_name: str,
+        dimensions: int,
+        items: dict,
+    ) -> None:
+        """
+        Store vectors keyed by text hash, then evict the least recently used
+        entries if the store exceeds its size bound.
+        """
+        now = time.time_ns()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(model_name, dimensions, text_hash, vector, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        model_name,
+                        dimensions,
+                        h,
+                        np.asarray(vector, dtype=np.float32).tobytes(),
+                        now,
+                    )
+                    for h, vector in items.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Delete the least recently used entries beyond max_entries."""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE (model_name, dimensions, text_hash) IN ("
+                "SELECT model_name, dimensions, text_hash FROM embeddings "
+                "ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+
+
+class CachedEmbedding(EmbeddingModelBase):
+    """
+    Embedding model wrapper that serves repeated texts from a local store.
+
+    It can be used anywhere the wrapped model is used, e.g. as the
+    `embedding_model` of `SimpleKnowledge`.
+    """
+
+    def __init__(
+        self,
+        model: EmbeddingModelBase,
+        store: SQLiteEmbeddingStore,
+    ) -> None:
+        """
+        Args:
+            model: The wrapped embedding model, only called on cache misses
+            store: The local vector store
+        """
+        super().__init__(model.model_name, model.dimensions)
+        self.model = model
+        self.store = store
+        self.supported_modalities = model.supported_modalities
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def batch_size_limit(self) -> int | None:
+        """The maximum batch size of the wrapped model, if it has one."""
+        return getattr(self.model, "batch_size_limit", None)
+
+    async def __call__(
+        self,
+        text: List[str | TextBlock],
+        **kwargs: Any,
+    ) -> EmbeddingResponse:
+        """
+        Embed the given texts, calling the wrapped model only for the texts
+        that are not cached yet.
+
+        Args:
+            text: The input texts, as strings or TextBlock dicts
+            **kwargs: Extra arguments for the wrapped model; they may change
+                      the output, so such calls bypass the cache
+        """
+        if kwargs:
+            return await self.model(text, **kwargs)
+
+        texts = [_["text"] if isinstance(_, dict) else _ for _ in text]
+        hashes = [text_hash(_) for _ in texts]
+
+        # SQLite I/O is blocking, keep it off the event loop
+        cached = await asyncio.to_thread(
+            self.store.get_many,
+            self.model_name,
+            self.dimensions,
+            list(set(hashes)),
+        )
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+
+        self.hits += len(hashes) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        if not missing:
+            return EmbeddingResponse(
+                embeddings=[cached[h] for h in hashes],
+                usage=EmbeddingUsage(tokens=0, time=0),
+                source="cache",
+            )
+
+        start_time = datetime.now()
+        res = await self.model(list(missing.values()))
+        new_vectors = dict(zip(missing.keys(), res.embeddings))
+        await asyncio.to_thread(
+            self.store.put_many,
+            self.model_name,
+            self.dimensions,
+            new_vectors,
+        )
+        cached.update(new_vectors)
+
+        return EmbeddingResponse(
+            embeddings=[cached[h] for h in hashes],
+            usage=EmbeddingUsage(
+                tokens=res.usage.tokens if res.usage else None,
+                time=(datetime.now() - start_time).total_seconds(),
+            ),
+            source="api",
+        )
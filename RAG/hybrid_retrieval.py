@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""
+Hybrid retrieval: a local BM25 inverted index fused with vector search.
+
+Dense retrieval often misses exact identifiers such as "GB/T 12758-2023",
+"T_CAMET 04011.4", "ZC" or "ATS". `BM25Index` keeps a lexical index over the
+same chunks that are stored in Qdrant, tokenizing Latin text into words and
+identifiers and Chinese text into character unigrams and bigrams.
+`HybridKnowledge` is a drop-in `SimpleKnowledge` whose `retrieve` (and hence
+`retrieve_knowledge` tool) fuses the vector and lexical rankings with
+reciprocal-rank fusion.
+
+The index keeps the document fields of `document_fields.py` per doc_id, so
+a retrieval with `filters` restricts both rankings to the same documents.
+"""
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Iterable
+
+import numpy as np
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata
+
+from document_fields import FILTER_FIELDS, PUNCT_TRANSLATION, matches_filters, normalize_filters
+from retrieval_cache import VectorQueryKnowledge
+
+
+_CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(
+    r"(?P<latin>[a-z0-9]+(?:[./\-_:][a-z0-9]+)*)"
+    rf"|(?P<cjk>[{_CJK_RANGES}]+)"
+)
+_SEPARATOR_RE = re.compile(r"[./\-_:]")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into BM25 terms.
+
+    Latin words and identifiers are lower-cased and kept whole; compound
+    identifiers ("12758-2023", "04011.4") are also split into their parts so
+    partial identifiers match. Runs of CJK characters produce character
+    unigrams and bigrams.
+
+    Args:
+        text: The input text
+
+    Returns:
+        List of terms, with repetitions
+    """
+    text = unicodedata.normalize("NFKC", text).translate(PUNCT_TRANSLATION).lower()
+
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        if match.lastgroup == "cjk":
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+            parts = _SEPARATOR_RE.split(token)
+            if len(parts) > 1:
+                tokens.extend(_ for _ in parts if _)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over document chunks, persisted as a single
+    compressed .npz file.
+
+    Chunks are identified by (doc_id, chunk_id), so adding a chunk that is
+    already indexed replaces it. Searches run over a CSR posting matrix that
+    is rebuilt lazily after the index is modified.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        """
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalisation
+        """
+        self.k1 = k1
+        self.b = b
+
+        # Per slot: (doc_id, chunk_id, total_chunks, text), None once removed
+        self._chunks: list[tuple[str, int, int, str] | None] = []
+        self._doc_len: list[int] = []
+        self._slots: dict[tuple[str, int], int] = {}
+        # Document fields used by filtered searches, per doc_id
+        self._doc_fields: dict[str, dict[str, Any]] = {}
+
+        # Mutable postings {term: {slot: tf}}, materialized on first change
+        self._postings: dict[str, dict[int, int]] | None = {}
+        # Read-only CSR form used by search, rebuilt after changes
+        self._csr: tuple[dict[str, int], np.ndarray, np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, documents: Iterable[Document]) -> None:
+        """Index the text chunks of the given documents."""
+        postings = self._mutable_postings()
+        for doc in documents:
+            meta = doc.metadata
+            key = (meta.doc_id, meta.chunk_id)
+            if key in self._slots:
+                self._remove_slot(self._slots[key])
+
+            text = meta.content["text"]
+            term_freqs = Counter(tokenize(text))
+            fields = {key: meta[key] for key in FILTER_FIELDS if meta.get(key) is not None}
+            if fields:
+                self._doc_fields[meta.doc_id] = fields
+
+            slot = len(self._chunks)
+            self._chunks.append((meta.doc_id, meta.chunk_id, meta.total_chunks, text))
+            self._doc_len.append(sum(term_freqs.values()))
+            self._slots[key] = slot
+
+            for term, tf in term_freqs.items():
+                postings.setdefault(term, {})[slot] = tf
+        self._csr = None
+
+    def remove_doc_ids(self, doc_ids: Iterable[str]) -> None:
+        """Remove every chunk belonging to the given doc_ids."""
+        doc_ids = set(doc_ids)
+        for key, slot in list(self._slots.items()):
+            if key[0] in doc_ids:
+                self._remove_slot(slot)
+        for doc_id in doc_ids:
+            self._doc_fields.pop(doc_id, None)
+        self._csr = None
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        filters: dict[str, Any] | None = None,
+    ) -> list[Document]:
+        """
+        Rank the indexed chunks against the query with BM25.
+
+        Args:
+            query: The query text
+            limit: Maximum number of results
+            filters: {field: value or values} the document fields of the
+                     results must match, or None for all chunks
+
+        Returns:
+            Documents with a positive BM25 score, best first
+        """
+        if not self._slots:
+            return []
+
+        vocab, indptr, indices, tfs = self._search_csr()
+        doc_len = np.asarray(self._doc_len, dtype=np.float32)
+        n_docs = len(self._slots)
+        avg_len = float(doc_len.sum()) / n_docs or 1.0
+
+        scores = np.zeros(len(self._chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            row = vocab.get(term)
+            if row is None:
+                continue
+            start, end = indptr[row], indptr[row + 1]
+            slots = indices[start:end]
+            tf = tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_len[slots] / avg_len)
+            scores[slots] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores > 0)
+        if filters:
+            filters = normalize_filters(filters)
+            allowed = {
+                doc_id
+                for doc_id, fields in self._doc_fields.items()
+                if matches_filters(fields, filters)
+            }
+            candidates = candidates[np.fromiter(
+                (self._chunks[slot][0] in allowed for slot in candidates.tolist()),
+                dtype=bool,
+                count=len(candidates),
+            )]
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [self._make_document(int(slot), float(scores[slot])) for slot in candidates]
+
+    def save(self, path: str) -> None:
+        """Write the index to a compressed .npz file (atomically)."""
+        self._compact()
+        vocab, indptr, indices, tfs = self._search_csr()
+        terms = sorted(vocab, key=vocab.get)
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            params=np.asarray([self.k1, self.b], dtype=np.float64),
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            indptr=indptr,
+            indices=indices,
+            tfs=tfs,
+            doc_len=np.asarray(self._doc_len, dtype=np.int32),
+            chunks=np.frombuffer(
+                json.dumps(self._chunks, ensure_ascii=False).encode("utf-8"),
+                dtype=np.uint8,
+            ),
+            doc_fields=np.frombuffer(
+                json.dumps(self._doc_fields, ensure_ascii=False).encode("utf-8"),
+                dtype=np.uint8,
+            ),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Load an index written by `save`."""
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+
+            terms_blob = data["terms"].tobytes().decode("utf-8")
+            terms = terms_blob.split("\n") if terms_blob else []
+            index._csr = (
+                {term: row for row, term in enumerate(terms)},
+                data["indptr"],
+                data["indices"],
+                data["tfs"],
+            )
+            index._doc_len = data["doc_len"].tolist()
+            index._chunks = [
+                tuple(_) for _ in json.loads(data["chunks"].tobytes().decode("utf-8"))
+            ]
+            # Indexes saved before the document fields were kept have none
+            if "doc_fields" in data.files:
+                index._doc_fields = json.loads(data["doc_fields"].tobytes().decode("utf-8"))
+
+        index._slots = {(c[0], c[1]): slot for slot, c in enumerate(index._chunks)}
+        index._postings = None
+        return index
+
+    def _make_document(self, slot: int, score: float) -> Document:
+        doc_id, chunk_id, total_chunks, text = self._chunks[slot]
+        metadata = DocMetadata(
+            content=TextBlock(type="text", text=text),
+            doc_id=doc_id,
+            chunk_id=chunk_id,
+            total_chunks=total_chunks,
+        )
+        metadata.update(**self._doc_fields.get(doc_id, {}))
+        return Document(id=f"{doc_id}-{chunk_id}", metadata=metadata, score=score)
+
+    def _remove_slot(self, slot: int) -> None:
+        postings = self._mutable_postings()
+        doc_id, chunk_id, _, text = self._chunks[slot]
+        for term in set(tokenize(text)):
+            term_postings = postings.get(term)
+            if term_postings is not None:
+                term_postings.pop(slot, None)
+                if not term_postings:
+                    del postings[term]
+        self._chunks[slot] = None
+        self._doc_len[slot] = 0
+        del self._slots[(doc_id, chunk_id)]
+
+    def _mutable_postings(self) -> dict[str, dict[int, int]]:
+        """Return the dict form of the postings, converting from CSR if needed."""
+        if self._postings is None:
+            vocab, indptr, indices, tfs = self._csr
+            self._postings = {
+                term: dict(zip(
+                    indices[indptr[row]:indptr[row + 1]].tolist(),
+                    tfs[indptr[row]:indptr[row + 1]].tolist(),
+                ))
+                for term, row in vocab.items()
+            }
+        return self._postings
+
+    def _search_csr(self) -> tuple[dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+        """Return the CSR form of the postings, rebuilding it if needed."""
+        if self._csr is None:
+            postings = self._postings
+            vocab = {}
+            indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+            for row, (term, term_postings) in enumerate(postings.items()):
+                vocab[term] = row
+                indptr[row + 1] = indptr[row] + len(term_postings)
+
+            indices = np.empty(indptr[-1], dtype=np.int32)
+            tfs = np.empty(indptr[-1], dtype=np.uint16)
+            for row, term_postings in enumerate(postings.values()):
+                start, end = indptr[row], indptr[row + 1]
+                indices[start:end] = list(term_postings.keys())
+                tfs[start:end] = np.minimum(list(term_postings.values()), 65535)
+
+            self._csr = (vocab, indptr, indices, tfs)
+        return self._csr
+
+    def _compact(self) -> None:
+        """Drop the slots of removed chunks and renumber the rest."""
+        if len(self._slots) == len(self._chunks):
+            return
+
+        postings = self._mutable_postings()
+        remap = {}
+        chunks, doc_len = [], []
+        for slot, chunk in enumerate(self._chunks):
+            if chunk is not None:
+                remap[slot] = len(chunks)
+                chunks.append(chunk)
+                doc_len.append(self._doc_len[slot])
+
+        self._postings = {
+            term: {remap[slot]: tf for slot, tf in term_postings.items()}
+            for term, term_postings in postings.items()
+        }
+        self._chunks = chunks
+        self._doc_len = doc_len
+        self._slots = {(c[0], c[1]): slot for slot, c in enumerate(chunks)}
+        self._csr = None
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[Document]],
+    k: int = 60,
+) -> list[Document]:
+    """
+    Fuse several rankings of chunks with reciprocal-rank fusion.
+
+    Each chunk scores sum(1 / (k + rank)) over the rankings it appears in.
+    The returned scores are divided by the best achievable score, so a chunk
+    ranked first everywhere scores 1.0.
+
+    Args:
+        rankings: Lists of documents, each ordered best first
+        k: RRF constant damping the influence of the top ranks
+
+    Returns:
+        Fused list of documents, best first
+    """
+    fused: dict[tuple[str, int], list] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = (doc.metadata.doc_id, doc.metadata.chunk_id)
+            entry = fused.setdefault(key, [0.0, doc])
+            entry[0] += 1.0 / (k + rank)
+
+    best = len(rankings) / (k + 1)
+    docs = []
+    for score, doc in sorted(fused.values(), key=lambda _: _[0], reverse=True):
+        doc.score = score / best
+        docs.append(doc)
+    return docs
+
+
+class HybridKnowledge(VectorQueryKnowledge):
+    """
+    Knowledge base fusing Qdrant vector search with a local BM25 index.
+
+    The `score_threshold` of a retrieval applies to the vector results only,
+    lexical matches are always considered. The returned scores are the
+    normalized RRF scores in [0, 1], relative to the best possible rank, so
+    the agent's retrieval tool does not offer a threshold in hybrid mode.
+    """
+
+    def __init__(
+        self,
+        embedding_store: Any,
+        embedding_model: Any,
+        bm25_index: BM25Index,
+        rrf_k: int = 60,
+        candidate_factor: int = 3,
+    ) -> None:
+        """
+        Args:
+            embedding_store: The vector store
+            embedding_model: The embedding model
+            bm25_index: Lexical index over the same chunks as the vector store
+            rrf_k: RRF constant
+            candidate_factor: Each ranking fetches limit * candidate_factor
+                              candidates before fusion
+        """
+        super().__init__(embedding_store, embedding_model)
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+        self.candidate_factor = candidate_factor
+
+    async def retrieve(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """Retrieve chunks by fusing the vector and BM25 rankings."""
+        n_candidates = max(limit * self.candidate_factor, limit)
+        vector_docs = await super().retrieve(
+            query,
+            limit=n_candidates,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        lexical_docs = self.bm25_index.search(query, n_candidates, kwargs.get("filters"))
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], k=self.rrf_k)[:limit]
+
+    async def add_documents(self, documents: list[Document], **kwargs: Any) -> None:
+        """Add documents to both the vector store and the BM25 index."""
+        await super().add_documents(documents, **kwargs)
+        self.bm25_index.add(documents)
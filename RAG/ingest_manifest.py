@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+增量导入清单模块。
+记录每个已导入文件的内容哈希、分块参数和 chunk id，
+重复导入时只处理新增或发生变化的文件，并从向量库中清理过期的 chunks。
+"""
+import hashlib
+import json
+import os
+from typing import Any
+
+from agentscope.rag import QdrantStore, SimpleKnowledge
+
+
+MANIFEST_VERSION = 1
+
+
+def compute_file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    按块读取文件并计算内容的 sha256，内存占用与文件大小无关。
+
+    Args:
+        file_path: 文件路径
+        block_size: 每次读取的字节数
+
+    Returns:
+        十六进制的 sha256 字符串
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    导入清单，保存为 JSON 文件。
+
+    每个文件对应一条记录：
+    {
+      "content_hash": "...",
+      "size": 1234,
+      "mtime_ns": 1700000000000000000,
+      "params": {"load_method": "chunked", ...},
+      "doc_ids": ["..."],
+      "chunk_ids": ["...-0", "...-1"],
+      "duplicate_of": ["..."]
+    }
+
+    duplicate_of 是该文件中因近重复而未写入的 chunks 所对应的 canonical chunks 的 doc_id，
+    只在启用去重时出现。
+
+    加载中途失败的文件只记录 {"doc_ids": [...], "incomplete": true}，
+    即失败前已产出的 chunks，下次导入时该文件总会重新加载，这些 chunks 作为过期 chunks 删除。
+
+    使用流程：
+    1. 对目录中的每个文件调用 `is_unchanged`，为 True 时跳过该文件，
+       再调用 `reload_dependents` 找出依赖过期 chunks 的文件，一并重新加载；
+    2. 写入新 chunks 之前，用 `stale_doc_ids` 删除过期的 chunks，
+       并调用一次 `save`，使清单不再引用已删除的 chunks；
+    3. 文件加载成功后调用 `record` 登记新的 chunks，加载失败时调用 `forget`；
+       启用去重时，全部加载后用 `record_duplicates` 登记文件之间的依赖；
+    4. 全部写入成功后再次调用 `save` 持久化清单。
+    """
+
+    def __init__(self, path: str, collection: str, params: dict[str, Any]) -> None:
+        """
+        Args:
+            path: 清单文件路径
+            collection: 目标向量库集合的标识，与清单中记录的不一致时视为全量导入
+            params: 当前的分块参数，与记录中的不一致的文件会被重新导入
+        """
+        self.path = path
+        self.collection = collection
+        self.params = params
+
+        self.entries: dict[str, dict[str, Any]] = {}
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._seen: set[str] = set()
+        self._changed: set[str] = set()
+        self._hashes: dict[str, str] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data.get("version") == MANIFEST_VERSION
+                and data.get("collection") == collection
+            ):
+                self.entries = data.get("files", {})
+
+    def is_unchanged(self, file_path: str) -> bool:
+        """
+        判断文件自上次导入后是否未发生变化。
+
+        大小和修改时间都未变时直接认为未变化，否则比较内容哈希。
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            True 表示可以跳过该文件
+        """
+        filename = os.path.basename(file_path)
+        self._seen.add(filename)
+
+        entry = self.entries.get(filename)
+        if entry is None or entry.get("params") != self.params:
+            self._changed.add(filename)
+            return False
+
+        stat = os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+
+        content_hash = self._file_hash(file_path)
+        if content_hash != entry["content_hash"]:
+            self._changed.add(filename)
+            return False
+
+        # 内容未变但修改时间变了，刷新记录避免下次重复计算哈希
+        self._pending[filename] = {
+            **entry,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        return True
+
+    def record(self, file_path: str, doc_ids: list[str], chunk_ids: list[str]) -> None:
+        """
+        登记一个成功加载的文件及其 chunks。
+
+        Args:
+            file_path: 文件路径
+            doc_ids: 该文件产生的 doc_id 列表
+            chunk_ids: 该文件产生的 Document id 列表
+        """
+        filename = os.path.basename(file_path)
+        self._seen.add(filename)
+        self._changed.add(filename)
+        stat = os.stat(file_path)
+
+        self._pending[filename] = {
+            "content_hash": self._file_hash(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "params": self.params,
+            "doc_ids": sorted(doc_ids),
+            "chunk_ids": list(chunk_ids),
+        }
+
+    def forget(self, file_path: str, doc_ids: list[str] = ()) -> None:
+        """
+        把一个加载失败的文件标记为未完成，下次导入时会重新加载该文件。
+
+        失败前已产出的 chunks 可能已经写入向量库，它们的 doc_id 保留在清单中，
+        下次导入时由 `stale_doc_ids` 删除，即使文件在此期间被修改或删除。
+
+        Args:
+            file_path: 文件路径
+            doc_ids: 失败前已产出的 chunks 的 doc_id 列表
+        """
+        filename = os.path.basename(file_path)
+        self._seen.add(filename)
+        self._changed.add(filename)
+        if doc_ids:
+            # 没有 params 的记录在 is_unchanged 中总被视为已变化
+            self._pending[filename] = {"doc_ids": sorted(doc_ids), "incomplete": True}
+        else:
+            self._pending.pop(filename, None)
+
+    def record_duplicates(self, duplicate_of: dict[str, set[str]]) -> None:
+        """
+        为本次登记的文件记录其近重复 chunks 所依赖的 doc_id。
+
+        Args:
+            duplicate_of: 被去重的 chunks 所属的 doc_id -> canonical chunks 所属的 doc_id
+        """
+        for entry in self._pending.values():
+            depends = set()
+            for doc_id in entry["doc_ids"]:
+                depends.update(duplicate_of.get(doc_id, ()))
+            if depends:
+                entry["duplicate_of"] = sorted(depends)
+
+    def reload_dependents(self) -> list[str]:
+        """
+        把依赖过期 chunks 的未变化文件标记为需要重新加载。
+
+        去重时被丢弃的 chunks 只以 canonical chunk 的形式保存在其他文档中，
+        该文档过期被删除后，依赖它的文件也必须重新导入，否则这部分内容会从向量库中消失。
+        需要在对所有文件调用 `is_unchanged` 之后、调用 `stale_doc_ids` 之前调用。
+
+        Returns:
+            需要额外重新加载的文件名列表
+        """
+        reloaded = []
+        while True:
+            stale = set(self.stale_doc_ids())
+            dependents = [
+                filename
+                for filename, entry in self.entries.items()
+                if filename in self._seen
+                and filename not in self._changed
+                and stale.intersection(entry.get("duplicate_of", ()))
+            ]
+            if not dependents:
+                return sorted(reloaded)
+            for filename in dependents:
+                self._changed.add(filename)
+                self._pending.pop(filename, None)
+            reloaded.extend(dependents)
+
+    def stale_doc_ids(self) -> list[str]:
+        """
+        计算需要从向量库中删除的 doc_id：
+        需要重新加载的文件的旧 doc_id，以及目录中已不存在的文件的 doc_id。
+        仍被未变化文件引用的 doc_id 不会被删除。
+
+        需要在对所有文件调用 `is_unchanged` 之后、写入新 chunks 之前调用，
+        因为参数变化时新旧 chunks 可能共用 doc_id。
+
+        Returns:
+            doc_id 列表
+        """
+        stale = set()
+        kept = set()
+        for filename, entry in self.entries.items():
+            if filename not in self._seen or filename in self._changed:
+                stale.update(entry["doc_ids"])
+            else:
+                kept.update(entry["doc_ids"])
+        return sorted(stale - kept)
+
+    def removed_files(self) -> list[str]:
+        """返回清单中有记录、但本次导入未出现的文件名。"""
+        return sorted(set(self.entries) - self._seen)
+
+    def save(self) -> None:
+        """
+        合并本次导入的结果并原子地写入清单文件。
+
+        需要重新加载、但尚未登记的文件不会写入清单，
+        即使导入中途失败，下次导入时这些文件也会被重新加载。
+        """
+        files = {
+            filename: entry
+            for filename, entry in self.entries.items()
+            if filename in self._seen and filename not in self._changed
+        }
+        files.update(self._pending)
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "collection": self.collection,
+            "files": files,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+        self.entries = files
+        self._pending = {}
+
+    def _file_hash(self, file_path: str) -> str:
+        """带缓存地计算文件哈希，同一文件在一次导入中只计算一次。"""
+        if file_path not in self._hashes:
+            self._hashes[file_path] = compute_file_hash(file_path)
+        return self._hashes[file_path]
+
+
+async def delete_documents_by_doc_id(
+    knowledge: SimpleKnowledge,
+    doc_ids: list[str],
+    batch_size: int = 256,
+) -> None:
+    """
+    按 doc_id 从向量库中删除对应的全部 chunks。
+
+    QdrantStore 没有实现 delete，这里直接使用底层客户端按 payload 过滤删除；
+    其他向量库调用其 delete(doc_ids)。
+
+    Args:
+        knowledge: SimpleKnowledge 实例
+        doc_ids: 要删除的 doc_id 列表
+        batch_size: 每次删除请求包含的 doc_id 数量
+    """
+    from qdrant_client import models
+
+    if not doc_ids:
+        return
+
+    store = knowledge.embedding_store
+    if not isinstance(store, QdrantStore):
+        await store.delete(doc_ids)
+        return
+
+    client = store.get_client()
+    if not await client.collection_exists(store.collection_name):
+        return
+
+    for i in range(0, len(doc_ids), batch_size):
+        await client.delete(
+            collection_name=store.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="doc_id",
+                            match=models.MatchAny(any=doc_ids[i:i + batch_size]),
+                        ),
+                    ],
+                ),
+            ),
+        )
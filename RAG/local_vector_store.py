@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""
+Embedded, persistent vector store.
+
+An alternative to running a Qdrant server for a corpus of tens of thousands
+of chunks: `LocalVectorStore` keeps everything in one directory and runs in
+the agent process, so there is no server to start and opening the store
+only maps its files.
+
+- `vectors.f32`: unit-normalized float32 vectors, one row per chunk,
+  memory-mapped as a NumPy matrix
+- a `ChunkStore` (chunks.bin, index.bin, docs.jsonl) holding the chunk text
+  and metadata, row i of its index belonging to row i of the vectors
+- `payloads.jsonl`: payload keys beyond those of the chunk store, such as
+  the `duplicate_doc_ids` written after deduplication
+- `ivf.npz`: optional inverted-file partitioning of the vectors
+- `quantizer.npz` / `codes.npy`: optional int8 or product-quantized codes
+  of the vectors
+
+Searches compute cosine similarities with one matrix-vector product and
+select the top-k with `argpartition`. With IVF enabled, only the rows in
+the lists of the `n_probe` centroids closest to the query are scored,
+together with the rows added since the IVF was built. With quantization
+enabled, the rows are first scored against their codes and only the best
+`limit * oversampling` candidates are rescored with the float vectors, so
+the float matrix no longer has to stay in memory.
+
+Searches accept `filters={field: value or values}` on the document fields of
+`document_fields.py`, e.g. {"standard_family": "GB/T 20438"}: only the rows
+of the matching documents are scored, exactly, without IVF.
+"""
+import json
+import math
+import os
+from dataclasses import fields
+from typing import Any, Iterable
+
+import numpy as np
+
+from agentscope.rag import Document, DocMetadata, VDBStoreBase
+from agentscope.types import Embedding
+
+from chunk_store import ChunkStore
+from document_fields import FILTER_FIELDS
+from vector_quantization import QUANTIZERS, cluster_sums
+
+
+VECTORS_FILE = "vectors.f32"
+PAYLOADS_FILE = "payloads.jsonl"
+IVF_FILE = "ivf.npz"
+QUANTIZER_FILE = "quantizer.npz"
+CODES_FILE = "codes.npy"
+CONFIG_FILE = "store.json"
+
+# Keys kept by the chunk store itself, not repeated in payloads.jsonl
+_CHUNK_STORE_KEYS = frozenset(
+    [field.name for field in fields(DocMetadata)] + ["page_start", "page_end", *FILTER_FIELDS]
+)
+
+# Rows scored at once when assigning vectors to IVF lists
+_ASSIGN_BLOCK = 16384
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 10,
+    sample_size: int | None = None,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Args:
+        vectors: Unit-normalized vectors, one per row
+        n_clusters: Number of centroids
+        n_iter: Number of Lloyd iterations
+        sample_size: Number of rows the centroids are trained on (defaults
+                     to 256 per centroid), all rows if there are fewer
+        seed: Random seed of the sampling and initialization
+
+    Returns:
+        Unit-normalized centroids, shape (n_clusters, dimensions)
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or 256 * n_clusters
+    if len(vectors) > sample_size:
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    else:
+        sample = np.asarray(vectors)
+
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = cluster_sums(labels, sample, n_clusters)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty clusters keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
+
+
+class LocalVectorStore(VDBStoreBase):
+    """Memory-mapped vector store searched in process."""
+
+    def __init__(
+        self,
+        path: str,
+        dimensions: int,
+        collection_name: str = "test_collection",
+        ivf_lists: int = 0,
+        n_probe: int = 8,
+        quantization: str | None = None,
+        oversampling: float = 4.0,
+    ) -> None:
+        """
+        Args:
+            path: Directory of the store, created if missing
+            dimensions: Dimension of the embeddings
+            collection_name: Name recorded in ingestion manifests
+            ivf_lists: Number of IVF lists built by `optimize`, 0 for exact
+                       brute-force search
+            n_probe: Number of IVF lists scored per search
+            quantization: Codes built by `optimize`, "int8" or "pq", or None
+                          to score the float vectors only
+            oversampling: With quantization, limit * oversampling candidates
+                          are rescored with the float vectors
+
+        Raises:
+            ValueError: If the store was created with other dimensions, or
+                        the quantization is unknown
+        """
+        if quantization is not None and quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.path = path
+        self.dimensions = dimensions
+        self.collection_name = collection_name
+        self.ivf_lists = ivf_lists
+        self.n_probe = n_probe
+        self.quantization = quantization
+        self.oversampling = oversampling
+
+        os.makedirs(path, exist_ok=True)
+        config_path = os.path.join(path, CONFIG_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)["dimensions"]
+            if stored != dimensions:
+                raise ValueError(
+                    f"Store {path} holds {stored}-dimensional vectors, not {dimensions}",
+                )
+        else:
+            with open(config_path, "w", encoding="utf-8") as f:
+                json.dump({"dimensions": dimensions}, f)
+
+        self.chunk_store = ChunkStore(path)
+        self._vectors_path = os.path.join(path, VECTORS_FILE)
+        open(self._vectors_path, "ab").close()
+        # Vectors are written before the index records, so an interrupted
+        # add leaves vectors without index rows, never the other way round
+        n_rows = len(self.chunk_store.deleted_mask())
+        if os.path.getsize(self._vectors_path) != n_rows * dimensions * 4:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(n_rows * dimensions * 4)
+
+        self._payloads: dict[tuple[str, int], dict[str, Any]] = {}
+        self._load_payloads()
+
+        self._ivf: tuple[np.ndarray, np.ndarray, np.ndarray, int] | None = None
+        ivf_path = os.path.join(path, IVF_FILE)
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as data:
+                self._ivf = (
+                    data["centroids"],
+                    data["offsets"],
+                    data["rows"],
+                    int(data["n_rows"]),
+                )
+
+        # Codes of the first n rows of the vectors, (quantizer, codes, n)
+        self._codes = None
+        quantizer_path = os.path.join(path, QUANTIZER_FILE)
+        if quantization is not None and os.path.exists(quantizer_path):
+            with np.load(quantizer_path) as data:
+                if str(data["kind"]) == quantization:
+                    self._codes = (
+                        QUANTIZERS[quantization].from_state(data),
+                        np.load(os.path.join(path, CODES_FILE), mmap_mode="r"),
+                        int(data["n_rows"]),
+                    )
+
+        self._vectors = None
+        self._remap()
+
+    def __len__(self) -> int:
+        return len(self.chunk_store)
+
+    async def add(self, documents: list[Document], **kwargs: Any) -> None:
+        """
+        Add embedded chunks, replacing those with the same
+        (doc_id, chunk_id).
+
+        Raises:
+            ValueError: If the embeddings do not have the store dimensions
+        """
+        if not documents:
+            return
+        vectors = np.asarray([doc.embedding for doc in documents], dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Expected {self.dimensions}-dimensional embeddings, got shape {vectors.shape}",
+            )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+
+        lines = []
+        for doc in documents:
+            key = (doc.metadata.doc_id, doc.metadata.chunk_id)
+            extra = {
+                k: v for k, v in doc.metadata.items() if k not in _CHUNK_STORE_KEYS
+            }
+            if extra or key in self._payloads:
+                lines.append({"doc_id": key[0], "chunk_id": key[1], "payload": extra})
+        self._append_payloads(lines)
+
+        self.chunk_store.append(documents)
+        self._remap()
+
+    async def delete(self, doc_ids: Iterable[str], **kwargs: Any) -> None:
+        """Delete every chunk belonging to the given doc_ids."""
+        doc_ids = list(doc_ids)
+        self.chunk_store.remove_doc_ids(doc_ids)
+        removed = set(doc_ids)
+        if any(key[0] in removed for key in self._payloads):
+            self._append_payloads([{"delete_doc_ids": doc_ids}])
+
+    async def search(
+        self,
+        query_embedding: Embedding,
+        limit: int,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """
+        Return the chunks most similar to the query, best first.
+
+        Args:
+            query_embedding: The query embedding
+            limit: Maximum number of results
+            score_threshold: Minimum cosine similarity of the results
+            **kwargs: `filters`, {field: value or values} on the document
+                      fields the results must match
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        if kwargs.get("filters"):
+            rows = np.flatnonzero(self.chunk_store.filter_mask(kwargs["filters"]))
+        else:
+            rows = self._candidate_rows(query)
+        if self._codes is not None and self._codes[2] <= len(self._vectors):
+            rows, scores = self._approximate_scores(rows, query)
+            live = ~self.chunk_store.deleted_mask()[rows]
+            rows, scores = rows[live], scores[live]
+            # Rescore the best approximate candidates with the float vectors
+            n_candidates = math.ceil(limit * self.oversampling)
+            if len(rows) > n_candidates:
+                rows = rows[np.argpartition(-scores, n_candidates)[:n_candidates]]
+            rows = np.sort(rows)
+            scores = self._vectors[rows] @ query
+        elif rows is None:
+            scores = self._vectors @ query
+            rows = np.arange(len(scores))
+        else:
+            scores = self._vectors[rows] @ query
+
+        live = ~self.chunk_store.deleted_mask()[rows]
+        if score_threshold is not None:
+            live &= scores >= score_threshold
+        rows, scores = rows[live], scores[live]
+
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+
+        docs = []
+        for row, score in zip(rows[order].tolist(), scores[order].tolist()):
+            doc = self.chunk_store.document(row)
+            payload = self._payloads.get((doc.metadata.doc_id, doc.metadata.chunk_id))
+            if payload:
+                doc.metadata.update(**payload)
+            doc.score = score
+            docs.append(doc)
+        return docs
+
+    async def update_payloads(
+        self,
+        updates: Iterable[tuple[str, int, dict[str, Any]]],
+        batch_size: int = 256,
+    ) -> None:
+        """
+        Merge keys into the payload of already written chunks.
+
+        Args:
+            updates: (doc_id, chunk_id, payload) of each chunk to update
+            batch_size: Unused, kept for compatibility with
+                        `PayloadQdrantStore.update_payloads`
+        """
+        self._append_payloads([
+            {"doc_id": doc_id, "chunk_id": chunk_id, "payload": payload, "merge": True}
+            for doc_id, chunk_id, payload in updates
+        ])
+
+    def optimize(self) -> list[str]:
+        """
+        Rebuild the IVF lists and the quantized codes, each if it is enabled
+        and more than a tenth of the rows were added since it was built.
+
+        Returns:
+            Names of the rebuilt structures, e.g. ["ivf", "int8"]
+        """
+        n_rows = len(self._vectors)
+        rebuilt = []
+
+        indexed = self._ivf[3] if self._ivf is not None else 0
+        if self.ivf_lists and n_rows >= self.ivf_lists and n_rows - indexed > n_rows // 10:
+            self._build_ivf()
+            rebuilt.append("ivf")
+
+        encoded = self._codes[2] if self._codes is not None else 0
+        if self.quantization and n_rows and n_rows - encoded > n_rows // 10:
+            self._build_codes()
+            rebuilt.append(self.quantization)
+        return rebuilt
+
+    def get_client(self) -> "LocalVectorStore":
+        """The store is its own client."""
+        return self
+
+    def _build_ivf(self) -> None:
+        """Partition the vectors with spherical k-means."""
+        n_rows = len(self._vectors)
+        centroids = spherical_kmeans(self._vectors, self.ivf_lists)
+        labels = np.empty(n_rows, dtype=np.int32)
+        for i in range(0, n_rows, _ASSIGN_BLOCK):
+            block = self._vectors[i:i + _ASSIGN_BLOCK]
+            labels[i:i + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        rows = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(self.ivf_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.ivf_lists), out=offsets[1:])
+
+        tmp_path = os.path.join(self.path, f"{IVF_FILE}.tmp.npz")
+        np.savez(tmp_path, centroids=centroids, offsets=offsets, rows=rows, n_rows=n_rows)
+        os.replace(tmp_path, os.path.join(self.path, IVF_FILE))
+        self._ivf = (centroids, offsets, rows, n_rows)
+
+    def _build_codes(self) -> None:
+        """Train the quantizer and encode every vector."""
+        n_rows = len(self._vectors)
+        quantizer = QUANTIZERS[self.quantization].train(self._vectors)
+        codes = quantizer.encode(self._vectors)
+
+        # The codes are replaced before the quantizer that describes them,
+        # a store interrupted in between is re-encoded on the next optimize
+        quantizer_path = os.path.join(self.path, QUANTIZER_FILE)
+        if os.path.exists(quantizer_path):
+            os.remove(quantizer_path)
+        self._codes = None
+        tmp_path = os.path.join(self.path, f"{CODES_FILE}.tmp.npy")
+        np.save(tmp_path, codes)
+        os.replace(tmp_path, os.path.join(self.path, CODES_FILE))
+        tmp_path = os.path.join(self.path, f"{QUANTIZER_FILE}.tmp.npz")
+        np.savez(tmp_path, kind=self.quantization, n_rows=n_rows, **quantizer.state())
+        os.replace(tmp_path, quantizer_path)
+
+        self._codes = (
+            quantizer,
+            np.load(os.path.join(self.path, CODES_FILE), mmap_mode="r"),
+            n_rows,
+        )
+
+    def _approximate_scores(
+        self,
+        rows: np.ndarray | None,
+        query: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Score rows against their codes; rows added since the codes were
+        built are scored with their float vectors.
+
+        Args:
+            rows: Rows to score, or None for every row
+            query: Unit-normalized query
+
+        Returns:
+            The scored rows and their approximate scores
+        """
+        quantizer, codes, n_encoded = self._codes
+        if rows is None:
+            rows = np.arange(len(self._vectors))
+            encoded_scores = quantizer.scores(codes, query)
+        else:
+            encoded_scores = quantizer.scores(codes[rows[rows < n_encoded]], query)
+        tail = rows[rows >= n_encoded]
+        scores = np.concatenate([encoded_scores, self._vectors[tail] @ query])
+        return np.concatenate([rows[rows < n_encoded], tail]), scores
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray | None:
+        """Rows to score with IVF, or None to score every row."""
+        if not self.ivf_lists or self._ivf is None:
+            return None
+        centroids, offsets, rows, n_rows = self._ivf
+        if n_rows > len(self._vectors):
+            return None
+
+        n_probe = min(self.n_probe, len(centroids))
+        probe = np.argpartition(-(centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate(
+            [rows[offsets[i]:offsets[i + 1]] for i in probe]
+            + [np.arange(n_rows, len(self._vectors))],
+        )
+
+    def _load_payloads(self) -> None:
+        path = os.path.join(self.path, PAYLOADS_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by an interrupted write
+                    break
+                self._apply_payload(entry)
+
+    def _append_payloads(self, entries: list[dict[str, Any]]) -> None:
+        if not entries:
+            return
+        with open(os.path.join(self.path, PAYLOADS_FILE), "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._apply_payload(entry)
+
+    def _apply_payload(self, entry: dict[str, Any]) -> None:
+        if "delete_doc_ids" in entry:
+            doc_ids = set(entry["delete_doc_ids"])
+            for key in [key for key in self._payloads if key[0] in doc_ids]:
+                del self._payloads[key]
+            return
+
+        key = (entry["doc_id"], entry["chunk_id"])
+        if entry.get("merge"):
+            self._payloads.setdefault(key, {}).update(entry["payload"])
+        elif entry["payload"]:
+            self._payloads[key] = entry["payload"]
+        else:
+            self._payloads.pop(key, None)
+
+    def _remap(self) -> None:
+        n_rows = os.path.getsize(self._vectors_path) // (self.dimensions * 4)
+        if n_rows:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(n_rows, self.dimensions),
+            )
+        else:
+            self._vectors = np.empty((0, self.dimensions), dtype=np.float32)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Qdrant store whose chunks may carry extra payload keys.
+
+`QdrantStore.search` rebuilds the metadata with `DocMetadata(**payload)`,
+which raises as soon as a point payload holds anything besides the four
+`DocMetadata` fields. `PayloadQdrantStore` keeps such keys as extra entries
+of the returned metadata (`DocMetadata` is a dict), and can merge new keys
+into the payload of chunks that were already written.
+
+It can also create its collection with int8 scalar or product quantization:
+the quantized vectors stay in RAM, the float vectors move to disk and are
+only read to rescore the oversampled candidates of each search.
+
+The document fields of `document_fields.py` (source, standard, language,
+...) get keyword payload indexes, and searches accept
+`filters={field: value or values}` on them, so Qdrant only scores the
+points of the matching documents.
+"""
+from dataclasses import fields
+from typing import Any, Iterable
+
+from agentscope.rag import Document, DocMetadata, QdrantStore
+from agentscope.types import Embedding
+
+from document_fields import FILTER_FIELDS, normalize_filters
+
+
+_METADATA_FIELDS = frozenset(field.name for field in fields(DocMetadata))
+
+
+def metadata_from_payload(payload: dict[str, Any]) -> DocMetadata:
+    """Build a `DocMetadata` from a point payload, keeping unknown keys."""
+    metadata = DocMetadata(**{
+        key: value for key, value in payload.items() if key in _METADATA_FIELDS
+    })
+    for key, value in payload.items():
+        if key not in _METADATA_FIELDS:
+            metadata[key] = value
+    return metadata
+
+
+def qdrant_filter(filters: dict[str, Any]) -> Any:
+    """Translate {field: value or values} filters into a Qdrant filter."""
+    from qdrant_client import models
+
+    return models.Filter(
+        must=[
+            models.FieldCondition(key=key, match=models.MatchAny(any=values))
+            for key, values in normalize_filters(filters).items()
+        ],
+    )
+
+
+class PayloadQdrantStore(QdrantStore):
+    """`QdrantStore` tolerating and updating extra payload keys."""
+
+    def __init__(
+        self,
+        *args: Any,
+        quantization: str | None = None,
+        oversampling: float = 4.0,
+        payload_indexes: Iterable[str] = FILTER_FIELDS,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Args:
+            *args: Arguments of `QdrantStore`
+            quantization: "int8" or "pq" to create the collection with
+                          quantized vectors, None for float vectors only.
+                          An existing collection keeps its configuration.
+            oversampling: With quantization, limit * oversampling candidates
+                          are rescored with the float vectors
+            payload_indexes: Payload keys given a keyword index, created
+                             with the collection or on the first write
+            **kwargs: Keyword arguments of `QdrantStore`
+
+        Raises:
+            ValueError: If the quantization is unknown
+        """
+        super().__init__(*args, **kwargs)
+        self.payload_indexes = list(payload_indexes)
+        self._payload_indexed = False
+        self.search_params = None
+        if quantization is None:
+            return
+
+        from qdrant_client import models
+
+        if quantization == "int8":
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.999,
+                    always_ram=True,
+                ),
+            )
+        elif quantization == "pq":
+            quantization_config = models.ProductQuantization(
+                product=models.ProductQuantizationConfig(
+                    compression=models.CompressionRatio.X32,
+                    always_ram=True,
+                ),
+            )
+        else:
+            raise ValueError(f"Unknown quantization: {quantization}")
+
+        self.collection_kwargs = {
+            "vectors_config": models.VectorParams(
+                size=self.dimensions,
+                distance=getattr(models.Distance, self.distance.upper()),
+                on_disk=True,
+            ),
+            "quantization_config": quantization_config,
+            **self.collection_kwargs,
+        }
+        self.search_params = models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=True,
+                oversampling=oversampling,
+            ),
+        )
+
+    async def _validate_collection(self) -> None:
+        """Create the collection if needed, then its payload indexes."""
+        await super()._validate_collection()
+        if not self._payload_indexed:
+            await self.create_payload_indexes()
+
+    async def create_payload_indexes(self) -> None:
+        """Create the keyword payload indexes of an existing collection."""
+        from qdrant_client import models
+
+        # Creating an index that already exists is a no-op
+        for key in self.payload_indexes:
+            await self._client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=key,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+                wait=True,
+            )
+        self._payload_indexed = True
+
+    async def search(
+        self,
+        query_embedding: Embedding,
+        limit: int,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """
+        Search relevant documents, keeping extra payload keys in metadata.
+
+        Args:
+            query_embedding: The query embedding
+            limit: Maximum number of results
+            score_threshold: Minimum score of the results
+            **kwargs: `filters`, {field: value or values} the payload of the
+                      results must match, and keyword arguments of
+                      `query_points`
+        """
+        filters = kwargs.pop("filters", None)
+        if filters:
+            kwargs["query_filter"] = qdrant_filter(filters)
+        if self.search_params is not None:
+            kwargs.setdefault("search_params", self.search_params)
+        res = await self._client.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            limit=limit,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        return [
+            Document(
+                embedding=point.vector,
+                score=point.score,
+                metadata=metadata_from_payload(point.payload),
+            )
+            for point in res.points
+        ]
+
+    async def update_payloads(
+        self,
+        updates: Iterable[tuple[str, int, dict[str, Any]]],
+        batch_size: int = 256,
+    ) -> None:
+        """
+        Merge keys into the payload of already written chunks.
+
+        Args:
+            updates: (doc_id, chunk_id, payload) of each chunk to update
+            batch_size: Number of updates sent in one request
+        """
+        from qdrant_client import models
+
+        operations = [
+            models.SetPayloadOperation(
+                set_payload=models.SetPayload(
+                    payload=payload,
+                    filter=models.Filter(
+                        must=[
+                            models.FieldCondition(
+                                key="doc_id",
+                                match=models.MatchValue(value=doc_id),
+                            ),
+                            models.FieldCondition(
+                                key="chunk_id",
+                                match=models.MatchValue(value=chunk_id),
+                            ),
+                        ],
+                    ),
+                ),
+            )
+            for doc_id, chunk_id, payload in updates
+        ]
+        for i in range(0, len(operations), batch_size):
+            await self._client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=operations[i:i + batch_size],
+            )
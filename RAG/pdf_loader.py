@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+PDF 直接加载模块。
+
+从 PDF 提取文本后直接分块产出 Document，不再经过 pdf_reader.py 导出的
+"--- Document Chunk i ---" 中间 txt 文件，并在 metadata 中保留每个 chunk 的来源信息：
+- source: PDF 文件名
+- page_start / page_end: chunk 起止所在的页码（从 1 开始）
+- char_offset: chunk 在全文中的起始字符位置
+
+全文由各页文本用空行连接而成，与 AgentScope 的 PDFReader 一致。
+各页文本逐页送入分块函数，不会把全文或全部 chunks 保留在内存中。
+"""
+import bisect
+import hashlib
+import os
+from typing import Callable, Iterable, Iterator
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata
+
+
+# 查找 chunk 位置时在最近读入的一页之前最多回看的字符数：
+# chunk 不是全文的子串时，查找的开销和保留的文本都不超过这个范围
+_SEARCH_LOOKBACK = 1 << 16
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """
+    使用 pypdf 逐页提取 PDF 的文本层。
+
+    扫描件没有文本层，需要先用 Data/src/pdf_reader_ocr.py 识别为 txt。
+
+    Args:
+        file_path: PDF 文件路径
+
+    Yields:
+        每页的文本
+
+    Raises:
+        ImportError: pypdf 未安装
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("直接加载 PDF 需要先安装: pip install pypdf") from e
+
+    for page in PdfReader(file_path).pages:
+        yield page.extract_text() or ""
+
+
+def read_pdf_pages(file_path: str) -> list[str]:
+    """返回 PDF 每页的文本列表，见 iter_pdf_pages。"""
+    return list(iter_pdf_pages(file_path))
+
+
+def _iter_page_blocks(pages: Iterable[str], page_starts: list[int] | None = None) -> Iterator[str]:
+    """
+    把各页文本作为文本块产出，页之间插入空行，拼接后与 "\n\n".join(pages) 相同。
+
+    page_starts 不为 None 时，依次追加每页在全文中的起始位置。
+    """
+    offset = 0
+    for i, page in enumerate(pages):
+        if i:
+            yield "\n\n"
+            offset += 2
+        if page_starts is not None:
+            page_starts.append(offset)
+        yield page
+        offset += len(page)
+
+
+def _file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """按块计算文件内容的 sha256，作为 PDF 的 doc_id。"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pdf_documents(
+    file_path: str,
+    split: Callable[[Iterable[str]], Iterator[str]],
+) -> Iterator[Document]:
+    """
+    从 PDF 直接产出带有页码和偏移量的 Document。
+
+    与 txt 文件相同，total_chunks 需要在产出第一个 chunk 前确定，因此 PDF 的文本会
+    提取两遍：第一遍只计算 chunk 数量，第二遍产出 Document。
+
+    chunk 的位置通过在最近读入的文本中依次查找 chunk 文本确定；分块方式改写了文本
+    （chunk 不是全文的子串）时，该 chunk 不带页码和偏移量。
+
+    Args:
+        file_path: PDF 文件路径
+        split: 分块函数，输入文本块的可迭代对象，产出 chunk 文本
+
+    Yields:
+        Document 对象
+    """
+    doc_id = _file_sha256(file_path)
+    source = os.path.basename(file_path)
+    total_chunks = sum(1 for _ in split(_iter_page_blocks(iter_pdf_pages(file_path))))
+
+    # 已读入的每页在全文中的起始位置
+    page_starts = []
+    # 最近读入的文本及其在全文中的起始位置
+    window, window_start = "", 0
+
+    def blocks() -> Iterator[str]:
+        nonlocal window
+        for block in _iter_page_blocks(iter_pdf_pages(file_path), page_starts):
+            window += block
+            yield block
+
+    cursor = 0
+    for idx, chunk_text in enumerate(split(blocks())):
+        metadata = DocMetadata(
+            content=TextBlock(type="text", text=chunk_text),
+            doc_id=doc_id,
+            chunk_id=idx,
+            total_chunks=total_chunks,
+        )
+        metadata["source"] = source
+
+        # 带重叠的 chunk 从上一个 chunk 内部开始，因此从上一个起点之后继续查找
+        start = window.find(chunk_text, max(cursor - window_start, 0))
+        if start >= 0:
+            start += window_start
+            end = start + max(len(chunk_text), 1)
+            metadata["page_start"] = bisect.bisect_right(page_starts, start)
+            metadata["page_end"] = bisect.bisect_right(page_starts, end - 1)
+            metadata["char_offset"] = start
+            cursor = start + 1
+
+        # 之后的 chunk 从 cursor 之后开始，更早的文本不再需要；找不到位置时
+        # 只保留最近一页之前 _SEARCH_LOOKBACK 个字符，查找范围不会随文档增长
+        floor = max(cursor, page_starts[-1] - _SEARCH_LOOKBACK if page_starts else 0)
+        if floor > window_start:
+            window = window[floor - window_start:]
+            window_start = floor
+
+        yield Document(id=f"{doc_id}-{idx}", metadata=metadata)
@@ -6,9 +6,10 @@ Handle reading questions from markdown files and writing answers to JSON files
 in the specified format.
 """
 import json
+import os
 import re
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
 
 class QuestionReader:
@@ -105,8 +106,7 @@ class AnswerWriter:
             Path to the output file
         """
         if output_path is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"answers_{timestamp}.json"
+            output_path = AnswerWriter.default_output_path()
         
         # Initialize retrieve_results if not provided
         if retrieve_results is None:
@@ -147,6 +147,151 @@ class AnswerWriter:
                 f.write('\n\n')
         
         return output_path
+    
+    @staticmethod
+    def write_answers_from_checkpoint(
+        questions_dict: Dict[str, List[Dict[str, Any]]],
+        checkpoint: "AnswerCheckpoint",
+        output_path: str,
+        failed_answers: Dict[str, Dict[int, str]] = None
+    ) -> str:
+        """
+        Write the output file in question order from a checkpoint.
+        
+        Records are read back one at a time, so memory use does not grow
+        with the number of questions.
+        
+        Args:
+            questions_dict: Questions dictionary from parse_markdown
+            checkpoint: Checkpoint holding the answered questions
+            output_path: Path to save JSON file
+            failed_answers: Optional error messages of unanswered questions
+                            with structure {category: {q_id: error_text}}
+            
+        Returns:
+            Path to the output file
+        """
+        if failed_answers is None:
+            failed_answers = {}
+        
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for category in sorted(questions_dict.keys()):
+                for q in questions_dict[category]:
+                    record = checkpoint.get(category, q['id'], q['text'])
+                    
+                    if record is None:
+                        answer = failed_answers.get(category, {}).get(q['id'], "未回答")
+                        record = {"result": [], "answer": answer}
+                    
+                    result_obj = {
+                        "query": q['text'],
+                        "result": record["result"],
+                        "answer": record["answer"]
+                    }
+                    json.dump(result_obj, f, ensure_ascii=False)
+                    f.write('\n\n')
+        os.replace(tmp_path, output_path)
+        
+        return output_path
+    
+    @staticmethod
+    def default_output_path() -> str:
+        """Return a timestamped output path like answers_20250101_120000.json."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"answers_{timestamp}.json"
+
+
+class AnswerCheckpoint:
+    """
+    Append-only log of answered questions, one JSON record per line.
+    
+    Every record is flushed and fsync'd as soon as it is appended, so a
+    crashed or interrupted batch run can be resumed and only the missing
+    questions are answered again. Only the byte offset and the query of
+    each record are kept in memory, the results and answers are read back
+    from the file when needed.
+    
+    Record format:
+    {"category": "...", "id": 1, "query": "...", "result": [...], "answer": "..."}
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open the checkpoint file, indexing any records from a previous run.
+        
+        Args:
+            path: Path to the checkpoint file (created if missing)
+        """
+        self.path = path
+        self._offsets: Dict[Tuple[str, int], Tuple[int, str]] = {}
+        
+        if os.path.exists(path):
+            self._load_index()
+        
+        self._file = open(path, 'ab')
+    
+    def _load_index(self) -> None:
+        """Index existing records and drop a partially written last line."""
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                    key = (record["category"], record["id"])
+                    self._offsets[key] = (offset, record["query"])
+                    valid_end = offset + len(line)
+                except (ValueError, KeyError):
+                    # A crash during the last write leaves a broken line
+                    break
+                offset += len(line)
+        
+        if valid_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+    
+    def __len__(self) -> int:
+        return len(self._offsets)
+    
+    def is_answered(self, category: str, q_id: int, q_text: str) -> bool:
+        """Check whether the question already has a record with the same text."""
+        entry = self._offsets.get((category, q_id))
+        return entry is not None and entry[1] == q_text
+    
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record and make it durable before returning.
+        
+        Args:
+            record: Record with 'category', 'id', 'query', 'result' and 'answer'
+        """
+        offset = self._file.tell()
+        self._file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._offsets[(record["category"], record["id"])] = (offset, record["query"])
+    
+    def get(self, category: str, q_id: int, q_text: str) -> Dict[str, Any] | None:
+        """
+        Read a record back from disk.
+        
+        Returns:
+            The record, or None if the question has no record with the same text
+        """
+        if not self.is_answered(category, q_id, q_text):
+            return None
+        
+        offset = self._offsets[(category, q_id)][0]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+    
+    def close(self) -> None:
+        """Close the checkpoint file."""
+        self._file.close()
 
 
 def get_questions_summary(questions_dict: Dict[str, List[Dict[str, Any]]]) -> str:
@@ -1,45 +1,97 @@
-import subprocess
+import argparse
 import sys
-import os
 
-def run_local_qdrant_server():
+from qdrant_supervisor import QdrantSupervisor
+
+
+def run_local_qdrant_server(
+    storage_path: str = "qdrant_storage",
+    snapshots_path: str = "qdrant_snapshots",
+    http_port: int = 6333,
+    grpc_port: int = 6334,
+    restore: list[str] | None = None,
+):
     """
     Runs the 'qdrant' executable located in the same directory as this script.
-    """
-    # The path to the executable is in the current directory
-    qdrant_exec_path = os.path.join(os.path.dirname(__file__), "qdrant")
 
-    if not os.path.exists(qdrant_exec_path):
-        print(f"Error: Qdrant executable not found at '{qdrant_exec_path}'")
-        print("Please download the qdrant binary from GitHub releases and place it in the same directory as this script.")
-        sys.exit(1)
+    The server is started with the tuned configuration of QdrantSupervisor,
+    and the collections listed in `restore` are restored from their newest
+    snapshot when they are missing from the storage.
+    """
+    supervisor = QdrantSupervisor(
+        storage_path=storage_path,
+        snapshots_path=snapshots_path,
+        http_port=http_port,
+        grpc_port=grpc_port,
+    )
 
-    print(f"Found Qdrant executable at: {qdrant_exec_path}")
+    print(f"Found Qdrant executable at: {supervisor.executable}")
+    print(f"Storage: {supervisor.storage_path}")
+    print(f"Snapshots: {supervisor.snapshots_path}")
     print("\nStarting local Qdrant server...")
-    print("This terminal will now show server logs. Keep it running.")
-    print("To stop the server, press Ctrl+C in this terminal.")
 
-    process = None
     try:
-        # Start the server process
-        process = subprocess.Popen(
-            [qdrant_exec_path],
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-        )
-        process.wait()
+        supervisor.start(stdout=sys.stdout, stderr=sys.stderr)
+    except (FileNotFoundError, RuntimeError, TimeoutError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Qdrant is ready at {supervisor.url}")
+
+    try:
+        for path in supervisor.restore_snapshots(restore or []):
+            print(f"Restored snapshot: {path}")
+
+        print("This terminal will now show server logs. Keep it running.")
+        print("To stop the server, press Ctrl+C in this terminal.")
+        supervisor.wait()
     except KeyboardInterrupt:
         print("\nCtrl+C received. Shutting down Qdrant server...")
-        if process:
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print("Server did not terminate gracefully, forcing kill.")
-                process.kill()
-            print("Server shut down.")
+        supervisor.stop(timeout=5)
+        print("Server shut down.")
     except Exception as e:
         print(f"An error occurred while running the server: {e}")
+        supervisor.stop()
+
 
 if __name__ == "__main__":
-    run_local_qdrant_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run a local Qdrant server")
+    parser.add_argument(
+        "--storage",
+        type=str,
+        default="qdrant_storage",
+        help="Directory of the collections (default: qdrant_storage)"
+    )
+    parser.add_argument(
+        "--snapshots",
+        type=str,
+        default="qdrant_snapshots",
+        help="Directory of the collection snapshots (default: qdrant_snapshots)"
+    )
+    parser.add_argument(
+        "--http-port",
+        type=int,
+        default=6333,
+        help="Port of the REST API (default: 6333)"
+    )
+    parser.add_argument(
+        "--grpc-port",
+        type=int,
+        default=6334,
+        help="Port of the gRPC API (default: 6334)"
+    )
+    parser.add_argument(
+        "--restore",
+        type=str,
+        nargs="*",
+        default=["test_collection"],
+        help="Collections or aliases restored from their newest snapshot when missing (default: test_collection)"
+    )
+    args = parser.parse_args()
+
+    run_local_qdrant_server(
+        args.storage,
+        args.snapshots,
+        args.http_port,
+        args.grpc_port,
+        args.restore,
+    )
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Lifecycle of the local Qdrant server behind `--db-location localhost`.
+
+`QdrantSupervisor` starts the `qdrant` binary with a configuration tuned
+for the knowledge base instead of the binary defaults:
+
+- payloads are kept on disk, chunk texts do not take up RAM;
+- segments above `memmap_threshold` KB are memory-mapped, so a restart maps
+  the vectors instead of reading them into memory;
+- HNSW parameters sized for 1024-dim embeddings, collections below
+  `full_scan_threshold` KB are searched exhaustively.
+
+The functions below work on any running server through a `QdrantClient`:
+
+- `wait_until_ready` polls the readiness endpoint, so ingestion never races
+  a server that is still loading its collections;
+- `create_snapshot` / `restore_snapshot` save an ingested collection and
+  bring it back when it is missing, so a cold start costs a snapshot
+  restore instead of embedding the corpus again;
+- `switch_alias` points an alias at another collection in one request,
+  readers addressing the alias move over without downtime.
+
+Snapshots are restored from `file://` URIs, which requires the snapshots
+directory to be the one of the server (`qdrant-server.py --snapshots`).
+"""
+import glob
+import json
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any
+
+from qdrant_client import QdrantClient, models
+
+
+# Configuration written for the server, see config/config.yaml of Qdrant.
+# Sizes are in KB.
+DEFAULT_CONFIG = {
+    "log_level": "INFO",
+    "storage": {
+        "on_disk_payload": True,
+        "optimizers": {
+            "memmap_threshold": 20000,
+            "indexing_threshold": 20000,
+            "flush_interval_sec": 5,
+        },
+        "hnsw_index": {
+            "m": 16,
+            "ef_construct": 128,
+            "full_scan_threshold": 10000,
+            "max_indexing_threads": 0,
+            "on_disk": False,
+        },
+    },
+    "service": {
+        "host": "127.0.0.1",
+    },
+    "telemetry_disabled": True,
+}
+
+# Alias -> collection of the aliased collections with snapshots, kept in the
+# snapshots directory because aliases are lost with the storage
+ALIASES_FILE = "aliases.json"
+
+
+def wait_until_ready(
+    url: str,
+    timeout: float = 60.0,
+    interval: float = 0.5,
+    process: subprocess.Popen | None = None,
+) -> None:
+    """
+    Block until the Qdrant server at `url` is ready to serve requests.
+
+    Args:
+        url: Base URL of the server, e.g. "http://localhost:6333"
+        timeout: Seconds to wait before giving up
+        interval: Seconds between two probes
+        process: Process of the server, if it was started by the caller
+
+    Raises:
+        RuntimeError: If the process exits before the server is ready
+        TimeoutError: If the server is not ready within the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url.rstrip('/')}/readyz", timeout=interval * 4):
+                return
+        except urllib.error.HTTPError as e:
+            # Versions before 1.5 have no readiness endpoint, answering is
+            # all they can tell
+            if e.code == 404:
+                return
+        except (urllib.error.URLError, OSError):
+            pass
+
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Qdrant exited with code {process.returncode} while starting")
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Qdrant at {url} is not ready after {timeout:.0f}s, start it with "
+                "'python qdrant-server.py'",
+            )
+        time.sleep(interval)
+
+
+def resolve_alias(client: QdrantClient, name: str) -> str:
+    """Name of the collection behind `name`, which may be an alias."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+def switch_alias(client: QdrantClient, alias: str, collection_name: str) -> str | None:
+    """
+    Point an alias at a collection, atomically for the readers of the alias.
+
+    Args:
+        client: Client of the server
+        alias: The alias, created if it does not exist
+        collection_name: The collection the alias should point at
+
+    Returns:
+        The collection the alias pointed at before, or None
+    """
+    previous = resolve_alias(client, alias)
+    operations = []
+    if previous != alias:
+        operations.append(models.DeleteAliasOperation(
+            delete_alias=models.DeleteAlias(alias_name=alias),
+        ))
+    else:
+        previous = None
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias),
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def create_snapshot(
+    client: QdrantClient,
+    name: str,
+    snapshots_path: str,
+    keep: int = 2,
+) -> str:
+    """
+    Snapshot a collection and delete its older snapshots.
+
+    Args:
+        client: Client of the server
+        name: The collection or an alias of it
+        snapshots_path: Snapshots directory of the server
+        keep: Number of snapshots kept, newest first
+
+    Returns:
+        Name of the new snapshot
+    """
+    collection_name = resolve_alias(client, name)
+    if collection_name != name:
+        aliases = _load_aliases(snapshots_path)
+        aliases[name] = collection_name
+        path = os.path.join(snapshots_path, ALIASES_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(aliases, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    snapshot = client.create_snapshot(collection_name=collection_name, wait=True)
+    snapshots = sorted(
+        client.list_snapshots(collection_name),
+        key=lambda _: _.creation_time or "",
+        reverse=True,
+    )
+    for old in snapshots[keep:]:
+        client.delete_snapshot(collection_name, old.name, wait=True)
+    return snapshot.name
+
+
+def restore_snapshot(client: QdrantClient, name: str, snapshots_path: str) -> str | None:
+    """
+    Restore a missing collection from its newest snapshot.
+
+    Args:
+        client: Client of the server
+        name: The collection or an alias of it
+        snapshots_path: Snapshots directory of the server
+
+    Returns:
+        Path of the restored snapshot, or None if the collection exists or
+        has no snapshot
+    """
+    if client.collection_exists(resolve_alias(client, name)):
+        return None
+    collection_name = _load_aliases(snapshots_path).get(name, name)
+    paths = glob.glob(os.path.join(snapshots_path, collection_name, "*.snapshot"))
+    if not paths:
+        return None
+
+    latest = max(paths, key=os.path.getmtime)
+    client.recover_snapshot(
+        collection_name,
+        location=Path(latest).resolve().as_uri(),
+        priority=models.SnapshotPriority.SNAPSHOT,
+        wait=True,
+    )
+    if collection_name != name:
+        switch_alias(client, name, collection_name)
+    return latest
+
+
+def _load_aliases(snapshots_path: str) -> dict[str, str]:
+    """Aliases recorded with the snapshots."""
+    path = os.path.join(snapshots_path, ALIASES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _merge_config(base: dict[str, Any], overrides: dict[str, Any]) -> dict[str, Any]:
+    """Recursively merge configuration overrides into a copy of base."""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _to_yaml(config: dict[str, Any], indent: int = 0) -> str:
+    """Block-style YAML of a nested dict of scalars."""
+    lines = []
+    for key, value in config.items():
+        prefix = " " * indent + f"{key}:"
+        if isinstance(value, dict):
+            lines.append(prefix)
+            lines.append(_to_yaml(value, indent + 2))
+        elif isinstance(value, bool):
+            lines.append(f"{prefix} {'true' if value else 'false'}")
+        elif value is None:
+            lines.append(f"{prefix} null")
+        elif isinstance(value, str):
+            # JSON strings are valid double-quoted YAML scalars
+            lines.append(f"{prefix} {json.dumps(value)}")
+        else:
+            lines.append(f"{prefix} {value}")
+    return "\n".join(lines)
+
+
+class QdrantSupervisor:
+    """Start, probe and stop a local `qdrant` binary."""
+
+    def __init__(
+        self,
+        executable: str | None = None,
+        storage_path: str = "qdrant_storage",
+        snapshots_path: str = "qdrant_snapshots",
+        http_port: int = 6333,
+        grpc_port: int = 6334,
+        config: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Args:
+            executable: Path of the binary, default `qdrant` next to this file
+            storage_path: Directory of the collections
+            snapshots_path: Directory of the snapshots
+            http_port: Port of the REST API
+            grpc_port: Port of the gRPC API
+            config: Overrides merged into DEFAULT_CONFIG
+        """
+        self.executable = executable or os.path.join(os.path.dirname(os.path.abspath(__file__)), "qdrant")
+        self.storage_path = os.path.abspath(storage_path)
+        self.snapshots_path = os.path.abspath(snapshots_path)
+        self.config = _merge_config(DEFAULT_CONFIG, {
+            "storage": {
+                "storage_path": self.storage_path,
+                "snapshots_path": self.snapshots_path,
+            },
+            "service": {"http_port": http_port, "grpc_port": grpc_port},
+        })
+        if config:
+            self.config = _merge_config(self.config, config)
+        self.config_path = os.path.join(self.storage_path, "config.yaml")
+        self.process: subprocess.Popen | None = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the REST API."""
+        return f"http://localhost:{self.config['service']['http_port']}"
+
+    def write_config(self) -> str:
+        """Write the configuration file and return its path."""
+        os.makedirs(self.storage_path, exist_ok=True)
+        os.makedirs(self.snapshots_path, exist_ok=True)
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write(_to_yaml(self.config) + "\n")
+        return self.config_path
+
+    def start(self, timeout: float = 60.0, **popen_kwargs: Any) -> None:
+        """
+        Start the server and wait until it is ready.
+
+        Args:
+            timeout: Seconds to wait for readiness
+            **popen_kwargs: Keyword arguments of `subprocess.Popen`, e.g. the
+                            streams of the server logs
+
+        Raises:
+            FileNotFoundError: If the binary does not exist
+            RuntimeError: If the server exits while starting
+            TimeoutError: If the server is not ready within the timeout
+        """
+        if not os.path.exists(self.executable):
+            raise FileNotFoundError(
+                f"Qdrant executable not found at '{self.executable}', download the "
+                "qdrant binary from GitHub releases and place it there",
+            )
+        self.process = subprocess.Popen(
+            [self.executable, "--config-path", self.write_config()],
+            **popen_kwargs,
+        )
+        try:
+            wait_until_ready(self.url, timeout=timeout, process=self.process)
+        except BaseException:
+            self.stop()
+            raise
+
+    def restore_snapshots(self, names: list[str]) -> list[str]:
+        """
+        Restore the missing collections among `names` from their snapshots.
+
+        Snapshots of collections that were dropped on purpose stay on disk,
+        so only the named collections or aliases are restored.
+
+        Args:
+            names: Collections or aliases to restore
+
+        Returns:
+            Paths of the restored snapshots
+        """
+        client = QdrantClient(url=self.url)
+        restored = []
+        for name in names:
+            path = restore_snapshot(client, name, self.snapshots_path)
+            if path is not None:
+                restored.append(path)
+        return restored
+
+    def wait(self) -> int:
+        """Block until the server exits and return its exit code."""
+        return self.process.wait()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Terminate the server, killing it if it does not exit in time."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def __enter__(self) -> "QdrantSupervisor":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Blue/green re-index of a Qdrant collection served through an alias.
+
+Readers address the alias, e.g. `test_collection`, while the chunks live in
+versioned collections such as `test_collection_20251108153000`. A re-index
+fills a new versioned collection while the alias still points at the old
+one, then swaps the alias in a single request:
+
+1. `create_bulk_collection` kwargs create the collection with HNSW indexing
+   disabled (`indexing_threshold=0`), so the bulk upload only appends to
+   segments instead of rebuilding the graph as points arrive;
+2. `finish_bulk_load` enables indexing again and waits until the optimizer
+   has built the index;
+3. `validate_count` checks the number of points against the number of
+   chunks produced by the ingestion source;
+4. `promote` points the alias at the new collection and drops the old one.
+
+A failed or interrupted re-index leaves the alias and the old collection
+untouched.
+"""
+import time
+
+from qdrant_client import QdrantClient, models
+
+from qdrant_supervisor import resolve_alias, switch_alias
+
+
+# Indexing threshold restored after the bulk load, in KB, same as the
+# server configuration written by QdrantSupervisor
+INDEXING_THRESHOLD = 20000
+
+
+def versioned_name(alias: str) -> str:
+    """Name of a new versioned collection behind `alias`."""
+    return f"{alias}_{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def bulk_collection_kwargs() -> dict:
+    """Keyword arguments of `create_collection` deferring indexing."""
+    return {
+        "optimizers_config": models.OptimizersConfigDiff(indexing_threshold=0),
+        "on_disk_payload": True,
+    }
+
+
+def finish_bulk_load(
+    client: QdrantClient,
+    collection_name: str,
+    indexing_threshold: int = INDEXING_THRESHOLD,
+    timeout: float = 3600.0,
+    interval: float = 1.0,
+) -> None:
+    """
+    Enable indexing of a bulk-loaded collection and wait for the index.
+
+    Args:
+        client: Client of the server
+        collection_name: The bulk-loaded collection
+        indexing_threshold: Indexing threshold restored on the collection
+        timeout: Seconds to wait for the optimizer
+        interval: Seconds between two status checks
+
+    Raises:
+        RuntimeError: If the optimizer fails
+        TimeoutError: If the index is not built within the timeout
+    """
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=indexing_threshold),
+    )
+    deadline = time.monotonic() + timeout
+    while True:
+        info = client.get_collection(collection_name)
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        if info.status == models.CollectionStatus.RED:
+            raise RuntimeError(f"Optimizer of {collection_name} failed: {info.optimizer_status}")
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Index of {collection_name} is not built after {timeout:.0f}s")
+        time.sleep(interval)
+
+
+def validate_count(client: QdrantClient, collection_name: str, expected: int) -> int:
+    """
+    Check that a collection holds the expected number of points.
+
+    Args:
+        client: Client of the server
+        collection_name: The collection
+        expected: Number of chunks written by the ingestion source
+
+    Returns:
+        The number of points
+
+    Raises:
+        ValueError: If the counts differ or the collection is empty
+    """
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count != expected or count == 0:
+        raise ValueError(
+            f"Collection {collection_name} holds {count} points, "
+            f"{expected} chunks were loaded",
+        )
+    return count
+
+
+def promote(
+    client: QdrantClient,
+    alias: str,
+    collection_name: str,
+    keep_previous: bool = False,
+) -> str | None:
+    """
+    Point `alias` at a collection and drop the collection it replaced.
+
+    A collection named like the alias, from before aliases were used, is
+    deleted first since an alias cannot shadow a collection. Readers see no
+    collection under that name until the alias is created.
+
+    Args:
+        client: Client of the server
+        alias: The alias read by the agent
+        collection_name: The new collection
+        keep_previous: Keep the replaced collection instead of deleting it
+
+    Returns:
+        Name of the replaced collection, or None
+    """
+    previous = None
+    if resolve_alias(client, alias) == alias and client.collection_exists(alias):
+        client.delete_collection(alias)
+        previous = alias
+    previous = switch_alias(client, alias, collection_name) or previous
+    if previous is not None and previous != alias and not keep_previous:
+        client.delete_collection(previous)
+    return previous
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Second-stage reranking of retrieval results on CPU.
+
+The agent makes up for a mediocre top-k order by retrying retrievals with a
+lower `score_threshold` and a higher `limit`, paying an LLM round trip per
+retry. `RerankedKnowledge` wraps a knowledge base, over-fetches candidates
+from it and returns the best `limit` of them according to a reranker:
+
+- `LexicalReranker` blends the first-stage score with the IDF-weighted
+  share of query terms found in each candidate, weighting identifiers such
+  as standard numbers higher. It needs no model and costs well under a
+  millisecond per candidate.
+- `CrossEncoderReranker` scores (query, chunk) pairs in batches with a
+  small local cross-encoder (requires `pip install sentence-transformers`).
+"""
+import asyncio
+import threading
+from typing import Any
+
+import numpy as np
+
+from agentscope.rag import Document, KnowledgeBase
+
+from hybrid_retrieval import tokenize
+
+
+class LexicalReranker:
+    """Rerank candidates by query-term coverage and first-stage score."""
+
+    def __init__(self, weight: float = 0.5, identifier_boost: float = 2.0) -> None:
+        """
+        Args:
+            weight: Share of the lexical coverage in the final score, the
+                    rest is the first-stage score relative to the best one
+            identifier_boost: Weight multiplier of query terms containing
+                              digits, e.g. parts of standard numbers
+        """
+        self.weight = weight
+        self.identifier_boost = identifier_boost
+
+    def score(self, query: str, documents: list[Document]) -> np.ndarray:
+        """
+        Score the candidates of a query.
+
+        Args:
+            query: The query text
+            documents: The candidates, in first-stage order
+
+        Returns:
+            Scores in [0, 1], one per candidate
+        """
+        first_stage = np.asarray(
+            [doc.score or 0.0 for doc in documents], dtype=np.float64,
+        )
+        best = first_stage.max(initial=0.0)
+        if best > 0:
+            first_stage /= best
+
+        terms = sorted(set(tokenize(query)))
+        if not terms or not documents:
+            return first_stage
+
+        # presence[i, j]: whether candidate i contains query term j
+        columns = {term: j for j, term in enumerate(terms)}
+        presence = np.zeros((len(documents), len(terms)), dtype=bool)
+        for i, doc in enumerate(documents):
+            for term in set(tokenize(doc.metadata.content["text"])):
+                j = columns.get(term)
+                if j is not None:
+                    presence[i, j] = True
+
+        # Terms found in few candidates separate them best
+        n = len(documents)
+        df = presence.sum(axis=0)
+        weights = np.log1p((n - df + 0.5) / (df + 0.5))
+        weights *= [
+            self.identifier_boost if any(_.isdigit() for _ in term) else 1.0
+            for term in terms
+        ]
+        coverage = presence @ weights / weights.sum()
+
+        return (1 - self.weight) * first_stage + self.weight * coverage
+
+
+class CrossEncoderReranker:
+    """Rerank candidates with a local cross-encoder model."""
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        batch_size: int = 16,
+        max_length: int = 512,
+    ) -> None:
+        """
+        Args:
+            model_name: Hugging Face name or local path of the model
+            batch_size: Number of (query, chunk) pairs scored at once
+            max_length: Maximum number of tokens of a pair, longer chunks
+                        are truncated
+
+        Raises:
+            ImportError: If sentence-transformers is not installed
+        """
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError(
+                "Cross-encoder reranking requires: pip install sentence-transformers",
+            ) from e
+
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+        # Concurrent questions share the model, one batch runs at a time
+        self._lock = threading.Lock()
+
+    def score(self, query: str, documents: list[Document]) -> np.ndarray:
+        """
+        Score the candidates of a query.
+
+        Single-label models such as the bge rerankers output a relevance
+        logit, which sentence-transformers maps to [0, 1] with a sigmoid.
+        """
+        if not documents:
+            return np.zeros(0)
+        pairs = [(query, doc.metadata.content["text"]) for doc in documents]
+        with self._lock:
+            scores = self.model.predict(
+                pairs,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return np.asarray(scores, dtype=np.float64)
+
+
+class RerankedKnowledge(KnowledgeBase):
+    """
+    Knowledge base wrapper reranking over-fetched candidates.
+
+    The `score_threshold` of a retrieval applies to the first-stage scores.
+    The returned scores are the reranker scores in [0, 1].
+    """
+
+    def __init__(
+        self,
+        knowledge: KnowledgeBase,
+        reranker: LexicalReranker | CrossEncoderReranker,
+        candidate_factor: int = 4,
+        max_candidates: int = 50,
+    ) -> None:
+        """
+        Args:
+            knowledge: The wrapped knowledge base
+            reranker: Scorer of the candidates
+            candidate_factor: Each retrieval fetches limit * candidate_factor
+                              candidates before reranking
+            max_candidates: Upper bound of the candidates of one retrieval,
+                            bounding the reranking latency
+        """
+        super().__init__(knowledge.embedding_store, knowledge.embedding_model)
+        self.knowledge = knowledge
+        self.reranker = reranker
+        self.candidate_factor = candidate_factor
+        self.max_candidates = max_candidates
+
+    async def retrieve(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """Retrieve candidates and return the best `limit` after reranking."""
+        n_candidates = max(min(limit * self.candidate_factor, self.max_candidates), limit)
+        candidates = await self.knowledge.retrieve(
+            query,
+            limit=n_candidates,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        if len(candidates) <= 1:
+            return candidates[:limit]
+
+        # Model inference blocks, keep the event loop serving other questions
+        scores = await asyncio.to_thread(self.reranker.score, query, candidates)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        docs = []
+        for i in order.tolist():
+            candidates[i].score = float(scores[i])
+            docs.append(candidates[i])
+        return docs
+
+    async def add_documents(self, documents: list[Document], **kwargs: Any) -> None:
+        """Add documents to the wrapped knowledge base."""
+        await self.knowledge.add_documents(documents, **kwargs)
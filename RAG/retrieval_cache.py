@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Retrieval result cache.
+
+The agent is told to retry retrieval with reworded queries and different
+`score_threshold` values, so it issues many identical or near-identical
+queries per question and across related questions. `CachedKnowledge` wraps
+a knowledge base and serves such queries from a `RetrievalCache`:
+
+- exact hits on the normalized (query, limit, score_threshold) key;
+- optionally, semantic hits: a query whose embedding is close enough to a
+  cached query with the same limit and threshold reuses its results.
+
+Entries expire after a TTL and the least recently used ones are evicted
+beyond the size bound. The cache is cleared whenever documents are added to
+or removed from the collection.
+
+A semantic lookup embeds the query before the cache is searched. On a miss
+that embedding is passed down as `query_embedding`, which
+`VectorQueryKnowledge` (and hence `HybridKnowledge`) searches with directly,
+so the query is not embedded a second time.
+"""
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Tuple
+
+import numpy as np
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, KnowledgeBase, SimpleKnowledge
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+CacheKey = Tuple[str, int, float | None]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize width variants and whitespace so trivial rewrites share a key."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+
+def _unit(embedding: list[float]) -> np.ndarray:
+    """Unit-normalized float32 copy of an embedding."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class RetrievalCache:
+    """Size-bounded LRU cache of retrieval results with a TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float | None = 3600.0,
+        similarity_threshold: float | None = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: Maximum number of cached queries
+            ttl: Seconds after which an entry expires, or None to never expire
+            similarity_threshold: Minimum cosine similarity between query
+                                  embeddings for a semantic hit, or None to
+                                  serve exact hits only
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        # key -> (expires_at, unit query vector or None, documents)
+        self._entries: OrderedDict[CacheKey, tuple] = OrderedDict()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def semantic(self) -> bool:
+        """Whether near-duplicate queries are looked up by embedding."""
+        return self.similarity_threshold is not None
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+    def get(self, key: CacheKey) -> list[Document] | None:
+        """Return the cached results of exactly this key, if any."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return list(entry[2])
+
+    def get_similar(
+        self,
+        key: CacheKey,
+        vector: np.ndarray,
+    ) -> list[Document] | None:
+        """
+        Return the results of the most similar cached query with the same
+        limit and threshold, if its similarity reaches the threshold.
+
+        Args:
+            key: The key of the query being looked up
+            vector: The unit-normalized query embedding
+        """
+        best_key, best_sim = None, self.similarity_threshold
+        for other_key, entry in list(self._entries.items()):
+            if self._expired(entry):
+                del self._entries[other_key]
+                continue
+            if other_key[1:] != key[1:] or entry[1] is None:
+                continue
+            sim = float(np.dot(entry[1], vector))
+            if sim >= best_sim:
+                best_key, best_sim = other_key, sim
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        self.semantic_hits += 1
+        return list(self._entries[best_key][2])
+
+    def put(
+        self,
+        key: CacheKey,
+        documents: list[Document],
+        vector: np.ndarray | None = None,
+    ) -> None:
+        """Cache the results of a query, evicting the oldest entries if full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expires_at, vector, list(documents))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries, e.g. after the collection changed."""
+        self._entries.clear()
+
+    def summary(self) -> str:
+        """One-line description of the cache counters."""
+        return (
+            f"检索缓存命中率 {self.hit_rate:.1%} "
+            f"(精确命中 {self.exact_hits}, 语义命中 {self.semantic_hits}, "
+            f"未命中 {self.misses})"
+        )
+
+    @staticmethod
+    def _expired(entry: tuple) -> bool:
+        return entry[0] is not None and time.monotonic() >= entry[0]
+
+
+class VectorQueryKnowledge(SimpleKnowledge):
+    """
+    `SimpleKnowledge` that can search with a query embedding computed by the
+    caller, e.g. by the semantic lookup of `CachedKnowledge`.
+    """
+
+    async def retrieve(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        query_embedding: list[float] | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """
+        Retrieve relevant documents, embedding the query only when no
+        `query_embedding` of it is given.
+        """
+        if query_embedding is None:
+            return await super().retrieve(
+                query,
+                limit=limit,
+                score_threshold=score_threshold,
+                **kwargs,
+            )
+        return await self.embedding_store.search(
+            query_embedding,
+            limit=limit,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+
+
+def _accepts_query_embedding(knowledge: KnowledgeBase) -> bool:
+    """Whether the innermost of the wrapped knowledge bases is a VectorQueryKnowledge."""
+    while not isinstance(knowledge, VectorQueryKnowledge):
+        knowledge = getattr(knowledge, "knowledge", None)
+        if knowledge is None:
+            return False
+    return True
+
+
+class CachedKnowledge(KnowledgeBase):
+    """
+    Knowledge base wrapper serving repeated queries from a `RetrievalCache`.
+
+    It shares the embedding store and model of the wrapped knowledge base,
+    so it can be used anywhere the wrapped one is used. Concurrent identical
+    queries are retrieved only once.
+    """
+
+    def __init__(self, knowledge: KnowledgeBase, cache: RetrievalCache) -> None:
+        """
+        Args:
+            knowledge: The wrapped knowledge base, only queried on cache misses
+            cache: The retrieval cache
+        """
+        super().__init__(knowledge.embedding_store, knowledge.embedding_model)
+        self.knowledge = knowledge
+        self.cache = cache
+        self._inflight: dict[CacheKey, asyncio.Future] = {}
+        self._reuse_embedding = _accepts_query_embedding(knowledge)
+
+    async def retrieve(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        """Retrieve relevant documents, from the cache when possible."""
+        # Extra search arguments may change the results, so bypass the cache
+        if kwargs:
+            return await self.knowledge.retrieve(
+                query,
+                limit=limit,
+                score_threshold=score_threshold,
+                **kwargs,
+            )
+
+        key = (normalize_query(query), limit, score_threshold)
+        docs = self.cache.get(key)
+        if docs is not None:
+            return docs
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.cache.exact_hits += 1
+            return list(await asyncio.shield(inflight))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            vector = None
+            search_kwargs = {}
+            if self.cache.semantic:
+                embedding = await self._embed(query)
+                vector = _unit(embedding)
+                docs = self.cache.get_similar(key, vector)
+                if docs is not None:
+                    future.set_result(docs)
+                    return docs
+                if self._reuse_embedding:
+                    search_kwargs["query_embedding"] = embedding
+
+            self.cache.misses += 1
+            docs = await self.knowledge.retrieve(
+                query,
+                limit=limit,
+                score_threshold=score_threshold,
+                **search_kwargs,
+            )
+            self.cache.put(key, docs, vector)
+            future.set_result(docs)
+            return list(docs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Only waiters should see the error, not the event loop
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def add_documents(self, documents: list[Document], **kwargs: Any) -> None:
+        """Add documents to the wrapped knowledge base and clear the cache."""
+        await self.knowledge.add_documents(documents, **kwargs)
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget all cached results; call after the collection changed."""
+        self.cache.clear()
+
+    async def _embed(self, query: str) -> list[float]:
+        """Embed the query the same way SimpleKnowledge does."""
+        res = await self.knowledge.embedding_model(
+            [TextBlock(type="text", text=query)],
+        )
+        return res.embeddings[0]
+
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Retrieval recorder.
+
+Provide a `retrieve_knowledge` tool function that behaves like
+`KnowledgeBase.retrieve_knowledge`, while recording every call made by the
+agent: the query, limit, score threshold, returned chunks with their scores,
+and the latency of the call. The records are used to fill the `result` field
+of the answer file and to profile where the time of each question goes.
+
+The tool also lets the agent narrow a search down to a document, a standard
+(family), a document type or a language, see `document_fields.py`.
+"""
+import time
+from typing import Any, Dict, List
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, KnowledgeBase
+from agentscope.tool import ToolResponse
+
+from document_fields import build_filters
+
+
+def _format_hit(doc: Document) -> str:
+    """Text of a retrieved chunk shown to the agent, with its source."""
+    source = doc.metadata.get("source")
+    if source is None:
+        return f"Score: {doc.score}, Content: {doc.metadata.content['text']}"
+    return f"Score: {doc.score}, Source: {source}, Content: {doc.metadata.content['text']}"
+
+
+class RetrievalRecorder:
+    """Record the knowledge retrievals made while answering one question."""
+
+    def __init__(self, knowledge: KnowledgeBase) -> None:
+        """
+        Args:
+            knowledge: The knowledge base to retrieve from
+        """
+        self.knowledge = knowledge
+        self.calls: List[Dict[str, Any]] = []
+
+    def reset(self) -> None:
+        """Forget the calls recorded so far, e.g. before the next question."""
+        self.calls = []
+
+    async def retrieve_knowledge(
+        self,
+        query: str,
+        limit: int = 5,
+        score_threshold: float | None = None,
+        source: str | None = None,
+        standard: str | None = None,
+        doc_type: str | None = None,
+        language: str | None = None,
+    ) -> ToolResponse:
+        """Retrieve relevant documents from the knowledge base. Note the
+        `query` parameter is directly related to the retrieval quality, and
+        for the same question, you can try many different queries to get the
+        best results. Adjust the `limit` and `score_threshold` parameters
+        to get more or fewer results.
+
+        Args:
+            query (`str`):
+                The query string, which should be specific and concise. For
+                example, you should provide the specific name instead of
+                "you", "my", "he", "she", etc.
+            limit (`int`, defaults to 5):
+                The number of relevant documents to retrieve.
+            score_threshold (`float | None`, defaults to None):
+                A threshold in [0, 1] and only the relevance score above this
+                threshold will be returned. Reduce this value to get more
+                results.
+            source (`str | None`, defaults to None):
+                Only search the document with this filename, as shown in the
+                `Source` of previous results.
+            standard (`str | None`, defaults to None):
+                Only search this standard, e.g. "GB/T 20438.1" for one part
+                or "GB/T 20438" for all of its parts.
+            doc_type (`str | None`, defaults to None):
+                Only search documents of this type: "standard", "amendment",
+                "accident_report", "statistics", "work_programme" or
+                "reference".
+            language (`str | None`, defaults to None):
+                Only search documents in this language: "zh", "en" or "de".
+        """
+        try:
+            filters = build_filters(source, standard, doc_type, language)
+        except ValueError as e:
+            return ToolResponse(content=[TextBlock(type="text", text=str(e))])
+
+        # Unfiltered retrievals pass no filters, so they stay cacheable
+        kwargs = {"filters": filters} if filters else {}
+        start = time.perf_counter()
+        docs = await self.knowledge.retrieve(
+            query=query,
+            limit=limit,
+            score_threshold=score_threshold,
+            **kwargs,
+        )
+        latency = time.perf_counter() - start
+
+        self.calls.append({
+            "query": query,
+            "limit": limit,
+            "score_threshold": score_threshold,
+            "filters": filters,
+            "latency_s": round(latency, 4),
+            "hits": [
+                {
+                    "chunk_id": f"{doc.metadata.doc_id}-{doc.metadata.chunk_id}",
+                    "score": doc.score,
+                    "content": doc.metadata.content["text"],
+                }
+                for doc in docs
+            ],
+        })
+
+        if len(docs):
+            return ToolResponse(
+                content=[TextBlock(type="text", text=_format_hit(_)) for _ in docs],
+            )
+        if score_threshold is None:
+            # No threshold to lower, e.g. when it is hidden with hybrid retrieval
+            hint = "TRY a different query or to remove the filters to get more results."
+        else:
+            hint = (
+                "TRY to reduce the `score_threshold` parameter or to remove "
+                "the filters to get more results."
+            )
+        return ToolResponse(
+            content=[
+                TextBlock(type="text", text=f"No relevant documents found. {hint}"),
+            ],
+        )
+
+    @property
+    def retrieval_time(self) -> float:
+        """Total time spent in retrieval calls, in seconds."""
+        return sum(call["latency_s"] for call in self.calls)
+
+    def result_items(self) -> List[Dict[str, Any]]:
+        """
+        Collect the retrieved chunks in the output format.
+
+        Chunks returned by several calls are listed once, at the position of
+        their first appearance.
+
+        Returns:
+            List of {"position", "content", "chunk_id", "score", "query"}
+        """
+        items = []
+        seen = set()
+        for call in self.calls:
+            for hit in call["hits"]:
+                if hit["chunk_id"] in seen:
+                    continue
+                seen.add(hit["chunk_id"])
+                items.append({
+                    "position": len(items) + 1,
+                    "content": hit["content"],
+                    "chunk_id": hit["chunk_id"],
+                    "score": hit["score"],
+                    "query": call["query"],
+                })
+        return items
+
+    def call_log(self) -> List[Dict[str, Any]]:
+        """
+        Summarise each call without the chunk contents.
+
+        Returns:
+            List of {"query", "limit", "score_threshold", "filters",
+            "latency_s", "chunk_ids", "scores"}
+        """
+        return [
+            {
+                "query": call["query"],
+                "limit": call["limit"],
+                "score_threshold": call["score_threshold"],
+                "filters": call["filters"],
+                "latency_s": call["latency_s"],
+                "chunk_ids": [hit["chunk_id"] for hit in call["hits"]],
+                "scores": [hit["score"] for hit in call["hits"]],
+            }
+            for call in self.calls
+        ]
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+内置的多语言分句模块。
+使用预编译的正则表达式识别句子边界，不依赖 nltk，也不需要下载任何模型：
+- 中文句末标点 。！？；以及全角/半角的 ! ? ;
+- 英文句点（后面跟空白时才算句末，"5.2.1"、"04011.4" 等编号和小数以及
+  "e.g."、"Fig." 等常见缩写不会被切开）
+- 紧跟在句末标点后的右引号、右括号和空白归入前一句
+- 空行、以多级条款编号（如 "5.2.1 "）或 "第X章/节/条" 开头的行、
+  以及以项目符号开头的行都从新的一句开始
+
+切分是无损的：所有句子按顺序拼接后与原文完全相同。
+"""
+import re
+from typing import Iterable, Iterator
+
+
+# 条款编号、章节标题和项目符号，出现在行首时开始新的一句
+_LINE_START = (
+    r"[ \t　]*(?:"
+    r"\d+(?:\.\d+)+[ \t　]"
+    r"|第[一二三四五六七八九十百千\d]+[章节条款]"
+    r"|[。•·●▪*¢\-–—][ \t　]"
+    r")"
+)
+
+# 后面的句点不算句末的常见缩写
+_ABBREVIATIONS = ("e.g", "i.e", "etc", "No", "Fig", "Figs", "Eq", "cf", "vs", "approx")
+
+_SENTENCE_BOUNDARY_RE = re.compile(
+    # 先用一个字符集快速排除不可能是边界的位置
+    r"(?=[。！？；!?;.\n])(?:"
+    # 句末标点（行首的 "。" 是 OCR 识别出的项目符号，不算句末）及其后的右引号、右括号和空白
+    r"(?:(?<!\n)[。！？；!?;]+|\.(?=\s)"
+    + "".join(rf"(?<!\b{re.escape(abbr)}\.)" for abbr in _ABBREVIATIONS)
+    + r")[”’\"')）\]】」』》]*\s*"
+    # 空行
+    r"|\n[ \t　]*\n\s*"
+    # 换行后紧跟条款编号、章节标题或项目符号
+    rf"|\n(?={_LINE_START})"
+    r")"
+)
+
+# 行首条款编号、章节标题或项目符号的前缀可能包含的字符：换行后只有这些字符时，
+# 这个换行是不是边界要等后续文本才能确定
+_LINE_START_PREFIX_RE = re.compile(r"[ \t　\d.第一二三四五六七八九十百千。•·●▪*¢\-–—]*")
+
+# 后向断言最多回看的字符数（"approx." 的句点前的缩写及其前一个字符）
+_LOOKBEHIND = max(len(abbr) for abbr in _ABBREVIATIONS) + 1
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    将文本切分为句子。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        句子列表，按顺序拼接后与输入文本相同
+    """
+    return list(iter_sentences([text]))
+
+
+def iter_sentences(blocks: Iterable[str]) -> Iterator[str]:
+    """
+    流式切分分块输入的文本，结果与对整段文本调用 split_sentences 相同。
+
+    只保留最后一个句子边界之后的文本，内存占用与单个句子的长度有关。
+
+    Args:
+        blocks: 依次产出文本片段的可迭代对象
+
+    Yields:
+        句子（包含句末标点和其后的空白）
+    """
+    # pending: 当前句子中已确定不含边界的文本片段，句子结束时才拼接
+    # text: 供后向断言回看的上文 text[:scan]，以及尚未确定的文本 text[scan:]
+    pending = []
+    text, scan = "", 0
+    for block in blocks:
+        text += block
+        start = scan
+        resume = None
+        for match in _SENTENCE_BOUNDARY_RE.finditer(text, scan):
+            # 匹配到缓冲区末尾时，后续文本可能还会延长这个边界（更多的右括号或空白），
+            # 等读入下一块后再判断
+            if match.end() >= len(text):
+                resume = match.start()
+                break
+            pending.append(text[start:match.end()])
+            yield "".join(pending)
+            pending = []
+            start = match.end()
+        if resume is None:
+            resume = _undecided_from(text, start)
+        # 之前的文本不会再变成边界，下一块只从 resume 开始扫描，
+        # 没有边界的长文本也只扫描一遍
+        if resume > start:
+            pending.append(text[start:resume])
+        keep = max(resume - _LOOKBEHIND, 0)
+        text, scan = text[keep:], resume - keep
+    pending.append(text[scan:])
+    tail = "".join(pending)
+    if tail:
+        yield tail
+
+
+def _undecided_from(text: str, start: int) -> int:
+    """
+    返回 text[start:] 中是否为边界取决于后续文本的第一个位置，没有时返回 len(text)。
+
+    句末标点的匹配只看前文；句点要看下一个字符；换行要看下一行开头是否为
+    空行、条款编号、章节标题或项目符号，只有最后一个换行之后全是可能的前缀字符时才无法确定。
+    """
+    newline = text.rfind("\n", start)
+    if newline >= 0 and _LINE_START_PREFIX_RE.fullmatch(text, newline + 1):
+        return newline
+    if text.endswith(".") and len(text) - 1 >= start:
+        return len(text) - 1
+    return len(text)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Recovery of a chunk store after an interrupted write."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata
+
+from chunk_store import DATA_FILE, DOCS_FILE, ChunkStore
+
+
+def _document(doc_id: str, text: str) -> Document:
+    return Document(
+        id=f"{doc_id}-0",
+        metadata=DocMetadata(
+            content=TextBlock(type="text", text=text),
+            doc_id=doc_id,
+            chunk_id=0,
+            total_chunks=1,
+        ),
+    )
+
+
+def test_partial_docs_line_is_dropped_before_next_append(tmp_path):
+    path = str(tmp_path / "store")
+    ChunkStore(path).append([_document("A", "alpha")])
+
+    # Crash after writing the text and half of the document line of B,
+    # before its index record
+    with open(os.path.join(path, DATA_FILE), "ab") as f:
+        f.write("beta".encode("utf-8"))
+    with open(os.path.join(path, DOCS_FILE), "a", encoding="utf-8") as f:
+        f.write('{"doc_id": "B"')
+
+    ChunkStore(path).append([_document("C", "gamma")])
+
+    store = ChunkStore(path)
+    assert [
+        (doc.metadata.doc_id, doc.metadata.content["text"])
+        for doc in store.iter_documents()
+    ] == [("A", "alpha"), ("C", "gamma")]
+    assert store.get("C", 0).metadata.content["text"] == "gamma"
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Stale chunks and dependent files of an incremental import."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_manifest import IngestManifest
+
+
+PARAMS = {"load_method": "chunked", "chunk_size": 512}
+
+
+def _write(directory, filename: str, text: str) -> str:
+    path = str(directory / filename)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def _first_import(tmp_path, files: dict[str, str], duplicate_of=None) -> str:
+    """Import every file as one doc_id named after it, return the manifest path."""
+    manifest_path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    for filename, text in files.items():
+        path = _write(tmp_path, filename, text)
+        assert not manifest.is_unchanged(path)
+        manifest.record(path, [filename], [f"{filename}-0"])
+    manifest.record_duplicates(duplicate_of or {})
+    manifest.save()
+    return manifest_path
+
+
+def test_stale_doc_ids_of_changed_removed_and_incomplete_files(tmp_path):
+    manifest_path = _first_import(tmp_path, {"a.txt": "alpha", "b.txt": "beta", "c.txt": "gamma"})
+
+    # a.txt and c.txt change, b.txt is removed
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    a_path = _write(tmp_path, "a.txt", "alpha, revised")
+    c_path = _write(tmp_path, "c.txt", "gamma, revised")
+    assert not manifest.is_unchanged(a_path)
+    assert not manifest.is_unchanged(c_path)
+    assert manifest.reload_dependents() == []
+    assert manifest.stale_doc_ids() == ["a.txt", "b.txt", "c.txt"]
+    assert manifest.removed_files() == ["b.txt"]
+    manifest.save()
+
+    # a.txt is reloaded, c.txt fails halfway through loading
+    manifest.record(a_path, ["a.txt"], ["a.txt-0"])
+    manifest.forget(c_path, ["c.txt", "c.txt#1"])
+    manifest.save()
+
+    # The partial chunks are deleted on the next import, even once the file is gone
+    os.remove(c_path)
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    assert manifest.is_unchanged(a_path)
+    assert manifest.stale_doc_ids() == ["c.txt", "c.txt#1"]
+    assert manifest.removed_files() == ["c.txt"]
+
+
+def test_doc_id_shared_with_unchanged_file_is_kept(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    for filename in ("a.txt", "b.txt"):
+        path = _write(tmp_path, filename, filename)
+        manifest.is_unchanged(path)
+        manifest.record(path, ["shared", filename], [])
+    manifest.save()
+
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    assert not manifest.is_unchanged(_write(tmp_path, "a.txt", "a.txt, revised"))
+    assert manifest.is_unchanged(str(tmp_path / "b.txt"))
+    assert manifest.stale_doc_ids() == ["a.txt"]
+
+
+def test_reload_dependents_follows_duplicates_transitively(tmp_path):
+    # Chunks of b.txt were deduplicated against a.txt, those of c.txt
+    # against b.txt; d.txt depends on nothing
+    manifest_path = _first_import(
+        tmp_path,
+        {"a.txt": "alpha", "b.txt": "beta", "c.txt": "gamma", "d.txt": "delta"},
+        duplicate_of={"b.txt": {"a.txt"}, "c.txt": {"b.txt"}},
+    )
+
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    assert not manifest.is_unchanged(_write(tmp_path, "a.txt", "alpha, revised"))
+    for filename in ("b.txt", "c.txt", "d.txt"):
+        assert manifest.is_unchanged(str(tmp_path / filename))
+
+    assert manifest.reload_dependents() == ["b.txt", "c.txt"]
+    assert manifest.stale_doc_ids() == ["a.txt", "b.txt", "c.txt"]
+
+    # Saved before the dependents are reloaded, they are reloaded again next time
+    manifest.save()
+    manifest = IngestManifest(manifest_path, "collection", PARAMS)
+    assert [
+        manifest.is_unchanged(str(tmp_path / filename))
+        for filename in ("a.txt", "b.txt", "c.txt", "d.txt")
+    ] == [False, False, False, True]
+
+
+def test_changed_params_or_collection_reimport_everything(tmp_path):
+    manifest_path = _first_import(tmp_path, {"a.txt": "alpha"})
+    path = str(tmp_path / "a.txt")
+
+    assert IngestManifest(manifest_path, "collection", PARAMS).is_unchanged(path)
+    assert not IngestManifest(manifest_path, "collection", {**PARAMS, "chunk_size": 256}).is_unchanged(path)
+    assert not IngestManifest(manifest_path, "other", PARAMS).is_unchanged(path)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Recovery, replacement and approximate search of the local vector store."""
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agentscope.message import TextBlock
+from agentscope.rag import Document, DocMetadata
+
+from local_vector_store import PAYLOADS_FILE, VECTORS_FILE, LocalVectorStore
+from vector_quantization import QUANTIZERS
+
+
+DIMENSIONS = 8
+
+
+def _document(doc_id: str, chunk_id: int, text: str, embedding, **payload) -> Document:
+    metadata = DocMetadata(
+        content=TextBlock(type="text", text=text),
+        doc_id=doc_id,
+        chunk_id=chunk_id,
+        total_chunks=1,
+    )
+    for key, value in payload.items():
+        metadata[key] = value
+    return Document(id=f"{doc_id}-{chunk_id}", metadata=metadata, embedding=list(embedding))
+
+
+def _axis(i: int) -> np.ndarray:
+    return np.eye(DIMENSIONS, dtype=np.float32)[i]
+
+
+def _search(store: LocalVectorStore, query, limit: int = 10, **kwargs) -> list[Document]:
+    return asyncio.run(store.search(list(query), limit, **kwargs))
+
+
+def test_vectors_without_index_rows_are_truncated_on_reopen(tmp_path):
+    path = str(tmp_path / "store")
+    store = LocalVectorStore(path, DIMENSIONS)
+    asyncio.run(store.add([_document("A", 0, "alpha", _axis(0))]))
+
+    # Crash after writing the vector of B, before its index record
+    with open(os.path.join(path, VECTORS_FILE), "ab") as f:
+        f.write(_axis(1).tobytes())
+
+    store = LocalVectorStore(path, DIMENSIONS)
+    assert os.path.getsize(os.path.join(path, VECTORS_FILE)) == DIMENSIONS * 4
+    asyncio.run(store.add([_document("C", 0, "gamma", _axis(2))]))
+
+    store = LocalVectorStore(path, DIMENSIONS)
+    assert len(store) == 2
+    [hit] = _search(store, _axis(2), limit=1)
+    assert (hit.metadata.doc_id, hit.metadata.content["text"]) == ("C", "gamma")
+    assert abs(hit.score - 1.0) < 1e-6
+
+
+def test_add_replaces_chunk_with_same_key(tmp_path):
+    path = str(tmp_path / "store")
+    store = LocalVectorStore(path, DIMENSIONS)
+    asyncio.run(store.add([
+        _document("A", 0, "old", _axis(0), duplicate_doc_ids=["B"]),
+        _document("A", 1, "other", _axis(3)),
+    ]))
+    asyncio.run(store.add([_document("A", 0, "new", _axis(1))]))
+
+    store = LocalVectorStore(path, DIMENSIONS)
+    assert len(store) == 2
+    hits = _search(store, _axis(0))
+    assert sorted(doc.metadata.content["text"] for doc in hits) == ["new", "other"]
+    [hit] = _search(store, _axis(1), limit=1)
+    assert hit.metadata.content["text"] == "new"
+    # The payload of the replaced chunk is not inherited
+    assert "duplicate_doc_ids" not in hit.metadata
+
+
+def test_payload_log_replays_merges_and_deletes(tmp_path):
+    path = str(tmp_path / "store")
+    store = LocalVectorStore(path, DIMENSIONS)
+    asyncio.run(store.add([
+        _document("A", 0, "alpha", _axis(0), duplicate_doc_ids=["X"]),
+        _document("B", 0, "beta", _axis(1), duplicate_doc_ids=["Y"]),
+    ]))
+    asyncio.run(store.update_payloads([("B", 0, {"reviewed": True})]))
+    asyncio.run(store.delete(["A"]))
+
+    # Crash in the middle of the next payload line
+    with open(os.path.join(path, PAYLOADS_FILE), "a", encoding="utf-8") as f:
+        f.write('{"doc_id": "B", "chunk_id": 0, "pay')
+
+    store = LocalVectorStore(path, DIMENSIONS)
+    assert len(store) == 1
+    assert _search(store, _axis(0), score_threshold=0.5) == []
+    [hit] = _search(store, _axis(1), limit=1)
+    assert hit.metadata.doc_id == "B"
+    assert hit.metadata["duplicate_doc_ids"] == ["Y"]
+    assert hit.metadata["reviewed"] is True
+
+    # A re-added chunk of a deleted document starts without payload
+    asyncio.run(store.add([_document("A", 0, "alpha", _axis(0))]))
+    store = LocalVectorStore(path, DIMENSIONS)
+    [hit] = _search(store, _axis(0), limit=1)
+    assert hit.metadata.doc_id == "A"
+    assert "duplicate_doc_ids" not in hit.metadata
+
+
+def _clustered_vectors(n_rows: int, dimensions: int, n_clusters: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(n_clusters, dimensions))
+    labels = rng.integers(n_clusters, size=n_rows)
+    return (centers[labels] + 0.3 * rng.normal(size=(n_rows, dimensions))).astype(np.float32)
+
+
+def _build_store(path: str, vectors: np.ndarray, **kwargs) -> LocalVectorStore:
+    store = LocalVectorStore(path, vectors.shape[1], **kwargs)
+    asyncio.run(store.add([
+        _document(f"D{i}", 0, f"chunk {i}", vector) for i, vector in enumerate(vectors)
+    ]))
+    store.optimize()
+    return store
+
+
+def _hit_ids(store: LocalVectorStore, query: np.ndarray, limit: int) -> list[str]:
+    return [doc.metadata.doc_id for doc in _search(store, query, limit=limit)]
+
+
+def test_ivf_and_quantized_search_match_exact_search(tmp_path):
+    vectors = _clustered_vectors(2000, 32, 16)
+    queries = vectors[:20] + 0.1 * np.random.default_rng(1).normal(size=(20, 32))
+    exact = _build_store(str(tmp_path / "exact"), vectors)
+
+    # Probing every list scores every row
+    ivf = _build_store(str(tmp_path / "ivf"), vectors, ivf_lists=16, n_probe=16)
+    assert ivf._ivf is not None
+    for query in queries:
+        assert _hit_ids(ivf, query, 10) == _hit_ids(exact, query, 10)
+
+    for kind in QUANTIZERS:
+        store = _build_store(
+            str(tmp_path / kind),
+            vectors,
+            ivf_lists=16,
+            n_probe=4,
+            quantization=kind,
+            oversampling=10,
+        )
+        assert store._codes is not None
+        recall = np.mean([
+            len(set(_hit_ids(store, query, 10)) & set(_hit_ids(exact, query, 10))) / 10
+            for query in queries
+        ])
+        assert recall >= 0.9, kind
+
+        # Results are rescored with the float vectors
+        query = queries[0]
+        exact_scores = {doc.metadata.doc_id: doc.score for doc in _search(exact, query, limit=10)}
+        for doc in _search(store, query, limit=10):
+            if doc.metadata.doc_id in exact_scores:
+                assert abs(doc.score - exact_scores[doc.metadata.doc_id]) < 1e-5
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Resuming a batch run from an interrupted answer checkpoint."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qa_io_handler import AnswerCheckpoint
+
+
+def _record(q_id: int, query: str) -> dict:
+    return {"category": "安全", "id": q_id, "query": query, "result": [], "answer": f"答案 {q_id}"}
+
+
+def test_partial_last_line_is_truncated_on_reopen(tmp_path):
+    path = str(tmp_path / "answers.checkpoint.jsonl")
+    checkpoint = AnswerCheckpoint(path)
+    checkpoint.append(_record(1, "问题一"))
+    checkpoint.append(_record(2, "问题二"))
+    checkpoint.close()
+    size = os.path.getsize(path)
+
+    # Crash in the middle of writing the third record
+    with open(path, "ab") as f:
+        f.write('{"category": "安全", "id": 3, "query": "问'.encode("utf-8"))
+
+    checkpoint = AnswerCheckpoint(path)
+    assert os.path.getsize(path) == size
+    assert len(checkpoint) == 2
+    assert checkpoint.is_answered("安全", 2, "问题二")
+    assert not checkpoint.is_answered("安全", 3, "问题三")
+    # A changed question is answered again
+    assert not checkpoint.is_answered("安全", 1, "问题一（修订）")
+
+    checkpoint.append(_record(3, "问题三"))
+    checkpoint.close()
+
+    checkpoint = AnswerCheckpoint(path)
+    assert len(checkpoint) == 3
+    assert checkpoint.get("安全", 3, "问题三")["answer"] == "答案 3"
+    assert checkpoint.get("安全", 1, "问题一")["answer"] == "答案 1"
+    checkpoint.close()
+
+
+def test_complete_line_without_required_keys_ends_the_valid_records(tmp_path):
+    path = str(tmp_path / "answers.checkpoint.jsonl")
+    checkpoint = AnswerCheckpoint(path)
+    checkpoint.append(_record(1, "问题一"))
+    checkpoint.close()
+    size = os.path.getsize(path)
+
+    with open(path, "ab") as f:
+        f.write(b'{"category": "\xe5\xae\x89\xe5\x85\xa8"}\n')
+        f.write(b'{"category": "x", "id": 9, "query": "q"}\n')
+
+    checkpoint = AnswerCheckpoint(path)
+    assert len(checkpoint) == 1
+    assert os.path.getsize(path) == size
+    checkpoint.close()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Streaming sentence splitting independent of the block boundaries."""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentence_splitter import iter_sentences, split_sentences
+
+
+TEXT = (
+    "第一章 总则\n"
+    "本标准规定了安全仪表系统的要求。适用范围见 5.2.1 条（含附录A）。\n"
+    "5.2.1 The SIL is determined e.g. by a risk graph, see Fig. 3 and Eq. 4.\n"
+    "Values such as 04011.4 and approx. 3.5 stay in one sentence! Really?! Yes;"
+    "“引号内的句子。”（括号内的句子！）\n\n\n"
+    "• 第一项\n"
+    "- 第二项\n"
+    "。OCR 识别出的项目符号\n"
+    "第十二条 最后一条……没有句末标点"
+)
+
+
+def _blocks(text: str, sizes: list[int]) -> list[str]:
+    blocks, i = [], 0
+    for size in sizes:
+        blocks.append(text[i:i + size])
+        i += size
+    blocks.append(text[i:])
+    return blocks
+
+
+def test_split_is_lossless_and_splits_at_boundaries():
+    sentences = split_sentences(TEXT)
+    assert "".join(sentences) == TEXT
+    assert "适用范围见 5.2.1 条（含附录A）。\n" in sentences
+    assert "5.2.1 The SIL is determined e.g. by a risk graph, see Fig. 3 and Eq. 4.\n" in sentences
+    assert "Values such as 04011.4 and approx. 3.5 stay in one sentence! " in sentences
+    assert sentences[-1] == "第十二条 最后一条……没有句末标点"
+
+
+def test_iter_sentences_matches_split_for_any_block_size():
+    expected = split_sentences(TEXT)
+    for size in range(1, 40):
+        assert list(iter_sentences(_blocks(TEXT, [size] * (len(TEXT) // size)))) == expected, size
+
+
+def test_iter_sentences_matches_split_for_random_blocks():
+    rng = random.Random(0)
+    expected = split_sentences(TEXT)
+    for _ in range(200):
+        sizes = [rng.choice([0, 1, 2, 3, 7, 50]) for _ in range(len(TEXT))]
+        assert list(iter_sentences(_blocks(TEXT, sizes))) == expected
+
+
+def test_iter_sentences_of_empty_input():
+    assert list(iter_sentences([])) == []
+    assert list(iter_sentences(["", ""])) == []
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Embedding model wrapper that keeps blocking API calls off the event loop.
+
+`DashScopeTextEmbedding` is a coroutine, but it sends the request with the
+synchronous DashScope SDK, so every embedding blocks the event loop and
+concurrent retrievals or ingest batches run one after another. The wrapper
+runs each call of the wrapped model in a worker thread instead.
+"""
+import asyncio
+from typing import Any, List
+
+from agentscope.embedding import EmbeddingModelBase, EmbeddingResponse
+from agentscope.message import TextBlock
+
+
+class ThreadedEmbedding(EmbeddingModelBase):
+    """
+    Run the calls of a blocking embedding model in worker threads.
+
+    Each call is executed to completion in its own event loop on a thread of
+    `asyncio.to_thread`, so the wrapped model must not hold state bound to
+    the caller's event loop, e.g. an async HTTP client. This is the case for
+    the DashScope models, which use the synchronous SDK.
+    """
+
+    def __init__(self, model: EmbeddingModelBase) -> None:
+        """
+        Args:
+            model: The wrapped embedding model
+        """
+        super().__init__(model.model_name, model.dimensions)
+        self.model = model
+        self.supported_modalities = model.supported_modalities
+
+    @property
+    def batch_size_limit(self) -> int | None:
+        """The maximum batch size of the wrapped model, if it has one."""
+        return getattr(self.model, "batch_size_limit", None)
+
+    async def __call__(
+        self,
+        text: List[str | TextBlock],
+        **kwargs: Any,
+    ) -> EmbeddingResponse:
+        """
+        Embed the given texts with the wrapped model in a worker thread.
+
+        Args:
+            text: The input texts, as strings or TextBlock dicts
+            **kwargs: Extra arguments for the wrapped model
+        """
+        return await asyncio.to_thread(self._call_blocking, text, kwargs)
+
+    def _call_blocking(self, text: List[str | TextBlock], kwargs: dict) -> EmbeddingResponse:
+        """Create and run the call of the wrapped model in this thread."""
+        return asyncio.run(self.model(text, **kwargs))
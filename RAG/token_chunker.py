@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+按 token 计数、优先在结构边界处切分的分块模块。
+
+chunk 的大小和重叠都以 token 计算，使每个 chunk 在嵌入模型上的成本可预测；
+切分位置优先选择结构边界，其次是段落、句子，尽量不在句子中间切开：
+- 章节标题（"第3部分"、"第X章/节"、"附录A" 等）
+- 多级条款编号（"5.2.1 "）和 OCR 输出的 "--- Page N ---" 页标记
+- 空行、项目符号、表格行
+- 句末标点
+
+分词器可以是本地的 tokenizer.json（需要 tokenizers 库）或 tiktoken 编码，
+都不可用时使用基于字符类别的估算（CJK 字符按 1 个 token 计，偏保守）。
+
+算法只扫描一遍文本：文本被切成带有边界强度的小单元（行或句子），
+用 deque 维护当前窗口和窗口内的 token 总数，超出上限时在窗口内选择最佳切分点，
+chunk 文本只在产出时拼接一次，不会反复拼接字符串。
+"""
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator
+
+from sentence_splitter import iter_sentences
+
+
+# 切分点的强度，数值越大越适合在此处切分
+BREAK_NONE = 0       # 句子中间的换行
+BREAK_SENTENCE = 1   # 句末
+BREAK_PARAGRAPH = 2  # 空行、项目符号、表格行
+BREAK_CLAUSE = 3     # 条款编号、页标记
+BREAK_SECTION = 4    # 章节标题
+
+# 切分点之前的内容至少要达到 max_tokens 的这个比例，避免产生过小的 chunk
+_MIN_FILL = 0.5
+
+_SECTION_RE = re.compile(
+    r"[ \t　]*(?:"
+    r"第[一二三四五六七八九十百千\d]+(?:部分|章|节)"
+    r"|附\s*录\s*[A-ZＡ-Ｚ]"
+    r"|[一二三四五六七八九十]+、"
+    r")"
+)
+_CLAUSE_RE = re.compile(r"[ \t　]*(?:\d+(?:\.\d+)+[ \t　]|\d+[ \t　]+\S|第[一二三四五六七八九十百千\d]+条)")
+_PAGE_RE = re.compile(r"[ \t　]*--- Page \d+ ---")
+_PARAGRAPH_RE = re.compile(r"[ \t　]*(?:[。•·●▪*¢\-–—][ \t　]|\([0-9a-z]{1,2}\)|（[0-9a-z]{1,2}）)")
+_TABLE_ROW_RE = re.compile(r".*(?:\|.*\||\t.*\t)")
+_BLANK_LINE_END_RE = re.compile(r"\n[ \t　]*\n\s*$")
+
+_CJK_RANGES = "\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+_CJK_RE = re.compile(rf"[{_CJK_RANGES}]")
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_NUMBER_RE = re.compile(r"\d+")
+_SYMBOL_RE = re.compile(rf"[^\sA-Za-z\d{_CJK_RANGES}]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    不依赖分词器估算 token 数。
+
+    CJK 字符和全角标点每个按 1 个 token，英文单词约每 4 个字母 1 个 token，
+    数字约每 3 位 1 个 token，其余符号每个 1 个 token。
+    对常见的 BPE 分词器来说是偏保守的估计。
+    """
+    tokens = len(_CJK_RE.findall(text)) + len(_SYMBOL_RE.findall(text))
+    tokens += sum((len(word) + 3) // 4 for word in _WORD_RE.findall(text))
+    tokens += sum((len(number) + 2) // 3 for number in _NUMBER_RE.findall(text))
+    return tokens
+
+
+@lru_cache(maxsize=None)
+def load_token_counter(tokenizer: str | None = None) -> Callable[[str], int]:
+    """
+    根据配置创建 token 计数函数。
+
+    Args:
+        tokenizer: None 或 "heuristic" 使用 estimate_tokens；
+            "tiktoken:<encoding>" 使用 tiktoken 的编码（如 "tiktoken:cl100k_base"）；
+            其他值视为本地 tokenizer.json 文件的路径，使用 tokenizers 库加载
+
+    Returns:
+        输入文本、返回 token 数的函数
+
+    Raises:
+        ImportError: 所需的分词库未安装
+    """
+    if tokenizer is None or tokenizer == "heuristic":
+        return estimate_tokens
+
+    if tokenizer.startswith("tiktoken:"):
+        try:
+            import tiktoken
+        except ImportError as e:
+            raise ImportError(
+                "使用 tiktoken 分词器需要先安装: pip install tiktoken"
+            ) from e
+        encoding = tiktoken.get_encoding(tokenizer.split(":", 1)[1])
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    try:
+        from tokenizers import Tokenizer
+    except ImportError as e:
+        raise ImportError(
+            "加载 tokenizer.json 需要先安装: pip install tokenizers"
+        ) from e
+    local_tokenizer = Tokenizer.from_file(tokenizer)
+    return lambda text: len(local_tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def _break_strength(line: str, first_in_sentence: bool, after_blank_line: bool) -> int:
+    """判断在一行之前切分的强度。"""
+    if _SECTION_RE.match(line):
+        return BREAK_SECTION
+    if _PAGE_RE.match(line) or _CLAUSE_RE.match(line):
+        return BREAK_CLAUSE
+    if after_blank_line or _PARAGRAPH_RE.match(line) or _TABLE_ROW_RE.match(line):
+        return BREAK_PARAGRAPH
+    return BREAK_SENTENCE if first_in_sentence else BREAK_NONE
+
+
+def _iter_units(blocks: Iterable[str]) -> Iterator[tuple[str, int]]:
+    """
+    把文本流切成 (单元文本, 单元之前的切分强度)。
+
+    单元是句子中的一行：先分句，再把跨行的句子按行拆开，
+    这样 OCR 文本中的页标记、表格行等也能成为切分点。
+    """
+    after_blank_line = True
+    line_start = True
+    for sentence in iter_sentences(blocks):
+        first = True
+        for line in sentence.splitlines(keepends=True):
+            if line_start:
+                strength = _break_strength(line, first, after_blank_line)
+            else:
+                # 上一个单元没有以换行结束，说明是同一行中的下一句
+                strength = BREAK_SENTENCE if first else BREAK_NONE
+            yield line, strength
+            first = False
+            line_start = line.endswith(("\n", "\r"))
+        after_blank_line = bool(_BLANK_LINE_END_RE.search(sentence))
+
+
+def _split_oversized(
+    text: str,
+    tokens: int,
+    max_tokens: int,
+    count_tokens: Callable[[str], int],
+) -> Iterator[tuple[str, int]]:
+    """把超过 max_tokens 的单元按字符比例切开，返回 (片段, token 数)。"""
+    if tokens <= max_tokens or len(text) <= 1:
+        yield text, tokens
+        return
+    n_pieces = -(-tokens // max_tokens)
+    step = -(-len(text) // n_pieces)
+    for i in range(0, len(text), step):
+        piece = text[i:i + step]
+        yield from _split_oversized(piece, count_tokens(piece), max_tokens, count_tokens)
+
+
+def iter_token_chunks(
+    blocks: Iterable[str],
+    max_tokens: int = 512,
+    overlap_tokens: int = 64,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[str]:
+    """
+    按 token 数把文本流切分成 chunks，优先在结构边界处切分。
+
+    每个 chunk 的 token 数（按单元分别计数后求和）不超过 max_tokens。
+    相邻 chunk 之间重叠不超过 overlap_tokens 个 token 的完整单元，
+    不会在句子中间开始重叠，也不会把上一节的内容重叠到新的章节标题之后。
+
+    Args:
+        blocks: 依次产出文本片段的可迭代对象
+        max_tokens: 每个 chunk 的最大 token 数
+        overlap_tokens: 相邻 chunk 之间的最大重叠 token 数
+        count_tokens: token 计数函数
+
+    Yields:
+        去除首尾空白后的非空 chunk
+
+    Raises:
+        ValueError: 当 overlap_tokens >= max_tokens 时抛出
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(
+            f"overlap_tokens ({overlap_tokens}) 必须小于 max_tokens ({max_tokens})"
+        )
+
+    min_fill = max_tokens * _MIN_FILL
+    # 当前窗口中的单元：(文本, token 数, 单元之前的切分强度)
+    window: deque[tuple[str, int, int]] = deque()
+    window_tokens = 0
+
+    def choose_cut(next_strength: int) -> int:
+        """选择切分点：达到最小填充量的位置中强度最高的，强度相同时取最靠后的。"""
+        best_k, best_strength = len(window), -1
+        prefix = 0
+        for k, unit in enumerate(window):
+            prefix += unit[1]
+            cut_strength = window[k + 1][2] if k + 1 < len(window) else next_strength
+            if prefix >= min_fill and cut_strength >= best_strength:
+                best_k, best_strength = k + 1, cut_strength
+        return best_k
+
+    for text, strength in _iter_units(blocks):
+        tokens = count_tokens(text)
+        for piece, piece_tokens in _split_oversized(text, tokens, max_tokens, count_tokens):
+            while window and window_tokens + piece_tokens > max_tokens:
+                cut = choose_cut(strength)
+                emitted = [window.popleft() for _ in range(cut)]
+                chunk = "".join(unit[0] for unit in emitted).strip()
+                if chunk:
+                    yield chunk
+                window_tokens = sum(unit[1] for unit in window)
+
+                # 在新窗口开头加上重叠部分：上一个 chunk 末尾的完整单元，
+                # 从句子开头开始，且新窗口不以章节标题开头
+                next_start = window[0][2] if window else strength
+                overlap, overlap_sum = [], 0
+                if next_start < BREAK_SECTION:
+                    for unit in reversed(emitted[1:]):
+                        if overlap_sum + unit[1] > overlap_tokens:
+                            break
+                        overlap.append(unit)
+                        overlap_sum += unit[1]
+                    while overlap and overlap[-1][2] == BREAK_NONE:
+                        overlap_sum -= overlap.pop()[1]
+                # 放不下重叠部分时不加重叠，保证每次切分都有进展
+                if overlap and window_tokens + overlap_sum + piece_tokens <= max_tokens:
+                    window.extendleft(overlap)
+                    window_tokens += overlap_sum
+
+            window.append((piece, piece_tokens, strength))
+            window_tokens += piece_tokens
+            # 切开的后续片段位于原单元中间
+            strength = BREAK_NONE
+
+    chunk = "".join(unit[0] for unit in window).strip()
+    if chunk:
+        yield chunk